@@ -1,7 +1,10 @@
 import os
+import re
 import uuid
+import atexit
 import json
 import time
+import random
 import base64
 import logging
 import requests
@@ -11,15 +14,18 @@ import sqlite3
 import tempfile
 import sys
 from datetime import datetime, timedelta, date, timezone, UTC
-from types import SimpleNamespace
+from types import SimpleNamespace, MappingProxyType
+from dataclasses import dataclass, field
+from typing import List, Optional
 from flask import Flask, render_template, redirect, request, url_for, flash, jsonify, session, abort, send_file, make_response, g, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from markupsafe import Markup
 from flask_migrate import Migrate
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_bcrypt import Bcrypt
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.urls import url_parse
-from sqlalchemy import text, func, CheckConstraint
+from sqlalchemy import text, func, bindparam, tuple_, and_, or_, case, CheckConstraint, DDL
 from werkzeug.utils import secure_filename
 from functools import wraps
 from itsdangerous import URLSafeTimedSerializer, BadSignature
@@ -28,12 +34,18 @@ import qrcode
 from io import BytesIO
 from flask_cors import CORS
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session as SASession
+from sqlalchemy.orm.attributes import set_committed_value
+from presence import PresenceTracker
+from catalogue_cache import CatalogueCache
+from fragment_cache import FragmentCache
+from shared_cache import SharedCache, from_url as cache_backend_from_url
 from sql_operations import direct_get_order, direct_cart_operations, direct_get_products, direct_create_user, direct_get_user, direct_create_product, get_db_connection
-from direct_create_order import direct_create_order
 import pytz
 from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from flask_mail import Mail, Message
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from logging.handlers import RotatingFileHandler
 
 # Create logger instance
@@ -51,6 +63,41 @@ APP_TIMESTAMP = str(int(datetime.now().timestamp()))
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
+# Runtime profiles, chosen with POS_PROFILE. Any single setting can be overridden with an
+# environment variable of the same name, e.g. LOG_LEVEL=DEBUG on a production till.
+RUNTIME_PROFILES = {
+    'production': {
+        'DEBUG': False,
+        'LOG_LEVEL': 'INFO',
+        'LOG_TO_CONSOLE': False,             # console writes are synchronous and slow on Windows tills
+        'REQUEST_TIMING_SAMPLE_RATE': 0.01,  # share of requests whose duration is logged
+        'SLOW_REQUEST_MS': 1000,             # slower requests are always logged, as warnings
+    },
+    'development': {
+        'DEBUG': True,
+        'LOG_LEVEL': 'DEBUG',
+        'LOG_TO_CONSOLE': True,
+        'REQUEST_TIMING_SAMPLE_RATE': 1.0,
+        'SLOW_REQUEST_MS': 500,
+    },
+}
+
+def load_runtime_profile(name):
+    """Put a runtime profile's settings in app.config, applying environment overrides"""
+    if name not in RUNTIME_PROFILES:
+        raise ValueError(f"Unknown POS_PROFILE {name!r}, expected one of {', '.join(RUNTIME_PROFILES)}")
+    app.config['POS_PROFILE'] = name
+    for setting, default in RUNTIME_PROFILES[name].items():
+        value = os.getenv(setting)
+        if value is None:
+            app.config[setting] = default
+        elif isinstance(default, bool):
+            app.config[setting] = value.lower() in ('1', 'true', 'yes', 'on')
+        else:
+            app.config[setting] = type(default)(value)
+
+load_runtime_profile(os.getenv('POS_PROFILE', 'production'))
+
 # Configure logging
 def setup_logging():
     if getattr(sys, 'frozen', False):
@@ -67,19 +114,26 @@ def setup_logging():
     
     # Configure logging
     log_file = os.path.join(logs_path, 'pos_system.log')
-    handler = RotatingFileHandler(log_file, maxBytes=10000000, backupCount=5)
-    handler.setFormatter(logging.Formatter(
-        '[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
-    ))
+    formatter = logging.Formatter('[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+    level = getattr(logging, app.config['LOG_LEVEL'].upper(), logging.INFO)
     
-    # Set up root logger
+    # Everything goes through the root logger; app.logger propagates to it. Handlers are only
+    # added once, so every message is written once however often this is called.
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(handler)
+    root_logger.setLevel(level)
+    if not any(getattr(h, 'pos_handler', False) for h in root_logger.handlers):
+        handler = RotatingFileHandler(log_file, maxBytes=10000000, backupCount=5)
+        handler.setFormatter(formatter)
+        handler.pos_handler = True
+        root_logger.addHandler(handler)
+        if app.config['LOG_TO_CONSOLE']:
+            console = logging.StreamHandler()
+            console.setFormatter(formatter)
+            console.pos_handler = True
+            root_logger.addHandler(console)
     
     # Set up Flask logger
-    app.logger.setLevel(logging.INFO)
-    app.logger.addHandler(handler)
+    app.logger.setLevel(level)
     
     # Suppress Werkzeug's logging
     logging.getLogger('werkzeug').setLevel(logging.ERROR)
@@ -87,6 +141,29 @@ def setup_logging():
 # Move setup_logging() here, after app is defined
 setup_logging()
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def log_request_timing(response):
+    """
+    Log how long requests take: a sample of REQUEST_TIMING_SAMPLE_RATE of them, and every
+    request slower than SLOW_REQUEST_MS. Browsers see each duration in the Server-Timing header.
+    """
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    response.headers['Server-Timing'] = f'app;dur={elapsed_ms:.1f}'
+    if elapsed_ms >= app.config['SLOW_REQUEST_MS']:
+        logger.warning("Slow request: %s %s -> %s in %.1f ms",
+                       request.method, request.path, response.status_code, elapsed_ms)
+    elif random.random() < app.config['REQUEST_TIMING_SAMPLE_RATE']:
+        logger.info("Request timing: %s %s -> %s in %.1f ms",
+                    request.method, request.path, response.status_code, elapsed_ms)
+    return response
+
 # Simple relativedelta alternative to add months
 def add_months(dt, months):
     month = dt.month - 1 + months
@@ -136,10 +213,18 @@ def get_db_path():
 # Update the database configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{get_db_path()}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SESSION_TYPE'] = 'filesystem'  # Store sessions in files
 
-# Call setup_logging after app is initialized
-setup_logging()
+# SQLite settings applied to every new connection, each can be overridden with an SQLITE_<NAME> environment variable
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),       # readers don't block the writer
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),    # ms to wait for a lock before "database is locked"
+    'foreign_keys': os.getenv('SQLITE_FOREIGN_KEYS', 'ON'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),       # safe with WAL, fsync only at checkpoints
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -20000)),      # negative means KiB, so about 20 MB per connection
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 134217728)),     # 128 MB memory-mapped reads
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+app.config['SESSION_TYPE'] = 'filesystem'  # Store sessions in files
 
 # Ensure static files are found correctly (support PyInstaller)
 app.static_folder = resource_path('static')
@@ -148,15 +233,11 @@ app.static_url_path = '/static'
 # Enable CORS for all routes
 CORS(app)
 
-# Enable debug mode
-app.debug = True
-
 # Custom render_template that adds version parameter
 def versioned_render_template(*args, **kwargs):
     """Add version to all templates for cache busting"""
     try:
-        # Debug print to help locate the active template
-        print(f"[DEBUG] Rendering template: {args[0] if args else 'UNKNOWN'} | CWD: {os.getcwd()}")
+        logger.debug("Rendering template %s", args[0] if args else 'UNKNOWN')
         # Ensure we have a valid template and then add version
         kwargs['version'] = APP_VERSION
         kwargs['timestamp'] = APP_TIMESTAMP
@@ -247,6 +328,9 @@ def add_headers(response):
         # Cache static files for longer with a version parameter for cache busting
         max_age = 60 * 60 * 24 * 30  # 30 days
         response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    elif response.headers.get('ETag'):
+        # Versioned API responses may be kept, but must be revalidated with If-None-Match every time
+        response.headers['Cache-Control'] = 'private, no-cache'
     else:
         # For dynamic routes, avoid caching sensitive content
         response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
@@ -265,6 +349,68 @@ def add_headers(response):
 
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
+
+@event.listens_for(Engine, 'connect')
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Apply the SQLITE_PRAGMAS profile to each new pooled connection (other databases are left as configured)"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        # PRAGMA values can't be bound as parameters, so only accept plain words and numbers
+        if not str(value).lstrip('-').isalnum():
+            logger.warning(f"Ignoring invalid SQLite pragma value {name}={value!r}")
+            continue
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def get_sqlite_pragmas():
+    """Pragma values as reported by a pooled connection, empty when the database isn't SQLite"""
+    if db.engine.dialect.name != 'sqlite':
+        return {}
+    conn = get_raw_connection()
+    try:
+        return {
+            name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+            for name in app.config['SQLITE_PRAGMAS']
+        }
+    finally:
+        conn.close()
+
+class PooledConnection:
+    """
+    DBAPI connection checked out from the SQLAlchemy engine pool for hand-written SQL.
+    Cursors return sqlite3.Row rows like the old sqlite3.connect() connections did,
+    and close() hands the connection back to the pool.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self):
+        cursor = self._connection.cursor()
+        if isinstance(cursor, sqlite3.Cursor):
+            cursor.row_factory = sqlite3.Row
+        return cursor
+
+    def execute(self, sql, params=()):
+        cursor = self.cursor()
+        cursor.execute(sql, params)
+        return cursor
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+def get_raw_connection():
+    """Check out a pooled connection to the configured database for raw SQL"""
+    with app.app_context():
+        return PooledConnection(db.engine.raw_connection())
+
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -327,6 +473,12 @@ class Product(db.Model):
     __tablename__ = 'product'
     __table_args__ = (
         CheckConstraint('stock >= 0', name='check_stock_nonnegative'),
+        # Catalogue endpoints return rows changed since a client's last change_seq version
+        db.Index('ix_product_change_seq', 'change_seq'),
+        # Keyset pagination of /api/catalogue in each of its sort orders
+        db.Index('ix_product_name_id', 'name', 'id'),
+        db.Index('ix_product_category_name_id', 'category', 'name', 'id'),
+        db.Index('ix_product_price_id', 'price', 'id'),
     )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -343,6 +495,9 @@ class Product(db.Model):
     barcode = db.Column(db.String(50), unique=True, nullable=True, default=None)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    # Position of the row's last write in commit order, maintained by the PRODUCT_CHANGE_DDL triggers
+    # (stays NULL on databases without them)
+    change_seq = db.Column(db.Integer, nullable=True)
     stock_movements = db.relationship('StockMovement', backref='product', lazy=True)
     low_stock_threshold = db.Column(db.Float, nullable=False, default=5.0)
 
@@ -368,6 +523,10 @@ class Product(db.Model):
     def update_stock(self, quantity, movement_type, notes=None):
         """
         Update product stock and create a stock movement record
+        
+        The stock change is a single conditional UPDATE against the current row, so
+        concurrent sales cannot both take the last units and no update is lost.
+        The caller owns the transaction and commits or rolls back.
         Args:
             quantity: The quantity to add/remove
             movement_type: 'sale' or 'restock'
@@ -381,45 +540,253 @@ class Product(db.Model):
                 logger.warning(f"Invalid quantity {quantity} for stock update of product {self.id}")
                 return False
             quantity = float(quantity)
-            old_stock = float(self.stock)
+            now = datetime.now(UTC)
+            stmt = db.update(Product).where(Product.id == self.id)
             if movement_type == 'sale':
-                if old_stock < quantity:
-                    logger.warning(f"Attempted to sell {quantity} of product {self.id} but only {old_stock} available")
-                    return False
-                actual_quantity = quantity
-                self.stock = max(0.0, old_stock - quantity)
+                stmt = stmt.where(Product.stock >= quantity).values(stock=Product.stock - quantity, updated_at=now)
             elif movement_type == 'restock':
-                actual_quantity = quantity
-                self.stock = old_stock + quantity
+                stmt = stmt.values(stock=Product.stock + quantity, updated_at=now)
             else:
                 logger.warning(f"Invalid movement type {movement_type} for product {self.id}")
                 return False
-            self.stock = max(0.0, float(self.stock))
-            logger.info(f"Stock update for product {self.id}: {movement_type} of {actual_quantity}, old_stock={old_stock}, new_stock={self.stock}")
-            self.updated_at = datetime.now(UTC)
+            updated = db.session.execute(
+                stmt.returning(*STOCK_DELTA_COLUMNS).execution_options(synchronize_session=False)
+            ).mappings().one_or_none()
+            if updated is None:
+                logger.warning(f"Attempted to sell {quantity} of product {self.id} but not enough stock available")
+                return False
+            new_stock = updated['stock']
+            # RETURNING shows the row before the change trigger numbered it, so read the number back
+            change_seq = db.session.scalar(db.select(Product.change_seq).where(Product.id == self.id))
+            delta = dict(updated, change_seq=change_seq)
+            queue_stock_change(db.session, delta)
+            # Keep this instance in step with the row without marking it dirty
+            set_committed_value(self, 'stock', new_stock)
+            set_committed_value(self, 'updated_at', now)
+            logger.info(f"Stock update for product {self.id}: {movement_type} of {quantity}, new_stock={new_stock}")
             movement = StockMovement(
                 product_id=self.id,
-                quantity=actual_quantity,
+                quantity=quantity,
                 movement_type=movement_type,
-                remaining_stock=self.stock,
-                timestamp=datetime.now(UTC),
+                remaining_stock=new_stock,
+                timestamp=now,
                 notes=notes
             )
             db.session.add(movement)
-            db.session.add(self)
             return True
         except Exception as e:
             logger.error(f"Error updating stock for product {self.id}: {str(e)}")
-            try:
-                db.session.rollback()
-            except:
-                pass
             return False
 
+    @classmethod
+    def sell_stock_batch(cls, quantities, notes=None):
+        """
+        Take stock for a whole order in a constant number of statements: one executemany
+        conditional UPDATE, one SELECT of the new levels and one executemany movement INSERT.
+        The caller owns the transaction and must roll back on failure.
+        Args:
+            quantities: {product_id: quantity to sell}
+            notes: Optional notes for the stock movement records
+        Returns:
+            bool: True if every product had enough stock, False otherwise
+        """
+        now = datetime.now(UTC)
+        result = db.session.execute(STOCK_SALE_SQL, [
+            {'product_id': product_id, 'quantity': float(quantity), 'now': now}
+            for product_id, quantity in quantities.items()
+        ])
+        if result.rowcount != len(quantities):
+            logger.warning(f"Not enough stock to sell {quantities}")
+            return False
+        
+        updated_rows = db.session.query(*STOCK_DELTA_COLUMNS, cls.change_seq).filter(cls.id.in_(quantities.keys())).all()
+        remaining = {row.id: row.stock for row in updated_rows}
+        for row in updated_rows:
+            queue_stock_change(db.session, dict(row._mapping))
+        
+        # Keep loaded instances in step with the rows without marking them dirty
+        for product_id, stock in remaining.items():
+            product = db.session.identity_map.get(db.inspect(cls).identity_key_from_primary_key((product_id,)))
+            if product is not None:
+                set_committed_value(product, 'stock', stock)
+                set_committed_value(product, 'updated_at', now)
+        
+        db.session.execute(db.insert(StockMovement), [
+            {
+                'product_id': product_id,
+                'quantity': float(quantity),
+                'movement_type': 'sale',
+                'remaining_stock': remaining[product_id],
+                'timestamp': now,
+                'notes': notes
+            }
+            for product_id, quantity in quantities.items()
+        ])
+        return True
+
     def __repr__(self):
         return f'<Product {self.name}>'
 
+# Columns sent in stock_changed deltas, enough for clients to redraw stock level and status.
+# update_stock() and sell_stock_batch() add the row's new change_seq, which keeps the catalogue
+# cache's version current without a re-read.
+STOCK_DELTA_COLUMNS = (Product.id, Product.stock, Product.max_stock, Product.reorder_point, Product.low_stock_threshold)
+
+def queue_stock_change(session, delta):
+    """Remember a product's new stock figures; they are pushed to clients once the transaction commits"""
+    session.info.setdefault('stock_changes', {})[delta['id']] = delta
+    session.info['reports_changed'] = True
+
+@event.listens_for(SASession, 'before_flush')
+def queue_orm_stock_changes(session, flush_context, instances):
+    """Pick up stock edited through the ORM, e.g. in edit_product()"""
+    for obj in session.dirty:
+        if isinstance(obj, Product) and db.inspect(obj).attrs.stock.history.has_changes():
+            queue_stock_change(session, {column.key: getattr(obj, column.key) for column in STOCK_DELTA_COLUMNS})
+
+@event.listens_for(SASession, 'after_commit')
+def emit_stock_changes(session):
+    changes = session.info.pop('stock_changes', None)
+    if changes:
+        for delta in changes.values():
+            catalogue.update(delta['id'], **delta)
+        publish_catalogue_changes(list(changes))
+        try:
+            socketio.emit('stock_changed', {'products': list(changes.values())})
+        except Exception as e:
+            logger.error(f"Error emitting stock changes: {str(e)}")
+
+@event.listens_for(SASession, 'after_rollback')
+def discard_stock_changes(session):
+    session.info.pop('stock_changes', None)
+    session.info.pop('new_online_orders', None)
+    session.info.pop('catalogue_changes', None)
+    session.info.pop('catalogue_reload', None)
+    session.info.pop('pending_writes', None)
+    session.info.pop('reports_changed', None)
+
+# Cache shared by all worker processes: memory:// (single process), sqlite:///path or redis://...
+app.config.setdefault('CACHE_URL', os.getenv('CACHE_URL', 'memory://'))
+app.config.setdefault('REPORT_CACHE_SECONDS', int(os.getenv('REPORT_CACHE_SECONDS', 300)))
+shared_cache = SharedCache(cache_backend_from_url(app.config['CACHE_URL']))
+
+@event.listens_for(SASession, 'after_flush')
+def note_report_changes(session, flush_context):
+    session.info['pending_writes'] = True
+    if any(isinstance(obj, (Order, OrderItem, Expense, Product))
+           for obj in [*session.new, *session.dirty, *session.deleted]):
+        session.info['reports_changed'] = True
+
+@event.listens_for(SASession, 'do_orm_execute')
+def note_statement_writes(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['pending_writes'] = True
+    # Bulk deletes skip the mapper events, so the catalogue doesn't know which rows went
+    if orm_execute_state.is_delete and orm_execute_state.bind_mapper is Product.__mapper__:
+        orm_execute_state.session.info['catalogue_reload'] = True
+
+@event.listens_for(SASession, 'after_commit')
+def invalidate_shared_reports(session):
+    session.info.pop('pending_writes', None)
+    if session.info.pop('reports_changed', False):
+        try:
+            shared_cache.invalidate('reports')
+            shared_cache.invalidate('stats')
+        except Exception as e:
+            logger.error(f"Error invalidating shared report cache: {str(e)}")
+
+def cached_report(namespace):
+    """
+    Keep a report helper's result in the shared cache, keyed by its arguments, until
+    REPORT_CACHE_SECONDS pass or a committed write invalidates the namespace.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args):
+            # A result that includes this transaction's uncommitted writes must not be shared
+            if db.session.info.get('pending_writes'):
+                return f(*args)
+            key = ':'.join([f.__name__, *map(str, args)])
+            return shared_cache.get_or_set(namespace, key, lambda: f(*args), app.config['REPORT_CACHE_SECONDS'])
+        return wrapper
+    return decorator
+
+class ProductSnapshot(SimpleNamespace):
+    """Read-only copy of a product row held in the catalogue cache, with Product's derived properties"""
+    profit_margin = Product.profit_margin
+    stock_status = Product.stock_status
+    stock_percentage = Product.stock_percentage
+
+    def replace(self, **values):
+        return ProductSnapshot(**{**vars(self), **values})
+
+def load_catalogue(ids=None):
+    """Product rows for the catalogue cache: all of them, or only the given ids"""
+    query = db.select(Product.__table__)
+    if ids is not None:
+        query = query.where(Product.id.in_(ids))
+    return [ProductSnapshot(**row) for row in db.session.execute(query).mappings()]
+
+catalogue_subscription = shared_cache.subscribe('catalogue')
+
+def poll_catalogue_changes():
+    """Product ids other workers changed since the last lookup, None if they must all be re-read"""
+    try:
+        messages = catalogue_subscription.poll()
+    except Exception as e:
+        logger.error(f"Error polling catalogue changes: {str(e)}")
+        return set()
+    if messages is None or None in messages:
+        return None
+    return {product_id for product_ids in messages for product_id in product_ids}
+
+def publish_catalogue_changes(product_ids):
+    """Tell other workers to re-read these products (None: the whole catalogue)"""
+    try:
+        shared_cache.publish('catalogue', product_ids)
+    except Exception as e:
+        logger.error(f"Error publishing catalogue changes: {str(e)}")
+
+app.config.setdefault('CATALOGUE_CACHE_SECONDS', int(os.getenv('CATALOGUE_CACHE_SECONDS', 300)))
+catalogue = CatalogueCache(load_catalogue, max_age=app.config['CATALOGUE_CACHE_SECONDS'],
+                           sync=poll_catalogue_changes)
+
+@event.listens_for(Product, 'after_insert')
+@event.listens_for(Product, 'after_update')
+@event.listens_for(Product, 'after_delete')
+def queue_catalogue_change(mapper, connection, target):
+    """Products written through the ORM are re-read by the catalogue cache once the write commits"""
+    db.inspect(target).session.info.setdefault('catalogue_changes', set()).add(target.id)
+
+@event.listens_for(SASession, 'after_commit')
+def invalidate_catalogue(session):
+    changes = session.info.pop('catalogue_changes', None)
+    if session.info.pop('catalogue_reload', False):
+        catalogue.invalidate()
+        publish_catalogue_changes(None)
+    elif changes:
+        catalogue.invalidate(changes)
+        publish_catalogue_changes(sorted(changes))
+
+# Socket.IO room joined by staff and admin clients; new online orders are announced there
+STAFF_ROOM = 'staff'
+
+def queue_new_online_order(session, summary):
+    """Announce an online order to the staff room once the transaction that wrote it commits"""
+    session.info.setdefault('new_online_orders', []).append(summary)
+
+@event.listens_for(SASession, 'after_commit')
+def emit_new_online_orders(session):
+    for summary in session.info.pop('new_online_orders', []):
+        try:
+            socketio.emit('new_online_order', summary, to=STAFF_ROOM)
+        except Exception as e:
+            logger.error(f"Error emitting new online order: {str(e)}")
+
 class StockMovement(db.Model):
+    __table_args__ = (
+        db.Index('ix_stock_movement_timestamp', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Float, nullable=False)  # Quantity in kgs/ltrs
@@ -441,6 +808,12 @@ class PriceChange(db.Model):
     changed_by = db.relationship('User', backref=db.backref('price_changes', passive_deletes=True))
 
 class Order(db.Model):
+    __table_args__ = (
+        # Reports filter on order_date ranges, optionally narrowed by status/type or by the staff member
+        db.Index('ix_order_order_date', 'order_date'),
+        db.Index('ix_order_status_type_date', 'status', 'order_type', 'order_date'),
+        db.Index('ix_order_created_by_date', 'created_by_id', 'order_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     reference_number = db.Column(db.String(50), unique=True, nullable=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
@@ -471,6 +844,7 @@ class OrderItem(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
+    buying_price = db.Column(db.Float, nullable=True)  # Unit cost price at the time of sale
     product = db.relationship('Product', backref='order_items')
     
     # Added to calculate subtotal
@@ -478,6 +852,16 @@ class OrderItem(db.Model):
     def subtotal(self):
         return self.quantity * self.price
 
+class DailySalesRollup(db.Model):
+    """Pre-aggregated sales totals per day and order type, kept up to date as orders are written"""
+    __tablename__ = 'daily_sales_rollup'
+    date = db.Column(db.Date, primary_key=True)
+    order_type = db.Column(db.String(20), primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    cogs = db.Column(db.Float, nullable=False, default=0.0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    items_sold = db.Column(db.Float, nullable=False, default=0.0)
+
 class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)  # Make nullable for anonymous users
@@ -489,7 +873,8 @@ class CartItem(db.Model):
     cart_id = db.Column(db.Integer, db.ForeignKey('cart.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    product = db.relationship('Product', backref='cart_items')
+    # Loaded with the item in the same query; cart pages always show the product
+    product = db.relationship('Product', backref='cart_items', lazy='joined')
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -504,34 +889,27 @@ def debug_route():
         'authenticated': current_user.is_authenticated if hasattr(current_user, 'is_authenticated') else False,
         'route': request.path,
         'method': request.method,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow().isoformat(),
+        'database': {
+            'dialect': db.engine.dialect.name,
+            'pool_size': db.engine.pool.size() if hasattr(db.engine.pool, 'size') else None,
+            'sqlite_pragmas': get_sqlite_pragmas()
+        },
+        'catalogue_cache': catalogue.stats(),
+        'fragment_cache': product_fragment_cache.stats(),
+        'shared_cache': shared_cache.stats()
     })
 
 @app.route('/')
 def index():
-    # Improved version with product categories
-    products = Product.query.order_by(Product.name).all()
-    categories = get_grocery_categories()
-    
-    # Group products by category
-    categorized_products = {}
-    for product in products:
-        if product.category not in categorized_products:
-            categorized_products[product.category] = []
-        categorized_products[product.category].append(product)
-    
-    # Create flat category list for dropdown
-    flat_categories = []
-    for category_group in categories:
-        group_id, group_name, subcategories = category_group
-        for subcat_id, subcat_name in subcategories:
-            flat_categories.append((subcat_id, subcat_name, group_name))
-    
+    # Only the first page is rendered; the page fetches the rest from /api/catalogue on scroll
+    products, next_cursor = get_catalogue_page()
     return versioned_render_template('index.html', 
                            products=products,
-                           categorized_products=categorized_products,
-                           categories=categories,
-                           flat_categories=flat_categories)
+                           product_cards=product_fragments('_product_card.html', products),
+                           next_cursor=next_cursor,
+                           categories=GROCERY_CATEGORIES,
+                           category_counts=catalogue.category_counts())
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -560,34 +938,23 @@ def register():
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    print('--- LOGIN ROUTE HIT ---')
     if current_user.is_authenticated:
-        print('Already authenticated:', current_user.username)
         if current_user.is_admin:
-            print('Redirecting to admin')
             return redirect(url_for('admin'))
         elif current_user.is_staff:
-            print('Redirecting to staff_orders')
             return redirect(url_for('staff_orders'))
         else:
-            print('Redirecting to index')
             return redirect(url_for('index'))
     
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         remember = 'remember' in request.form
-        print(f'POST login: username={username}, password={password}')
         user = User.query.filter_by(username=username).first()
-        print('User found:', bool(user))
-        if user:
-            print('User is_admin:', user.is_admin)
-            print('User is_staff:', user.is_staff)
-            print('Checking password...')
-            print('Password check:', user.check_password(password))
         if user and user.check_password(password):
-            print('Password correct, logging in...')
+            logger.debug("Login succeeded for %s", username)
             login_user(user, remember=remember)
+            session.pop('cart_count', None)  # the user's own cart replaces the anonymous one
             user.is_online = True  # Set online status
             db.session.commit()
             # --- EMAIL LOGIC START ---
@@ -609,7 +976,6 @@ def login():
                 app.logger.error(f"Failed to send login email: {e}")
             # --- EMAIL LOGIC END ---
             next_page = request.args.get('next')
-            print('Next page:', next_page)
             if not next_page or url_parse(next_page).netloc != '':
                 if user.is_admin:
                     next_page = url_for('admin')
@@ -617,10 +983,9 @@ def login():
                     next_page = url_for('staff_orders')
                 else:
                     next_page = url_for('index')
-            print('Redirecting to:', next_page)
             return redirect(next_page)
         else:
-            print('Invalid username or password')
+            logger.info("Failed login attempt for %s", username)
             flash('Invalid username or password')
     return versioned_render_template('login.html')
 
@@ -629,10 +994,11 @@ def login():
 def logout():
     from datetime import datetime, timedelta
     # Set last_seen to now and set is_online to False
-    current_user.last_seen = datetime.utcnow()
+    current_user.last_seen = presence.touch(current_user.id)
     current_user.is_online = False
     db.session.commit()
     logout_user()
+    session.pop('cart_count', None)
     return redirect(url_for('index'))
 
 @app.route('/profile', methods=['GET', 'POST'])
@@ -708,20 +1074,24 @@ def admin():
     dates = []
     sales_data = []
     
-    # Get sales for the last 7 days
+    # Get sales for the last 7 days in one grouped query over an order_date range
+    today = datetime.now().date()
+    week_start = today - timedelta(days=6)
+    order_day = func.date(Order.order_date)
+    sales_by_day = {
+        _report_day_key(day): total
+        for day, total in db.session.query(order_day, func.sum(Order.total_amount)).filter(
+            Order.order_date >= datetime.combine(week_start, datetime.min.time()),
+            Order.order_date < datetime.combine(today + timedelta(days=1), datetime.min.time())
+        ).group_by(order_day).all()
+    }
     for i in range(6, -1, -1):
-        date = datetime.now() - timedelta(days=i)
-        daily_sales = Order.query.filter(
-            func.date(Order.order_date) == date.date()
-        ).with_entities(func.sum(Order.total_amount)).scalar() or 0
-        
-        dates.append(date.strftime('%Y-%m-%d'))
-        sales_data.append(float(daily_sales))
+        day_key = (today - timedelta(days=i)).strftime('%Y-%m-%d')
+        dates.append(day_key)
+        sales_data.append(float(sales_by_day.get(day_key) or 0))
     
     # Calculate today's sales
-    today_sales = Order.query.filter(
-        func.date(Order.order_date) == datetime.now().date()
-    ).with_entities(func.sum(Order.total_amount)).scalar() or 0
+    today_sales = sales_by_day.get(today.strftime('%Y-%m-%d')) or 0
     
     # Get product statistics
     total_products = Product.query.count()
@@ -934,26 +1304,24 @@ def view_cart():
             if not current_user.is_authenticated:
                 session['cart_id'] = cart.id
         
-        # Validate cart items and remove any invalid ones (always fetch latest product info)
+        # Validate cart items and remove any invalid ones; items come with their products in one query
+        cart_items = []
         invalid_items = []
         for item in cart.items:
-            # Always fetch the latest product info from the database
-            product = Product.query.get(item.product_id)
-            if not product or product.stock <= 0 or item.quantity <= 0:
+            if not item.product or item.product.stock <= 0 or item.quantity <= 0:
                 invalid_items.append(item)
             else:
-                # Update the item.product reference to the latest product
-                item.product = product
+                cart_items.append(item)
+        
+        # Total from the rows already loaded, before a commit would expire them
+        total_amount = sum(item.quantity * item.product.price for item in cart_items)
         
         if invalid_items:
             for item in invalid_items:
                 db.session.delete(item)
             db.session.commit()
             flash('Some items were removed from your cart because they are no longer available', 'warning')
-        
-        # Get cart items and calculate total
-        cart_items = CartItem.query.filter_by(cart_id=cart.id).all()
-        total_amount = sum(item.quantity * Product.query.get(item.product_id).price for item in cart_items)
+        remember_cart_count(sum(item.quantity for item in cart_items))
         
         return render_template('cart.html', cart_items=cart_items, total_amount=total_amount)
     except Exception as e:
@@ -1032,9 +1400,8 @@ def add_to_cart(product_id):
         db.session.commit()
         
         # Return cart count and total in the response for UI update
-        cart_items = CartItem.query.filter_by(cart_id=cart.id).all()
-        cart_count = sum(item.quantity for item in cart_items)
-        cart_total = sum(item.quantity * item.product.price for item in cart_items)
+        cart_count, cart_total = get_cart_totals(cart.id)
+        remember_cart_count(cart_count)
         
         return jsonify({
             'success': True, 
@@ -1079,6 +1446,22 @@ def get_cart():
         logger.error(f'Error getting cart: {str(e)}')
         return None
 
+def get_cart_totals(cart_id):
+    """(item count, total value) of a cart, summed in SQL so the cost doesn't grow with the number of items"""
+    count, total = db.session.query(
+        func.coalesce(func.sum(CartItem.quantity), 0),
+        func.coalesce(func.sum(CartItem.quantity * Product.price), 0.0)
+    ).join(Product, Product.id == CartItem.product_id).filter(CartItem.cart_id == cart_id).one()
+    return int(count), float(total)
+
+def remember_cart_count(count):
+    """
+    Keep the active cart's item count in the signed session, so /get_cart_count answers
+    without a query. Every route that changes the cart stores the new count; dropping the
+    key (login, logout) makes the next /get_cart_count work it out from the database once.
+    """
+    session['cart_count'] = int(count)
+
 @app.route('/checkout', methods=['GET', 'POST'])
 def checkout():
     # Get cart items
@@ -1093,7 +1476,7 @@ def checkout():
     
     for item in cart.items:
         # Check stock levels before checkout
-        product = Product.query.get(item.product_id)
+        product = item.product
         if product and product.stock < item.quantity:
             insufficient_stock.append({
                 'product': product.name,
@@ -1142,6 +1525,7 @@ def checkout():
                 db.session.delete(item)
             db.session.commit()
             flash('Some items were removed from your cart because they are no longer available', 'warning')
+            session.pop('cart_count', None)
             if not cart.items:
                 flash('Your cart is now empty', 'error')
                 return redirect(url_for('view_cart'))
@@ -1184,77 +1568,32 @@ def checkout():
             }
             
             # Prepare items data from cart
-            items_data = []
-            for item in cart.items:
-                if not item.product:
-                    continue
-                    
-                # Fetch the latest product data to ensure stock accuracy
-                product = Product.query.get(item.product_id)
-                if not product:
-                    continue
-                    
-                # Verify stock availability
-                if item.quantity > product.stock:
-                    flash(f'Not enough stock for {product.name}. Only {product.stock} available.', 'error')
-                    return redirect(url_for('view_cart'))
-                    
-                # Add item to the list
-                items_data.append({
-                    'product_id': product.id,
+            items_data = [
+                {
+                    'product_id': item.product.id,
                     'quantity': item.quantity,
-                    'price': product.price,
-                    'name': product.name
-                })
-            
-            # Use the centralized function to create the order
-            order, error = create_order(customer_data, items_data, 'online')
-            logger.info(f'Order creation result: order={order}, error={error}')
-            if order:
-                logger.info(f'Created order ID: {getattr(order, "id", None)}')
-            else:
-                logger.warning('Order object is None after creation!')
-            
-            if error:
-                # If it's a detected duplicate, we can still proceed to the receipt
-                if "duplicate order" in error.lower() and hasattr(order, 'id') and order.id:
-                    flash('It appears this order was already processed!', 'info')
-                    # Mark cart as completed
-                    cart.status = 'completed'
-                    db.session.commit()
-                    # Use get_order_by_id for more resilient order retrieval
-                    order = get_order_by_id(order.id)
-                    if order:
-                        return redirect(url_for('print_receipt', order_id=order.id))
-                    else:
-                        flash('Order was created but could not be retrieved. Please check orders list.', 'warning')
-                        return redirect(url_for('index'))
-                elif "order created with id" in error.lower():
-                    # This is not really an error - order was created but couldn't be retrieved as object
-                    flash('Your order was successfully created!', 'success')
-                    # Mark cart as completed
-                    cart.status = 'completed'
-                    db.session.commit()
-                    # Extract order ID from the message
-                    try:
-                        import re
-                        match = re.search(r'Order created with ID[:\s]*(\d+)', error)
-                        if match:
-                            order_id = int(match.group(1))
-                            return redirect(url_for('print_receipt', order_id=order_id))
-                    except Exception as e:
-                        logger.error(f"Error extracting order ID from message: {error}, exception: {str(e)}")
-                        
-                    flash('Order was created but order ID could not be extracted. Please check your orders.', 'warning')
-                    return redirect(url_for('index'))
-                else:
-                    # For other errors, show error and return to cart
-                    flash(error, 'error')
-                    return redirect(url_for('view_cart'))
+                    'price': item.product.price,
+                    'name': item.product.name
+                }
+                for item in cart.items if item.product
+            ]
+            
+            # create_order() validates stock and writes the order in one transaction
+            result = create_order(customer_data, items_data, 'online')
+            if not result.success:
+                logger.warning(f'Order creation failed: {result.error} {result.issues}')
+                for issue in result.issues:
+                    flash(issue, 'error')
+                if not result.issues:
+                    flash(result.error, 'error')
+                return redirect(url_for('view_cart'))
+            order = result.order
+            logger.info(f'Created order ID: {order.id}')
             
             # Mark cart as completed
             cart.status = 'completed'
             db.session.commit()
+            remember_cart_count(0)
             
             # Store the order ID in session to prevent duplicates
             session['last_order_id'] = order.id
@@ -1289,8 +1628,7 @@ def print_receipt(order_id):
         if not order:
             # Try one more time with direct SQL as fallback
             try:
-                conn = sqlite3.connect('instance/pos.db')
-                conn.row_factory = sqlite3.Row
+                conn = get_raw_connection()
                 cursor = conn.cursor()
                 
                 # Get basic order info
@@ -1408,6 +1746,7 @@ def restock_product(product_id):
 def update_cart(item_id):
     try:
         cart_item = CartItem.query.get_or_404(item_id)
+        cart_id = cart_item.cart_id
         data = request.get_json()
         new_quantity = int(data.get('quantity', 1))
         
@@ -1423,9 +1762,8 @@ def update_cart(item_id):
         db.session.commit()
         
         # Calculate new cart total after update
-        cart = Cart.query.get(cart_item.cart_id)
-        cart_total = sum(item.quantity * item.product.price for item in cart.items)
-        cart_count = sum(item.quantity for item in cart.items)
+        cart_count, cart_total = get_cart_totals(cart_id)
+        remember_cart_count(cart_count)
         
         return jsonify({
             'success': True, 
@@ -1497,32 +1835,63 @@ def add_product():
     
     return render_template(
         'add_product.html',
-        currencies=get_currencies(),
-        units=get_product_units(),
-        categories=get_grocery_categories()
+        currencies=CURRENCIES,
+        units=PRODUCT_UNITS,
+        categories=GROCERY_CATEGORIES
     )
 
+# Most codes a buffering scanner may send in one /scan_barcodes request
+MAX_BATCH_SCAN = 200
+
+def scanned_product(product):
+    """Product fields returned for a scanned barcode"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'stock': product.stock
+    }
+
 @app.route('/scan_barcode', methods=['POST'])
 @login_required
 @staff_required
 def scan_barcode():
     try:
-        barcode = request.json.get('barcode')
+        barcode = str(request.json.get('barcode') or '').strip()
         if not barcode:
             return jsonify({'success': False, 'error': 'No barcode provided'}), 400
         
-        product = Product.query.filter_by(barcode=barcode).first()
+        product = catalogue.by_barcode(barcode)
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
         return jsonify({
             'success': True,
-            'product': {
-                'id': product.id,
-                'name': product.name,
-                'price': product.price,
-                'stock': product.stock
-            }
+            'product': scanned_product(product)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/scan_barcodes', methods=['POST'])
+@login_required
+@staff_required
+def scan_barcodes():
+    """Look up several scanned barcodes at once, for scanners that buffer codes"""
+    try:
+        barcodes = (request.get_json(silent=True) or {}).get('barcodes')
+        if not isinstance(barcodes, list) or not barcodes:
+            return jsonify({'success': False, 'error': 'No barcodes provided'}), 400
+        if len(barcodes) > MAX_BATCH_SCAN:
+            return jsonify({'success': False, 'error': f'At most {MAX_BATCH_SCAN} barcodes per request'}), 400
+        
+        matches = catalogue.by_barcodes([str(code).strip() for code in barcodes])
+        products = {barcode: scanned_product(product) for barcode, product in matches.items() if product}
+        not_found = [barcode for barcode, product in matches.items() if not product]
+        
+        return jsonify({
+            'success': True,
+            'products': products,
+            'not_found': not_found
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1530,11 +1899,13 @@ def scan_barcode():
 @app.route('/add_to_cart_barcode', methods=['POST'])
 def add_to_cart_barcode():
     try:
-        barcode = request.json.get('barcode')
+        barcode = str(request.json.get('barcode') or '').strip()
         if not barcode:
             return jsonify({'success': False, 'error': 'No barcode provided'}), 400
         
-        product = Product.query.filter_by(barcode=barcode).first()
+        # The barcode index only finds the id; stock is checked against the row, not the cached copy
+        cached = catalogue.by_barcode(barcode)
+        product = db.session.get(Product, cached.id) if cached else None
         if not product:
             return jsonify({'success': False, 'error': 'Product not found'}), 404
         
@@ -1571,6 +1942,7 @@ def add_to_cart_barcode():
             db.session.add(cart_item)
         
         db.session.commit()
+        remember_cart_count(get_cart_totals(cart.id)[0])
         return jsonify({
             'success': True,
             'message': 'Product added to cart',
@@ -1586,12 +1958,343 @@ def add_to_cart_barcode():
         logger.error(f'Error adding product to cart: {str(e)}')
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Most operations accepted by one /api/cart/batch request
+MAX_CART_BATCH = 200
+
+@app.route('/api/cart/batch', methods=['POST'])
+def cart_batch():
+    """
+    Add several products to the active cart in one transaction, e.g. a burst of scans or
+    cart changes replayed after working offline.
+
+    Body: {"operations": [{"product_id": 1, "quantity": 2}, {"barcode": "123", "quantity": 1}, ...]}
+    Stock is checked once per product against the combined quantity. If any operation
+    can't be applied nothing is changed and the problems are listed in "issues".
+    """
+    try:
+        operations = (request.get_json(silent=True) or {}).get('operations')
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'success': False, 'error': 'No operations provided'}), 400
+        if len(operations) > MAX_CART_BATCH:
+            return jsonify({'success': False, 'error': f'At most {MAX_CART_BATCH} operations per request'}), 400
+
+        issues = []
+        barcodes = catalogue.by_barcodes([
+            str(op.get('barcode')).strip() for op in operations if isinstance(op, dict) and op.get('barcode')
+        ])
+        requested = {}
+        for position, op in enumerate(operations, start=1):
+            if not isinstance(op, dict):
+                issues.append(f"Operation {position}: expected an object")
+                continue
+            try:
+                quantity = int(op.get('quantity', 1))
+            except (TypeError, ValueError):
+                quantity = 0
+            if quantity <= 0:
+                issues.append(f"Operation {position}: invalid quantity {op.get('quantity')!r}")
+                continue
+            if op.get('barcode'):
+                product = barcodes.get(str(op['barcode']).strip())
+                if not product:
+                    issues.append(f"Operation {position}: no product with barcode {op['barcode']}")
+                    continue
+                product_id = product.id
+            else:
+                try:
+                    product_id = int(op.get('product_id'))
+                except (TypeError, ValueError):
+                    issues.append(f"Operation {position}: product_id or barcode required")
+                    continue
+            requested[product_id] = requested.get(product_id, 0) + quantity
+
+        # Active cart, created in this transaction if there isn't one yet
+        cart = None
+        if current_user.is_authenticated:
+            cart = Cart.query.filter_by(user_id=safe_user_id(), status='active').first()
+        else:
+            cart_id = session.get('cart_id')
+            if cart_id:
+                cart = db.session.get(Cart, cart_id)
+                if cart and cart.status != 'active':
+                    cart = None
+        if not cart:
+            cart = Cart(status='active', user_id=safe_user_id() if current_user.is_authenticated else None)
+            db.session.add(cart)
+            db.session.flush()
+
+        # One query for what's already in the cart and one for the other products
+        cart_items = {
+            item.product_id: item
+            for item in CartItem.query.filter_by(cart_id=cart.id).all()
+        }
+        products = {product_id: item.product for product_id, item in cart_items.items()}
+        missing_ids = [product_id for product_id in requested if product_id not in products]
+        if missing_ids:
+            products.update(
+                (product.id, product) for product in Product.query.filter(Product.id.in_(missing_ids)).all()
+            )
+
+        for product_id, quantity in requested.items():
+            product = products.get(product_id)
+            if product is None:
+                issues.append(f"Product {product_id} not found")
+                continue
+            in_cart = cart_items[product_id].quantity if product_id in cart_items else 0
+            if in_cart + quantity > product.stock:
+                issues.append(f"Not enough stock for {product.name}: {in_cart + quantity} requested, {product.stock} available")
+
+        if issues:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Cart not updated', 'issues': issues}), 400
+
+        for product_id, quantity in requested.items():
+            if product_id in cart_items:
+                cart_items[product_id].quantity += quantity
+            else:
+                cart_items[product_id] = CartItem(cart_id=cart.id, product_id=product_id, quantity=quantity)
+                db.session.add(cart_items[product_id])
+
+        # Cart state is built before the commit so nothing needs to be reloaded afterwards
+        items = [
+            {
+                'product_id': product_id,
+                'name': products[product_id].name,
+                'price': products[product_id].price,
+                'quantity': item.quantity,
+                'subtotal': item.quantity * products[product_id].price
+            }
+            for product_id, item in cart_items.items()
+            if products.get(product_id) is not None
+        ]
+        cart_id = cart.id
+        db.session.commit()
+        if not current_user.is_authenticated:
+            session['cart_id'] = cart_id
+        cart_count = sum(item['quantity'] for item in items)
+        remember_cart_count(cart_count)
+
+        return jsonify({
+            'success': True,
+            'items': items,
+            'cart_count': cart_count,
+            'cart_total': sum(item['subtotal'] for item in items)
+        })
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error applying cart batch: {str(e)}')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/reports')
 @login_required
 @admin_required
 def reports():
     return render_template('reports.html')
 
+# Orders in these statuses are left out of sales reports and the daily rollup
+REPORT_EXCLUDED_STATUSES = ('cancelled',)
+
+SALES_ROLLUP_UPSERT_SQL = text("""
+    INSERT INTO daily_sales_rollup (date, order_type, revenue, cogs, order_count, items_sold)
+    VALUES (:day, :order_type, :revenue, :cogs, :order_count, :items_sold)
+    ON CONFLICT (date, order_type) DO UPDATE SET
+        revenue = daily_sales_rollup.revenue + excluded.revenue,
+        cogs = daily_sales_rollup.cogs + excluded.cogs,
+        order_count = daily_sales_rollup.order_count + excluded.order_count,
+        items_sold = daily_sales_rollup.items_sold + excluded.items_sold
+""").bindparams(bindparam('day', type_=db.Date))
+
+SALES_ROLLUP_REBUILD_SQL = text("""
+    INSERT INTO daily_sales_rollup (date, order_type, revenue, cogs, order_count, items_sold)
+    SELECT DATE(o.order_date), COALESCE(o.order_type, 'online'),
+           SUM(o.total_amount), SUM(COALESCE(i.cogs, 0)), COUNT(o.id), SUM(COALESCE(i.items_sold, 0))
+    FROM "order" o
+    LEFT JOIN (
+        SELECT order_id,
+               SUM(quantity * COALESCE(buying_price, 0)) AS cogs,
+               SUM(quantity) AS items_sold
+        FROM order_item
+        GROUP BY order_id
+    ) i ON i.order_id = o.id
+    WHERE o.order_date IS NOT NULL AND o.status != 'cancelled'
+    GROUP BY DATE(o.order_date), COALESCE(o.order_type, 'online')
+""")
+
+# Conditional decrement used with executemany by Product.sell_stock_batch()
+STOCK_SALE_SQL = text("""
+    UPDATE product
+    SET stock = stock - :quantity, updated_at = :now
+    WHERE id = :product_id AND stock >= :quantity
+""").bindparams(bindparam('now', type_=db.DateTime))
+
+# Older order items have no cost snapshot, fall back to the product's current cost for those
+ORDER_ITEM_COST_BACKFILL_SQL = """
+    UPDATE order_item
+    SET buying_price = (SELECT product.buying_price FROM product WHERE product.id = order_item.product_id)
+    WHERE buying_price IS NULL
+"""
+
+def record_sales_rollup(order_date, order_type, revenue, cogs, items_sold, order_count=1):
+    """
+    Add an order's totals to the daily sales rollup as part of the current transaction.
+    Pass negative amounts and order_count=-1 to take an order back out of the rollup.
+    """
+    db.session.execute(SALES_ROLLUP_UPSERT_SQL, {
+        'day': order_date.date() if isinstance(order_date, datetime) else order_date,
+        'order_type': order_type or 'online',
+        'revenue': float(revenue or 0),
+        'cogs': float(cogs or 0),
+        'order_count': order_count,
+        'items_sold': float(items_sold or 0)
+    })
+    # Text statements don't show up in the flush, so flag the report caches directly
+    db.session.info['reports_changed'] = True
+
+def adjust_sales_rollup_for_order(order_id, direction):
+    """
+    Add (direction=1) or remove (direction=-1) a saved order's totals from the daily rollup,
+    used when an order moves into or out of an excluded status such as 'cancelled'.
+    """
+    order = db.session.get(Order, order_id)
+    if not order or not order.order_date:
+        return
+    cogs, items_sold = db.session.query(
+        db.func.coalesce(db.func.sum(OrderItem.quantity * OrderItem.buying_price), 0),
+        db.func.coalesce(db.func.sum(OrderItem.quantity), 0)
+    ).filter(OrderItem.order_id == order_id).one()
+    record_sales_rollup(
+        order.order_date,
+        order.order_type,
+        direction * (order.total_amount or 0),
+        direction * cogs,
+        direction * items_sold,
+        order_count=direction
+    )
+
+def rebuild_sales_rollup():
+    """
+    Recompute the daily sales rollup from the full order history.
+    Returns:
+        int: Number of rollup rows written
+    """
+    db.session.execute(text('DELETE FROM daily_sales_rollup'))
+    db.session.execute(SALES_ROLLUP_REBUILD_SQL)
+    db.session.info['reports_changed'] = True
+    db.session.commit()
+    return DailySalesRollup.query.count()
+
+def _report_day_key(value):
+    """Normalise a DATE() value returned by the database to a 'YYYY-MM-DD' string"""
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10] if value else None
+
+def _expense_rows_by_day(range_start, range_end):
+    """Total expenses per day for range_start <= date < range_end"""
+    expense_day = db.func.date(Expense.date)
+    return db.session.query(
+        expense_day, db.func.sum(Expense.amount)
+    ).filter(
+        Expense.date >= range_start,
+        Expense.date < range_end
+    ).group_by(expense_day).all()
+
+def _zero_filled_financials(start_date, end_date, sales_rows, cogs_rows, expense_rows):
+    """Merge (day, amount) rows into a per-day dict, with zeros for days without activity"""
+    totals = {}
+    totals_by_key = {}
+    current_date = start_date
+    while current_date <= end_date:
+        totals[current_date] = {'sales': 0.0, 'cogs': 0.0, 'expenses': 0.0}
+        totals_by_key[current_date.strftime('%Y-%m-%d')] = totals[current_date]
+        current_date += timedelta(days=1)
+
+    for field, rows in (('sales', sales_rows), ('cogs', cogs_rows), ('expenses', expense_rows)):
+        for day_value, amount in rows:
+            day_totals = totals_by_key.get(_report_day_key(day_value))
+            if day_totals is not None and amount:
+                day_totals[field] += float(amount)
+
+    return totals
+
+def _sum_financials(financials, first_day, last_day):
+    """Sum the per-day totals from get_*_financials() between two days (inclusive)"""
+    summed = {'sales': 0.0, 'cogs': 0.0, 'expenses': 0.0}
+    day = first_day
+    while day <= last_day:
+        for field, amount in financials.get(day, {}).items():
+            summed[field] += amount
+        day += timedelta(days=1)
+    return summed
+
+@cached_report('reports')
+def get_daily_financials(start_date, end_date):
+    """
+    Aggregate sales, cost of goods sold and expenses per day for a date range.
+
+    Runs one grouped query each over orders, order items and expenses instead of
+    querying every day separately, then zero-fills days without activity.
+
+    Args:
+        start_date: First day of the range (inclusive)
+        end_date: Last day of the range (inclusive)
+    Returns:
+        dict: {date: {'sales': float, 'cogs': float, 'expenses': float}} ordered by day
+    """
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+
+    order_day = db.func.date(Order.order_date)
+    sales_rows = db.session.query(
+        order_day, db.func.sum(Order.total_amount)
+    ).filter(
+        Order.order_date >= range_start,
+        Order.order_date < range_end,
+        Order.status.notin_(REPORT_EXCLUDED_STATUSES)
+    ).group_by(order_day).all()
+
+    # Cost of goods uses the unit cost captured on each order item when it was sold
+    cogs_rows = db.session.query(
+        order_day, db.func.sum(OrderItem.quantity * OrderItem.buying_price)
+    ).join(
+        OrderItem, OrderItem.order_id == Order.id
+    ).filter(
+        Order.order_date >= range_start,
+        Order.order_date < range_end,
+        Order.status.notin_(REPORT_EXCLUDED_STATUSES)
+    ).group_by(order_day).all()
+
+    expense_rows = _expense_rows_by_day(range_start, range_end)
+
+    return _zero_filled_financials(start_date, end_date, sales_rows, cogs_rows, expense_rows)
+
+@cached_report('reports')
+def get_rollup_financials(start_date, end_date):
+    """
+    Same result as get_daily_financials(), but reads sales and cost of goods from the
+    daily_sales_rollup table so long ranges cost one row per day instead of one per order item.
+    """
+    rollup_rows = db.session.query(
+        DailySalesRollup.date,
+        db.func.sum(DailySalesRollup.revenue),
+        db.func.sum(DailySalesRollup.cogs)
+    ).filter(
+        DailySalesRollup.date >= start_date,
+        DailySalesRollup.date <= end_date
+    ).group_by(DailySalesRollup.date).all()
+
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    expense_rows = _expense_rows_by_day(range_start, range_end)
+
+    return _zero_filled_financials(
+        start_date,
+        end_date,
+        [(day, revenue) for day, revenue, _ in rollup_rows],
+        [(day, cogs) for day, _, cogs in rollup_rows],
+        expense_rows
+    )
+
 @app.route('/api/sales/daily', methods=['GET'])
 @login_required
 @admin_required
@@ -1609,55 +2312,28 @@ def daily_sales():
         end_date = datetime.now().date()
         start_date = end_date - timedelta(days=days-1)
         
-        # Initialize data structures
-        dates = []
+        # Aggregate the whole range in a few grouped queries
+        financials = get_daily_financials(start_date, end_date)
+        
+        dates_str = []
         sales_data = []
         profit_data = []
         expenses_data = []
         net_profit_data = []
         
-        # Generate list of dates
-        current_date = start_date
-        while current_date <= end_date:
-            dates.append(current_date)
-            current_date += timedelta(days=1)
-        
-        for date in dates:
-            # Get total sales for the day
-            daily_sales = db.session.query(db.func.sum(Order.total_amount)).filter(
-                db.func.date(Order.order_date) == date
-            ).scalar()
-            
-            daily_total = float(daily_sales) if daily_sales else 0.0
-            sales_data.append(daily_total)
-            
-            # Calculate cost of goods sold
-            daily_orders = Order.query.filter(db.func.date(Order.order_date) == date).all()
-            cost_of_goods = 0.0
-            
-            for order in daily_orders:
-                for item in order.items:
-                    cost_of_goods += item.quantity * item.product.buying_price
-            
-            # Get daily expenses
-            daily_expenses = db.session.query(db.func.sum(Expense.amount)).filter(
-                db.func.date(Expense.date) == date
-            ).scalar()
-            
-            daily_expenses = float(daily_expenses) if daily_expenses else 0.0
-            expenses_data.append(daily_expenses)
-            
+        for day, totals in financials.items():
             # Calculate gross profit (sales - cost of goods)
-            gross_profit = daily_total - cost_of_goods
+            gross_profit = totals['sales'] - totals['cogs']
             
             # Calculate net profit (gross profit - expenses)
-            net_profit = gross_profit - daily_expenses
+            net_profit = gross_profit - totals['expenses']
             
+            dates_str.append(day.strftime('%Y-%m-%d'))
+            sales_data.append(totals['sales'])
+            expenses_data.append(totals['expenses'])
             profit_data.append(gross_profit)
             net_profit_data.append(net_profit)
         
-        dates_str = [date.strftime('%Y-%m-%d') for date in dates]
-        
         return jsonify({
             'dates': dates_str or [],
             'sales': sales_data or [],
@@ -1691,10 +2367,15 @@ def weekly_sales():
         end_date = datetime.now().date()
         start_date = end_date - timedelta(weeks=weeks)
         
+        # Aggregate every day in the range once, then fold the days into weeks
+        financials = get_daily_financials(start_date, end_date)
+        
         # Initialize data structures
         weeks_data = []
         sales_data = []
         profit_data = []
+        expenses_data = []
+        net_profit_data = []
         
         # Process each week
         current_date = start_date
@@ -1703,25 +2384,15 @@ def weekly_sales():
             week_start = current_date
             week_end = min(week_start + timedelta(days=6), end_date)
             
-            # Get orders for the week using more efficient query
-            weekly_total = db.session.query(db.func.sum(Order.total_amount)).filter(
-                db.func.date(Order.order_date) >= week_start,
-                db.func.date(Order.order_date) <= week_end
-            ).scalar()
+            weekly = _sum_financials(financials, week_start, week_end)
             
-            # Add NULL check to avoid issues with NULL dates
-            weekly_total = db.session.query(db.func.sum(Order.total_amount)).filter(
-                db.func.date(Order.order_date) >= week_start,
-                db.func.date(Order.order_date) <= week_end,
-                Order.order_date.isnot(None)
-            ).scalar()
-            
-            weekly_total = float(weekly_total) if weekly_total else 0.0
-            sales_data.append(weekly_total)
+            # Calculate gross profit (sales - cost of goods)
+            gross_profit = weekly['sales'] - weekly['cogs']
             
-            # Calculate profit (simplified as 20% of sales)
-            weekly_profit = weekly_total * 0.2
-            profit_data.append(weekly_profit)
+            sales_data.append(weekly['sales'])
+            profit_data.append(gross_profit)
+            expenses_data.append(weekly['expenses'])
+            net_profit_data.append(gross_profit - weekly['expenses'])
             
             # Format week label
             week_label = f"{week_start.strftime('%Y-%m-%d')} to {week_end.strftime('%Y-%m-%d')}"
@@ -1733,7 +2404,10 @@ def weekly_sales():
         return jsonify({
             'weeks': weeks_data,
             'sales': sales_data,
-            'profit': profit_data
+            'profit': profit_data,  # for frontend compatibility
+            'gross_profit': profit_data,
+            'expenses': expenses_data,
+            'net_profit': net_profit_data
         })
     
     except Exception as e:
@@ -1758,6 +2432,10 @@ def monthly_sales():
         
         # Calculate start and end dates
         end_date = datetime.now().date().replace(day=1)
+        first_month = add_months(end_date, -(months - 1))
+        
+        # Read the whole period from the daily rollup in one pass
+        financials = get_rollup_financials(first_month, add_months(end_date, 1) - timedelta(days=1))
         
         # Initialize data structures
         months_data = []
@@ -1768,56 +2446,26 @@ def monthly_sales():
         
         # Process each month
         for i in range(months-1, -1, -1):
-            try:
-                # Calculate month dates
-                current_month = add_months(end_date, -i)
-                next_month = add_months(current_month, 1)
-                
-                # Get orders for the month
-                monthly_orders = Order.query.filter(
-                    db.func.date(Order.order_date) >= current_month,
-                    db.func.date(Order.order_date) < next_month
-                ).all()
-                
-                # Calculate total sales
-                monthly_total = sum(order.total_amount for order in monthly_orders)
-                sales_data.append(monthly_total)
-                
-                # Calculate cost of goods sold
-                cost_of_goods = 0.0
-                for order in monthly_orders:
-                    for item in order.items:
-                        cost_of_goods += item.quantity * item.product.buying_price
-                
-                # Get monthly expenses
-                monthly_expenses = db.session.query(db.func.sum(Expense.amount)).filter(
-                    db.func.date(Expense.date) >= current_month,
-                    db.func.date(Expense.date) < next_month
-                ).scalar()
-                
-                monthly_expenses = float(monthly_expenses) if monthly_expenses else 0.0
-                expenses_data.append(monthly_expenses)
-                
-                # Calculate gross profit (sales - cost of goods)
-                gross_profit = monthly_total - cost_of_goods
-                
-                # Calculate net profit (gross profit - expenses)
-                net_profit = gross_profit - monthly_expenses
-                
-                profit_data.append(gross_profit)
-                net_profit_data.append(net_profit)
-                
-                # Format month label
-                month_label = current_month.strftime('%B %Y')
-                months_data.append(month_label)
-            except Exception as month_err:
-                logger.error(f'Error processing month {i}: {str(month_err)}')
-                # Add zero values for months with errors to maintain data array length
-                sales_data.append(0.0)
-                profit_data.append(0.0)
-                expenses_data.append(0.0)
-                net_profit_data.append(0.0)
-                months_data.append(f"Error: Month -{i}")
+            # Calculate month dates
+            current_month = add_months(end_date, -i)
+            next_month = add_months(current_month, 1)
+            
+            monthly = _sum_financials(financials, current_month, next_month - timedelta(days=1))
+            
+            # Calculate gross profit (sales - cost of goods)
+            gross_profit = monthly['sales'] - monthly['cogs']
+            
+            # Calculate net profit (gross profit - expenses)
+            net_profit = gross_profit - monthly['expenses']
+            
+            sales_data.append(monthly['sales'])
+            expenses_data.append(monthly['expenses'])
+            profit_data.append(gross_profit)
+            net_profit_data.append(net_profit)
+            
+            # Format month label
+            month_label = current_month.strftime('%B %Y')
+            months_data.append(month_label)
         
         return jsonify({
             'months': months_data,
@@ -1846,6 +2494,10 @@ def yearly_sales():
         
         # Calculate start and end years
         current_year = datetime.now().year
+        first_year = current_year - years_count + 1
+        
+        # Read the whole period from the daily rollup in one pass
+        financials = get_rollup_financials(date(first_year, 1, 1), date(current_year, 12, 31))
         
         # Initialize data structures
         years_data = []
@@ -1855,56 +2507,22 @@ def yearly_sales():
         net_profit_data = []
         
         # Process each year
-        for year in range(current_year - years_count + 1, current_year + 1):
-            try:
-                # Calculate year dates
-                year_start = datetime(year, 1, 1).date()
-                year_end = datetime(year, 12, 31).date()
-                
-                # Get orders for the year
-                yearly_orders = Order.query.filter(
-                    db.func.date(Order.order_date) >= year_start,
-                    db.func.date(Order.order_date) <= year_end
-                ).all()
-                
-                # Calculate total sales
-                yearly_total = sum(order.total_amount for order in yearly_orders)
-                sales_data.append(yearly_total)
-                
-                # Calculate cost of goods sold
-                cost_of_goods = 0.0
-                for order in yearly_orders:
-                    for item in order.items:
-                        cost_of_goods += item.quantity * item.product.buying_price
-                
-                # Get yearly expenses
-                yearly_expenses = db.session.query(db.func.sum(Expense.amount)).filter(
-                    db.func.date(Expense.date) >= year_start,
-                    db.func.date(Expense.date) <= year_end
-                ).scalar()
-                
-                yearly_expenses = float(yearly_expenses) if yearly_expenses else 0.0
-                expenses_data.append(yearly_expenses)
-                
-                # Calculate gross profit (sales - cost of goods)
-                gross_profit = yearly_total - cost_of_goods
-                
-                # Calculate net profit (gross profit - expenses)
-                net_profit = gross_profit - yearly_expenses
-                
-                profit_data.append(gross_profit)
-                net_profit_data.append(net_profit)
-                
-                # Add year label
-                years_data.append(str(year))
-            except Exception as year_err:
-                logger.error(f'Error processing year {year}: {str(year_err)}')
-                # Add zero values for years with errors to maintain data array length
-                sales_data.append(0.0)
-                profit_data.append(0.0)
-                expenses_data.append(0.0)
-                net_profit_data.append(0.0)
-                years_data.append(str(year))
+        for year in range(first_year, current_year + 1):
+            yearly = _sum_financials(financials, date(year, 1, 1), date(year, 12, 31))
+            
+            # Calculate gross profit (sales - cost of goods)
+            gross_profit = yearly['sales'] - yearly['cogs']
+            
+            # Calculate net profit (gross profit - expenses)
+            net_profit = gross_profit - yearly['expenses']
+            
+            sales_data.append(yearly['sales'])
+            expenses_data.append(yearly['expenses'])
+            profit_data.append(gross_profit)
+            net_profit_data.append(net_profit)
+            
+            # Add year label
+            years_data.append(str(year))
         
         return jsonify({
             'years': years_data,
@@ -2005,9 +2623,11 @@ def edit_product(product_id):
     return render_template(
         'edit_product.html',
         product=product,
-        currencies=get_currencies(),
-        units=get_product_units(),
-        categories=get_grocery_categories()
+        currencies=CURRENCIES,
+        units=PRODUCT_UNITS,
+        categories=GROCERY_CATEGORIES,
+        category_names=CATEGORY_NAMES,
+        unit_names=UNIT_NAMES
     )
 
 @app.route('/delete_product/<int:product_id>', methods=['POST'])
@@ -2041,7 +2661,8 @@ def delete_product(product_id):
 @staff_required
 def in_store_sale():
     if request.method == 'GET':
-        products = Product.query.all()
+        products, next_cursor = get_catalogue_page()
+        product_items = product_fragments('_product_item.html', products)
         # Check if there's an admin monitoring this session
         admin_monitoring = session.get('admin_monitoring_id')
         monitored_staff_id = session.get('monitored_staff_id')
@@ -2051,9 +2672,12 @@ def in_store_sale():
             if admin and admin.is_admin and monitored_staff:
                 return render_template('in_store_sale.html', 
                                       products=products,
+                                      product_items=product_items,
+                                      next_cursor=next_cursor,
                                       admin_monitoring=admin,
                                       monitored_staff=monitored_staff)
-        return render_template('in_store_sale.html', products=products)
+        return render_template('in_store_sale.html', products=products, product_items=product_items,
+                               next_cursor=next_cursor)
     # Rest of the existing POST handling code...
     if not request.is_json:
         flash('Invalid request format', 'error')
@@ -2071,68 +2695,27 @@ def in_store_sale():
         items_data = data.get('items', [])
         # Debug logging
         app.logger.info(f"[ORDER CREATE] User: {safe_user_id() or 'guest'} ({getattr(current_user, 'username', 'guest')}), customer_data: {customer_data}")
-        # Verify stock levels before creating order
-        stock_issues = []
-        for item in items_data:
-            product_id = item.get('product_id')
-            quantity = item.get('quantity', 0)
-            
-            product = Product.query.get(product_id)
-            if not product:
-                stock_issues.append(f"Product ID {product_id} not found")
-                continue
-                
-            if product.stock < quantity:
-                stock_issues.append(f"Insufficient stock for {product.name}: requested {quantity}, available {product.stock}")
-        
-        if stock_issues:
+        # create_order() validates stock and writes the order in one transaction
+        result = create_order(customer_data, items_data, 'in-store')
+        if not result.success:
+            if result.issues:
+                return jsonify({
+                    'success': False,
+                    'error': result.error,
+                    'issues': result.issues
+                }), 400
             return jsonify({
                 'success': False,
-                'error': "Stock verification failed",
-                'issues': stock_issues
-            }), 400
+                'error': result.error or 'Unknown error creating order'
+            }), 500
         
-        # All stock checks passed, create the order
-        order, error = create_order(customer_data, items_data, 'in-store')
-        
-        if order:
-            # Create the reference number explicitly if it doesn't exist
-            reference_number = None
-            if hasattr(order, 'reference_number') and order.reference_number:
-                reference_number = order.reference_number
-            else:
-                reference_number = f"ORD-{datetime.utcnow().strftime('%Y%m%d')}-{order.id}"
-            
-            return jsonify({
-                'success': True,
-                'order_id': order.id,
-                'reference': reference_number,
-                'redirect_url': url_for('print_receipt', order_id=order.id)
-            })
-        else:
-            # If the error message contains an order ID, try to use that
-            order_id = None
-            try:
-                if error and "order created with id" in error.lower():
-                    import re
-                    match = re.search(r'Order created with ID[:\s]*(\d+)', error)
-                    if match:
-                        order_id = int(match.group(1))
-            except Exception as e:
-                logger.error(f"Error extracting order ID from message: {error}, exception: {str(e)}")
-            
-            if order_id:
-                return jsonify({
-                    'success': True,
-                    'order_id': order_id,
-                    'reference': f"ORD-{datetime.utcnow().strftime('%Y%m%d')}-{order_id}",
-                    'redirect_url': url_for('print_receipt', order_id=order_id)
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': error or 'Unknown error creating order'
-                }), 500
+        order = result.order
+        return jsonify({
+            'success': True,
+            'order_id': order.id,
+            'reference': order.reference_number,
+            'redirect_url': url_for('print_receipt', order_id=order.id)
+        })
     except Exception as e:
         logger.error(f"Error processing in-store sale: {str(e)}")
         return jsonify({
@@ -2143,45 +2726,24 @@ def in_store_sale():
 @app.route('/api/pending_orders')
 @login_required
 def pending_orders_api():
+    """
+    Latest pending online orders. Staff clients get new orders pushed as new_online_order
+    events; this endpoint is the fallback for the initial count and while the socket is down.
+    """
     try:
-        # Use direct SQL instead of ORM to avoid column issues
-        conn = db.engine.raw_connection()
-        cursor = conn.cursor()
-        
-        # Get online orders that are pending and haven't been processed
-        cursor.execute("""
-            SELECT id, customer_name, customer_phone, customer_email, customer_address, order_date, total_amount
-            FROM 'order'
-            WHERE order_type = 'online' AND status = 'pending'
-            ORDER BY order_date DESC
-            LIMIT 5
-        """)
+        # Get online orders that are pending and haven't been processed, with their item counts
+        pending_orders = db.session.query(Order, func.count(OrderItem.id)) \
+            .outerjoin(OrderItem, OrderItem.order_id == Order.id) \
+            .filter(Order.order_type == 'online', Order.status == 'pending') \
+            .group_by(Order.id) \
+            .order_by(Order.order_date.desc()) \
+            .limit(5) \
+            .all()
         
-        pending_orders = cursor.fetchall()
-        
-        # Format the orders data for the response
-        orders_data = []
-        for order in pending_orders:
-            # Get the order items count
-            cursor.execute("SELECT COUNT(*) FROM order_item WHERE order_id = ?", (order[0],))
-            items_count = cursor.fetchone()[0]
-            
-            # Format the order data
-            orders_data.append({
-                'id': order[0],
-                'customer_name': order[1] or 'Online Customer',
-                'order_date': order[5],
-                'total_amount': float(order[6]),
-                'items_count': items_count,
-                'customer_phone': order[2] or '',
-                'customer_email': order[3] or '',
-                'customer_address': order[4] or ''
-            })
-        
-        conn.close()
+        orders_data = [online_order_summary(order, items_count) for order, items_count in pending_orders]
         
         return jsonify({
-            'count': len(pending_orders),
+            'count': len(orders_data),
             'orders': orders_data
         })
     except Exception as e:
@@ -2192,177 +2754,170 @@ def pending_orders_api():
 @login_required
 def mark_order_processed(order_id):
     try:
-        conn = db.engine.raw_connection()
-        cursor = conn.cursor()
+        order = db.session.get(Order, order_id)
+        if order is None:
+            return jsonify({'success': False, 'error': f'Order #{order_id} not found'}), 404
         
-        # Start a transaction
-        conn.execute("BEGIN TRANSACTION")
-        
-        # Update status to completed and set updated_at timestamp
-        cursor.execute(
-            "UPDATE 'order' SET status = 'completed', updated_at = ?, completed_at = ? WHERE id = ?",
-            (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'), 
-             datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'), 
-             order_id)
-        )
-        
-        conn.commit()
-        conn.close()
+        # The status change and the rollup adjustment commit together
+        old_status = order.status
+        now = datetime.now()
+        order.status = 'completed'
+        order.updated_at = now
+        order.completed_at = now
+        # A previously cancelled order counts towards sales again
+        if old_status in REPORT_EXCLUDED_STATUSES:
+            adjust_sales_rollup_for_order(order.id, 1)
+        db.session.commit()
         
         return jsonify({
             'success': True,
             'message': f'Order #{order_id} marked as processed.'
         })
     except Exception as e:
-        # Make sure to rollback on error
-        try:
-            conn.rollback()
-            conn.close()
-        except:
-            pass
-            
+        db.session.rollback()
         logger.error(f'Error marking order as processed: {str(e)}')
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@dataclass
+class OrderResult:
+    """Outcome of create_order(): the saved order, or an error message and any per-item stock issues"""
+    order: Optional['Order'] = None
+    error: Optional[str] = None
+    issues: List[str] = field(default_factory=list)
+
+    @property
+    def success(self):
+        return self.order is not None
+
 def create_order(customer_data, items_data, order_type):
     """
-    Centralized function to create orders from different contexts, with fallback to direct SQL
-    """
-    # Track which products have had stock reductions for rollback if needed
-    stock_updates = []
+    Create an order with its items, stock decrements and sales rollup entry in one transaction.
     
+    This is the only place orders are written; checkout, in-store sales and any bulk endpoint
+    call it. Any failure rolls the whole transaction back, nothing is retried.
+    
+    Args:
+        customer_data: dict with customer_name/phone/email/address, customer_id and created_by_id
+        items_data: list of {'product_id', 'quantity', 'price'} dicts
+        order_type: 'online' or 'in-store'
+    Returns:
+        OrderResult
+    """
     try:
-        # First try using SQLAlchemy
-        try:
-            # Create a new order
-            order = Order(
-                customer_name=customer_data.get('customer_name', ''),
-                customer_phone=customer_data.get('customer_phone', ''),
-                customer_email=customer_data.get('customer_email', ''),
-                customer_address=customer_data.get('customer_address', ''),
-                total_amount=sum(item['price'] * item['quantity'] for item in items_data),
-                order_type=order_type,
-                customer_id=customer_data.get('customer_id'),
-                created_by_id=customer_data.get('created_by_id')
-            )
-            
-            # Add the order to the database
-            db.session.add(order)
-            db.session.flush()  # Get the order ID
-            
-            # Add order items
-            for item_data in items_data:
-                # Make sure the currency is UGX
-                if 'currency' in item_data and item_data['currency'] != 'UGX':
-                    logger.warning(f"Currency not UGX, overriding: {item_data['currency']} -> UGX")
-                    item_data['currency'] = 'UGX'
-                
-                order_item = OrderItem(
-                    order_id=order.id,
-                    product_id=item_data['product_id'],
-                    quantity=item_data['quantity'],
-                    price=item_data['price']
-                )
-                db.session.add(order_item)
-                    
-                # Update product stock
-                product = Product.query.get(item_data['product_id'])
-                if product:
-                    # If currency default is not UGX, set it
-                    if product.currency != 'UGX':
-                        product.currency = 'UGX'
-                        db.session.add(product)
-                    
-                    # Track stock update for possible rollback
-                    stock_updates.append({
-                        'product_id': product.id,
-                        'quantity': item_data['quantity'],
-                        'old_stock': product.stock
-                    })
-                    
-                    # Update stock
-                    success = product.update_stock(item_data['quantity'], 'sale')
-                    if not success:
-                        logger.error(f"Failed to update stock for product {product.id}")
-                        raise Exception(f"Stock update failed for product {product.name}")
-            
-            # Generate reference number
-            now = datetime.now(UTC)
-            order.reference_number = f"ORD-{now.strftime('%Y%m%d')}-{order.id}"
-            
-            # Commit the transaction
-            db.session.commit()
-            
-            # Return the created order
-            return order, None
-            
-        except Exception as e:
-            # If we get a SQLAlchemy error, try the direct SQL approach
-            logger.warning(f"SQLAlchemy error when creating order, falling back to direct SQL: {str(e)}")
-            db.session.rollback()
-            
-            # Restore stock levels
-            if stock_updates:
-                logger.info(f"Reverting {len(stock_updates)} stock updates before trying direct SQL")
-                for update in stock_updates:
-                    try:
-                        product = Product.query.get(update['product_id'])
-                        if product:
-                            # Reset to original stock level
-                            product.stock = update['old_stock']
-                            db.session.add(product)
-                    except Exception as revert_error:
-                        logger.error(f"Error reverting stock for product {update['product_id']}: {str(revert_error)}")
-                
-                db.session.commit()
-                stock_updates = []  # Clear the list for next attempt
-            
-            # Try direct SQL approach with current user ID if authenticated
-            if current_user.is_authenticated:
-                customer_data['created_by_id'] = safe_user_id()
-                
-            # Set currency for each item to UGX
-            for item in items_data:
-                if 'currency' not in item or item['currency'] != 'UGX':
-                    item['currency'] = 'UGX'
-            
-            # Log the full data we're sending
-            logger.info(f"Using direct SQL with: {customer_data} and {len(items_data)} items")
-            
-            # Call our improved direct SQL implementation
-            result, error = direct_create_order(customer_data, items_data, order_type)
-            
-            if error:
-                logger.error(f"Direct SQL order creation failed: {error}")
-                return None, error
-            
-            if result:
-                logger.info(f"Direct SQL order created successfully with ID: {result.id}")
-                return result, None
+        # Load every product in the basket with one IN (...) query
+        product_ids = {item_data.get('product_id') for item_data in items_data}
+        products = {
+            product.id: product
+            for product in Product.query.filter(Product.id.in_(product_ids)).all()
+        }
+        
+        # Validate the basket before writing anything
+        issues = []
+        requested = {}
+        for item_data in items_data:
+            product = products.get(item_data.get('product_id'))
+            if not product:
+                issues.append(f"Product ID {item_data.get('product_id')} not found")
+            elif not item_data.get('quantity') or item_data['quantity'] <= 0:
+                issues.append(f"Invalid quantity for {product.name}")
             else:
-                return None, "Unknown error occurred during direct SQL order creation"
+                requested[product.id] = requested.get(product.id, 0) + item_data['quantity']
+        for product_id, quantity in requested.items():
+            product = products[product_id]
+            if product.stock < quantity:
+                issues.append(f"Insufficient stock for {product.name}: requested {quantity}, available {product.stock}")
+        if not items_data:
+            issues.append("Order has no items")
+        if issues:
+            return OrderResult(error="Stock verification failed", issues=issues)
+        
+        # Reference number is generated up front so it goes in with the order INSERT
+        now = datetime.now(UTC)
+        order = Order(
+            customer_name=customer_data.get('customer_name', ''),
+            customer_phone=customer_data.get('customer_phone', ''),
+            customer_email=customer_data.get('customer_email', ''),
+            customer_address=customer_data.get('customer_address', ''),
+            total_amount=sum(item['price'] * item['quantity'] for item in items_data),
+            order_type=order_type,
+            customer_id=customer_data.get('customer_id'),
+            created_by_id=customer_data.get('created_by_id'),
+            order_date=now,
+            reference_number=f"ORD-{now.strftime('%Y%m%d')}-{uuid.uuid4().hex[:8]}"
+        )
+        
+        # Add the order to the database
+        db.session.add(order)
+        db.session.flush()  # Get the order ID
+        
+        # Build item rows in memory
+        order_item_rows = []
+        order_cogs = 0.0
+        items_sold = 0
+        for item_data in items_data:
+            product = products[item_data['product_id']]
+            # Prices are always in UGX
+            if product.currency != 'UGX':
+                product.currency = 'UGX'
+            order_item_rows.append({
+                'order_id': order.id,
+                'product_id': product.id,
+                'quantity': item_data['quantity'],
+                'price': item_data['price'],
+                'buying_price': product.buying_price
+            })
+            order_cogs += item_data['quantity'] * product.buying_price
+            items_sold += item_data['quantity']
+        
+        # Bulk insert the order items
+        db.session.execute(db.insert(OrderItem), order_item_rows)
+        
+        # Update product stock; the conditional UPDATE catches sales made since validation
+        if not Product.sell_stock_batch(requested, notes=f"Order #{order.id} ({order.reference_number})"):
+            db.session.rollback()
+            short_names = [
+                product.name
+                for product in Product.query.filter(Product.id.in_(requested.keys())).all()
+                if product.stock < requested[product.id]
+            ]
+            logger.error(f"Failed to update stock for order items: {short_names}")
+            return OrderResult(
+                error="Stock verification failed",
+                issues=[f"Insufficient stock for {name}" for name in short_names] or ["Insufficient stock"]
+            )
+        
+        # Keep the pre-aggregated daily sales in step with this order
+        record_sales_rollup(order.order_date, order.order_type, order.total_amount, order_cogs, items_sold)
+        
+        if order_type == 'online':
+            queue_new_online_order(db.session, online_order_summary(order, len(order_item_rows)))
+        
+        # Commit the transaction
+        db.session.commit()
+        
+        return OrderResult(order=order)
     
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error in create_order: {str(e)}")
-        
-        # Try to rollback stock changes if any were made
-        if stock_updates:
-            logger.info(f"Attempting to revert {len(stock_updates)} stock updates after error")
-            try:
-                for update in stock_updates:
-                    product = Product.query.get(update['product_id'])
-                    if product:
-                        # Reset to original stock level
-                        product.stock = update['old_stock']
-                        db.session.add(product)
-                db.session.commit()
-            except Exception as rollback_error:
-                logger.error(f"Error during stock rollback: {str(rollback_error)}")
-        
-        return None, str(e)
+        return OrderResult(error=f"Error creating order: {str(e)}")
+
+def online_order_summary(order, items_count):
+    """Order fields shown in the pending online orders notification"""
+    return {
+        'id': order.id,
+        'reference_number': order.reference_number,
+        'customer_name': order.customer_name or 'Online Customer',
+        'order_date': order.order_date.strftime('%Y-%m-%d %H:%M:%S') if order.order_date else None,
+        'total_amount': float(order.total_amount),
+        'items_count': items_count,
+        'customer_phone': order.customer_phone or '',
+        'customer_email': order.customer_email or '',
+        'customer_address': order.customer_address or ''
+    }
 
 # Ensure all database operations are committed
 @app.teardown_appcontext
@@ -2391,7 +2946,7 @@ def serve_images(filename):
 @app.route('/manifest.json')
 def manifest():
     """Serve the manifest.json file for PWA functionality"""
-    logger.info("Manifest.json requested")
+    logger.debug("Manifest.json requested")
     return send_from_directory(app.static_folder, 'manifest.json')
 
 @app.route('/troubleshoot')
@@ -2414,8 +2969,7 @@ def get_order_by_id(order_id):
         # If not found with SQLAlchemy, try direct SQL
         logger.warning(f"Order {order_id} not found with SQLAlchemy, trying direct SQL")
         try:
-            conn = sqlite3.connect('instance/pos.db')
-            conn.row_factory = sqlite3.Row
+            conn = get_raw_connection()
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM "order" WHERE id = ?', (order_id,))
             order_row = cursor.fetchone()
@@ -2518,274 +3072,312 @@ def is_mobile():
     mobile_agents = ['android', 'iphone', 'ipad', 'ipod', 'blackberry', 'windows phone']
     return any(agent in user_agent for agent in mobile_agents)
 
+def _freeze(value):
+    """Tuples and read-only dicts all the way down, so reference data shared by every request can't be edited"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+# Product form reference data is built once at import; the get_*() helpers hand out the same objects.
+
 # Define common product units 
-def get_product_units():
-    return [
-        # Weight units
-        ('kg', 'Kilogram (kg)'),
-        ('g', 'Gram (g)'),
-        ('lb', 'Pound (lb)'),
-        ('oz', 'Ounce (oz)'),
-        
-        # Volume units
-        ('l', 'Liter (l)'),
-        ('ml', 'Milliliter (ml)'),
-        ('gal', 'Gallon (gal)'),
-        ('qt', 'Quart (qt)'),
-        ('pt', 'Pint (pt)'),
-        ('fl_oz', 'Fluid Ounce (fl oz)'),
-        ('cup', 'Cup'),
-        ('tbsp', 'Tablespoon (tbsp)'),
-        ('tsp', 'Teaspoon (tsp)'),
-        
-        # Count units
-        ('pcs', 'Pieces (pcs)'),
-        ('box', 'Box'),
-        ('pack', 'Pack'),
-        ('bag', 'Bag'),
-        ('carton', 'Carton'),
-        ('bottle', 'Bottle'),
-        ('jar', 'Jar'),
-        ('can', 'Can'),
-        ('bundle', 'Bundle'),
-        ('roll', 'Roll'),
-        ('case', 'Case'),
-        ('tray', 'Tray'),
-        ('crate', 'Crate'),
-        ('pallet', 'Pallet'),
-        
-        # Length units
-        ('m', 'Meter (m)'),
-        ('cm', 'Centimeter (cm)'),
-        ('in', 'Inch (in)'),
-        ('ft', 'Foot (ft)'),
-        ('yd', 'Yard (yd)'),
-        
-        # Area units
-        ('sqm', 'Square meter (m²)'),
-        ('sqft', 'Square foot (ft²)'),
-        
-        # Other common units
-        ('pair', 'Pair'),
-        ('dozen', 'Dozen'),
-        ('half_dozen', 'Half Dozen'),
-        ('set', 'Set'),
-        ('unit', 'Unit'),
-        ('bunch', 'Bunch'),
-        ('head', 'Head'),
-        ('stalk', 'Stalk'),
-        ('slice', 'Slice'),
-        ('loaf', 'Loaf'),
-        ('clove', 'Clove')
-    ]
+PRODUCT_UNITS = _freeze([
+    # Weight units
+    ('kg', 'Kilogram (kg)'),
+    ('g', 'Gram (g)'),
+    ('lb', 'Pound (lb)'),
+    ('oz', 'Ounce (oz)'),
+    
+    # Volume units
+    ('l', 'Liter (l)'),
+    ('ml', 'Milliliter (ml)'),
+    ('gal', 'Gallon (gal)'),
+    ('qt', 'Quart (qt)'),
+    ('pt', 'Pint (pt)'),
+    ('fl_oz', 'Fluid Ounce (fl oz)'),
+    ('cup', 'Cup'),
+    ('tbsp', 'Tablespoon (tbsp)'),
+    ('tsp', 'Teaspoon (tsp)'),
+    
+    # Count units
+    ('pcs', 'Pieces (pcs)'),
+    ('box', 'Box'),
+    ('pack', 'Pack'),
+    ('bag', 'Bag'),
+    ('carton', 'Carton'),
+    ('bottle', 'Bottle'),
+    ('jar', 'Jar'),
+    ('can', 'Can'),
+    ('bundle', 'Bundle'),
+    ('roll', 'Roll'),
+    ('case', 'Case'),
+    ('tray', 'Tray'),
+    ('crate', 'Crate'),
+    ('pallet', 'Pallet'),
+    
+    # Length units
+    ('m', 'Meter (m)'),
+    ('cm', 'Centimeter (cm)'),
+    ('in', 'Inch (in)'),
+    ('ft', 'Foot (ft)'),
+    ('yd', 'Yard (yd)'),
+    
+    # Area units
+    ('sqm', 'Square meter (m²)'),
+    ('sqft', 'Square foot (ft²)'),
+    
+    # Other common units
+    ('pair', 'Pair'),
+    ('dozen', 'Dozen'),
+    ('half_dozen', 'Half Dozen'),
+    ('set', 'Set'),
+    ('unit', 'Unit'),
+    ('bunch', 'Bunch'),
+    ('head', 'Head'),
+    ('stalk', 'Stalk'),
+    ('slice', 'Slice'),
+    ('loaf', 'Loaf'),
+    ('clove', 'Clove')
+])
 
 # Define currency options for the application
-def get_currencies():
-    return [
-        # Major world currencies
-        ('USD', 'US Dollar ($)'),
-        ('EUR', 'Euro (€)'),
-        ('GBP', 'British Pound (£)'),
-        ('JPY', 'Japanese Yen (¥)'),
-        ('CNY', 'Chinese Yuan (¥)'),
-        ('INR', 'Indian Rupee (₹)'),
-        ('AUD', 'Australian Dollar (A$)'),
-        ('CAD', 'Canadian Dollar (C$)'),
-        ('CHF', 'Swiss Franc (Fr)'),
-        ('HKD', 'Hong Kong Dollar (HK$)'),
-        
-        # African currencies
-        ('UGX', 'Ugandan Shilling (USh)'),
-        ('KES', 'Kenyan Shilling (KSh)'),
-        ('TZS', 'Tanzanian Shilling (TSh)'),
-        ('RWF', 'Rwandan Franc (RF)'),
-        ('NGN', 'Nigerian Naira (₦)'),
-        ('ZAR', 'South African Rand (R)'),
-        ('EGP', 'Egyptian Pound (E£)'),
-        ('GHS', 'Ghanaian Cedi (₵)'),
-        ('MAD', 'Moroccan Dirham (MAD)'),
-        ('XOF', 'West African CFA Franc (CFA)'),
-        ('XAF', 'Central African CFA Franc (FCFA)'),
-        
-        # Middle Eastern currencies
-        ('AED', 'UAE Dirham (د.إ)'),
-        ('SAR', 'Saudi Riyal (﷼)'),
-        ('QAR', 'Qatari Riyal (﷼)'),
-        ('ILS', 'Israeli Shekel (₪)'),
-        ('TRY', 'Turkish Lira (₺)'),
-        
-        # Asian currencies
-        ('KRW', 'South Korean Won (₩)'),
-        ('SGD', 'Singapore Dollar (S$)'),
-        ('THB', 'Thai Baht (฿)'),
-        ('IDR', 'Indonesian Rupiah (Rp)'),
-        ('MYR', 'Malaysian Ringgit (RM)'),
-        ('PHP', 'Philippine Peso (₱)'),
-        ('VND', 'Vietnamese Dong (₫)'),
-        ('BDT', 'Bangladeshi Taka (৳)'),
-        ('PKR', 'Pakistani Rupee (₨)'),
-        
-        # European currencies
-        ('RUB', 'Russian Ruble (₽)'),
-        ('PLN', 'Polish Złoty (zł)'),
-        ('SEK', 'Swedish Krona (kr)'),
-        ('NOK', 'Norwegian Krone (kr)'),
-        ('DKK', 'Danish Krone (kr)'),
-        ('CZK', 'Czech Koruna (Kč)'),
-        ('HUF', 'Hungarian Forint (Ft)'),
-        ('RON', 'Romanian Leu (lei)'),
-        
-        # American currencies
-        ('MXN', 'Mexican Peso (Mex$)'),
-        ('BRL', 'Brazilian Real (R$)'),
-        ('ARS', 'Argentine Peso ($)'),
-        ('CLP', 'Chilean Peso (CLP$)'),
-        ('COP', 'Colombian Peso (COL$)'),
-        ('PEN', 'Peruvian Sol (S/)'),
-        
-        # Oceanian currencies
-        ('NZD', 'New Zealand Dollar (NZ$)'),
-        ('FJD', 'Fijian Dollar (FJ$)'),
-        
-        # Cryptocurrencies
-        ('BTC', 'Bitcoin (₿)'),
-        ('ETH', 'Ethereum (Ξ)'),
-        ('XRP', 'Ripple (XRP)'),
-        ('LTC', 'Litecoin (Ł)'),
-        ('USDT', 'Tether (₮)')
-    ]
+CURRENCIES = _freeze([
+    # Major world currencies
+    ('USD', 'US Dollar ($)'),
+    ('EUR', 'Euro (€)'),
+    ('GBP', 'British Pound (£)'),
+    ('JPY', 'Japanese Yen (¥)'),
+    ('CNY', 'Chinese Yuan (¥)'),
+    ('INR', 'Indian Rupee (₹)'),
+    ('AUD', 'Australian Dollar (A$)'),
+    ('CAD', 'Canadian Dollar (C$)'),
+    ('CHF', 'Swiss Franc (Fr)'),
+    ('HKD', 'Hong Kong Dollar (HK$)'),
+    
+    # African currencies
+    ('UGX', 'Ugandan Shilling (USh)'),
+    ('KES', 'Kenyan Shilling (KSh)'),
+    ('TZS', 'Tanzanian Shilling (TSh)'),
+    ('RWF', 'Rwandan Franc (RF)'),
+    ('NGN', 'Nigerian Naira (₦)'),
+    ('ZAR', 'South African Rand (R)'),
+    ('EGP', 'Egyptian Pound (E£)'),
+    ('GHS', 'Ghanaian Cedi (₵)'),
+    ('MAD', 'Moroccan Dirham (MAD)'),
+    ('XOF', 'West African CFA Franc (CFA)'),
+    ('XAF', 'Central African CFA Franc (FCFA)'),
+    
+    # Middle Eastern currencies
+    ('AED', 'UAE Dirham (د.إ)'),
+    ('SAR', 'Saudi Riyal (﷼)'),
+    ('QAR', 'Qatari Riyal (﷼)'),
+    ('ILS', 'Israeli Shekel (₪)'),
+    ('TRY', 'Turkish Lira (₺)'),
+    
+    # Asian currencies
+    ('KRW', 'South Korean Won (₩)'),
+    ('SGD', 'Singapore Dollar (S$)'),
+    ('THB', 'Thai Baht (฿)'),
+    ('IDR', 'Indonesian Rupiah (Rp)'),
+    ('MYR', 'Malaysian Ringgit (RM)'),
+    ('PHP', 'Philippine Peso (₱)'),
+    ('VND', 'Vietnamese Dong (₫)'),
+    ('BDT', 'Bangladeshi Taka (৳)'),
+    ('PKR', 'Pakistani Rupee (₨)'),
+    
+    # European currencies
+    ('RUB', 'Russian Ruble (₽)'),
+    ('PLN', 'Polish Złoty (zł)'),
+    ('SEK', 'Swedish Krona (kr)'),
+    ('NOK', 'Norwegian Krone (kr)'),
+    ('DKK', 'Danish Krone (kr)'),
+    ('CZK', 'Czech Koruna (Kč)'),
+    ('HUF', 'Hungarian Forint (Ft)'),
+    ('RON', 'Romanian Leu (lei)'),
+    
+    # American currencies
+    ('MXN', 'Mexican Peso (Mex$)'),
+    ('BRL', 'Brazilian Real (R$)'),
+    ('ARS', 'Argentine Peso ($)'),
+    ('CLP', 'Chilean Peso (CLP$)'),
+    ('COP', 'Colombian Peso (COL$)'),
+    ('PEN', 'Peruvian Sol (S/)'),
+    
+    # Oceanian currencies
+    ('NZD', 'New Zealand Dollar (NZ$)'),
+    ('FJD', 'Fijian Dollar (FJ$)'),
+    
+    # Cryptocurrencies
+    ('BTC', 'Bitcoin (₿)'),
+    ('ETH', 'Ethereum (Ξ)'),
+    ('XRP', 'Ripple (XRP)'),
+    ('LTC', 'Litecoin (Ł)'),
+    ('USDT', 'Tether (₮)')
+])
 
 # Define grocery categories and common items
-def get_grocery_categories():
-    return [
-        # Produce
-        ('produce', 'Produce', [
-            ('fresh_fruits', 'Fresh Fruits'),
-            ('fresh_vegetables', 'Fresh Vegetables'),
-            ('herbs', 'Fresh Herbs'),
-            ('packaged_produce', 'Packaged Produce'),
-            ('organic_produce', 'Organic Produce'),
-            ('salad_kits', 'Salad Kits')
-        ]),
-        
-        # Meat & Seafood
-        ('meat_seafood', 'Meat & Seafood', [
-            ('beef', 'Beef'),
-            ('pork', 'Pork'),
-            ('poultry', 'Poultry'),
-            ('fish', 'Fish'),
-            ('shellfish', 'Shellfish'),
-            ('deli_meats', 'Deli Meats'),
-            ('sausages', 'Sausages'),
-            ('meat_alternatives', 'Meat Alternatives')
-        ]),
-        
-        # Dairy & Eggs
-        ('dairy_eggs', 'Dairy & Eggs', [
-            ('milk', 'Milk'),
-            ('cheese', 'Cheese'),
-            ('eggs', 'Eggs'),
-            ('yogurt', 'Yogurt'),
-            ('butter', 'Butter & Margarine'),
-            ('cream', 'Cream'),
-            ('dairy_alternatives', 'Dairy Alternatives')
-        ]),
-        
-        # Bakery
-        ('bakery', 'Bakery', [
-            ('bread', 'Bread'),
-            ('rolls_buns', 'Rolls & Buns'),
-            ('cakes', 'Cakes & Pastries'),
-            ('cookies', 'Cookies'),
-            ('pies', 'Pies'),
-            ('bakery_desserts', 'Bakery Desserts'),
-            ('tortillas', 'Tortillas & Flatbreads')
-        ]),
-        
-        # Pantry Staples
-        ('pantry', 'Pantry Staples', [
-            ('rice_grains', 'Rice & Grains'),
-            ('pasta', 'Pasta & Noodles'),
-            ('canned_goods', 'Canned Goods'),
-            ('soups', 'Soups & Broths'),
-            ('beans_legumes', 'Beans & Legumes'),
-            ('baking', 'Baking Ingredients'),
-            ('condiments', 'Condiments & Sauces'),
-            ('oils_vinegars', 'Oils & Vinegars'),
-            ('spices_seasonings', 'Spices & Seasonings'),
-            ('sweeteners', 'Sweeteners & Syrups')
-        ]),
-        
-        # Snacks & Confectionery
-        ('snacks', 'Snacks & Confectionery', [
-            ('chips', 'Chips & Crisps'),
-            ('crackers', 'Crackers'),
-            ('nuts_seeds', 'Nuts & Seeds'),
-            ('dried_fruits', 'Dried Fruits'),
-            ('chocolate', 'Chocolate'),
-            ('candy', 'Candy & Sweets'),
-            ('energy_bars', 'Energy & Protein Bars'),
-            ('popcorn', 'Popcorn & Puffed Snacks')
-        ]),
-        
-        # Beverages
-        ('beverages', 'Beverages', [
-            ('water', 'Water'),
-            ('soda', 'Soda & Soft Drinks'),
-            ('juice', 'Juices'),
-            ('coffee', 'Coffee'),
-            ('tea', 'Tea'),
-            ('sports_drinks', 'Sports & Energy Drinks'),
-            ('drink_mixes', 'Drink Mixes & Powders'),
-            ('non_alcoholic', 'Non-Alcoholic Beverages')
-        ]),
-        
-        # Frozen Foods
-        ('frozen', 'Frozen Foods', [
-            ('frozen_vegetables', 'Frozen Vegetables'),
-            ('frozen_fruits', 'Frozen Fruits'),
-            ('frozen_meals', 'Frozen Meals'),
-            ('frozen_pizza', 'Frozen Pizza'),
-            ('ice_cream', 'Ice Cream & Frozen Desserts'),
-            ('frozen_breakfast', 'Frozen Breakfast Items'),
-            ('frozen_meat_seafood', 'Frozen Meat & Seafood')
-        ])
-    ]
+GROCERY_CATEGORIES = _freeze([
+    # Produce
+    ('produce', 'Produce', [
+        ('fresh_fruits', 'Fresh Fruits'),
+        ('fresh_vegetables', 'Fresh Vegetables'),
+        ('herbs', 'Fresh Herbs'),
+        ('packaged_produce', 'Packaged Produce'),
+        ('organic_produce', 'Organic Produce'),
+        ('salad_kits', 'Salad Kits')
+    ]),
+    
+    # Meat & Seafood
+    ('meat_seafood', 'Meat & Seafood', [
+        ('beef', 'Beef'),
+        ('pork', 'Pork'),
+        ('poultry', 'Poultry'),
+        ('fish', 'Fish'),
+        ('shellfish', 'Shellfish'),
+        ('deli_meats', 'Deli Meats'),
+        ('sausages', 'Sausages'),
+        ('meat_alternatives', 'Meat Alternatives')
+    ]),
+    
+    # Dairy & Eggs
+    ('dairy_eggs', 'Dairy & Eggs', [
+        ('milk', 'Milk'),
+        ('cheese', 'Cheese'),
+        ('eggs', 'Eggs'),
+        ('yogurt', 'Yogurt'),
+        ('butter', 'Butter & Margarine'),
+        ('cream', 'Cream'),
+        ('dairy_alternatives', 'Dairy Alternatives')
+    ]),
+    
+    # Bakery
+    ('bakery', 'Bakery', [
+        ('bread', 'Bread'),
+        ('rolls_buns', 'Rolls & Buns'),
+        ('cakes', 'Cakes & Pastries'),
+        ('cookies', 'Cookies'),
+        ('pies', 'Pies'),
+        ('bakery_desserts', 'Bakery Desserts'),
+        ('tortillas', 'Tortillas & Flatbreads')
+    ]),
+    
+    # Pantry Staples
+    ('pantry', 'Pantry Staples', [
+        ('rice_grains', 'Rice & Grains'),
+        ('pasta', 'Pasta & Noodles'),
+        ('canned_goods', 'Canned Goods'),
+        ('soups', 'Soups & Broths'),
+        ('beans_legumes', 'Beans & Legumes'),
+        ('baking', 'Baking Ingredients'),
+        ('condiments', 'Condiments & Sauces'),
+        ('oils_vinegars', 'Oils & Vinegars'),
+        ('spices_seasonings', 'Spices & Seasonings'),
+        ('sweeteners', 'Sweeteners & Syrups')
+    ]),
+    
+    # Snacks & Confectionery
+    ('snacks', 'Snacks & Confectionery', [
+        ('chips', 'Chips & Crisps'),
+        ('crackers', 'Crackers'),
+        ('nuts_seeds', 'Nuts & Seeds'),
+        ('dried_fruits', 'Dried Fruits'),
+        ('chocolate', 'Chocolate'),
+        ('candy', 'Candy & Sweets'),
+        ('energy_bars', 'Energy & Protein Bars'),
+        ('popcorn', 'Popcorn & Puffed Snacks')
+    ]),
+    
+    # Beverages
+    ('beverages', 'Beverages', [
+        ('water', 'Water'),
+        ('soda', 'Soda & Soft Drinks'),
+        ('juice', 'Juices'),
+        ('coffee', 'Coffee'),
+        ('tea', 'Tea'),
+        ('sports_drinks', 'Sports & Energy Drinks'),
+        ('drink_mixes', 'Drink Mixes & Powders'),
+        ('non_alcoholic', 'Non-Alcoholic Beverages')
+    ]),
+    
+    # Frozen Foods
+    ('frozen', 'Frozen Foods', [
+        ('frozen_vegetables', 'Frozen Vegetables'),
+        ('frozen_fruits', 'Frozen Fruits'),
+        ('frozen_meals', 'Frozen Meals'),
+        ('frozen_pizza', 'Frozen Pizza'),
+        ('ice_cream', 'Ice Cream & Frozen Desserts'),
+        ('frozen_breakfast', 'Frozen Breakfast Items'),
+        ('frozen_meat_seafood', 'Frozen Meat & Seafood')
+    ])
+])
 
 # Define specific grocery items by category for inventory management with detailed information
+GROCERY_ITEMS = _freeze({
+    # Fresh Fruits
+    'fresh_fruits': [
+        {'name': 'Apples', 'description': 'Fresh, crisp apples', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_fruits'},
+        {'name': 'Bananas', 'description': 'Ripe yellow bananas', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_fruits'},
+        {'name': 'Oranges', 'description': 'Juicy seedless oranges', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_fruits'},
+        {'name': 'Grapes', 'description': 'Sweet seedless grapes', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_fruits'}
+    ],
+    
+    # Fresh Vegetables
+    'fresh_vegetables': [
+        {'name': 'Lettuce', 'description': 'Fresh green lettuce', 'unit': 'head', 'category_group': 'produce', 'category': 'fresh_vegetables'},
+        {'name': 'Spinach', 'description': 'Organic baby spinach', 'unit': 'bag', 'category_group': 'produce', 'category': 'fresh_vegetables'},
+        {'name': 'Tomatoes', 'description': 'Ripe red tomatoes', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_vegetables'},
+        {'name': 'Onions', 'description': 'Fresh yellow onions', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_vegetables'}
+    ],
+    
+    # Dairy & Eggs
+    'dairy_eggs': [
+        {'name': 'Milk', 'description': 'Fresh whole milk', 'unit': 'l', 'category_group': 'dairy_eggs', 'category': 'milk'},
+        {'name': 'Eggs', 'description': 'Large fresh eggs', 'unit': 'dozen', 'category_group': 'dairy_eggs', 'category': 'eggs'},
+        {'name': 'Cheddar', 'description': 'Sharp cheddar cheese', 'unit': 'kg', 'category_group': 'dairy_eggs', 'category': 'cheese'}
+    ],
+    
+    # Beverages
+    'beverages': [
+        {'name': 'Water', 'description': 'Bottled mineral water', 'unit': 'bottle', 'category_group': 'beverages', 'category': 'water'},
+        {'name': 'Orange Juice', 'description': 'Fresh squeezed orange juice', 'unit': 'l', 'category_group': 'beverages', 'category': 'juice'},
+        {'name': 'Coffee', 'description': 'Ground coffee beans', 'unit': 'bag', 'category_group': 'beverages', 'category': 'coffee'},
+        {'name': 'Tea', 'description': 'Black tea bags', 'unit': 'box', 'category_group': 'beverages', 'category': 'tea'}
+    ]
+})
+
+UNIT_NAMES = MappingProxyType(dict(PRODUCT_UNITS))
+CURRENCY_NAMES = MappingProxyType(dict(CURRENCIES))
+# Subcategory id -> name and -> (group id, group name); products store the subcategory id
+CATEGORY_NAMES = MappingProxyType({
+    subcat_id: subcat_name
+    for _, _, subcategories in GROCERY_CATEGORIES
+    for subcat_id, subcat_name in subcategories
+})
+CATEGORY_GROUPS = MappingProxyType({
+    subcat_id: (group_id, group_name)
+    for group_id, group_name, subcategories in GROCERY_CATEGORIES
+    for subcat_id, _ in subcategories
+})
+# (subcategory id, subcategory name, group name) for flat dropdowns
+FLAT_CATEGORIES = tuple(
+    (subcat_id, subcat_name, group_name)
+    for _, group_name, subcategories in GROCERY_CATEGORIES
+    for subcat_id, subcat_name in subcategories
+)
+
+def get_product_units():
+    return PRODUCT_UNITS
+
+def get_currencies():
+    return CURRENCIES
+
+def get_grocery_categories():
+    return GROCERY_CATEGORIES
+
 def get_grocery_items():
-    return {
-        # Fresh Fruits
-        'fresh_fruits': [
-            {'name': 'Apples', 'description': 'Fresh, crisp apples', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_fruits'},
-            {'name': 'Bananas', 'description': 'Ripe yellow bananas', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_fruits'},
-            {'name': 'Oranges', 'description': 'Juicy seedless oranges', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_fruits'},
-            {'name': 'Grapes', 'description': 'Sweet seedless grapes', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_fruits'}
-        ],
-        
-        # Fresh Vegetables
-        'fresh_vegetables': [
-            {'name': 'Lettuce', 'description': 'Fresh green lettuce', 'unit': 'head', 'category_group': 'produce', 'category': 'fresh_vegetables'},
-            {'name': 'Spinach', 'description': 'Organic baby spinach', 'unit': 'bag', 'category_group': 'produce', 'category': 'fresh_vegetables'},
-            {'name': 'Tomatoes', 'description': 'Ripe red tomatoes', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_vegetables'},
-            {'name': 'Onions', 'description': 'Fresh yellow onions', 'unit': 'kg', 'category_group': 'produce', 'category': 'fresh_vegetables'}
-        ],
-        
-        # Dairy & Eggs
-        'dairy_eggs': [
-            {'name': 'Milk', 'description': 'Fresh whole milk', 'unit': 'l', 'category_group': 'dairy_eggs', 'category': 'milk'},
-            {'name': 'Eggs', 'description': 'Large fresh eggs', 'unit': 'dozen', 'category_group': 'dairy_eggs', 'category': 'eggs'},
-            {'name': 'Cheddar', 'description': 'Sharp cheddar cheese', 'unit': 'kg', 'category_group': 'dairy_eggs', 'category': 'cheese'}
-        ],
-        
-        # Beverages
-        'beverages': [
-            {'name': 'Water', 'description': 'Bottled mineral water', 'unit': 'bottle', 'category_group': 'beverages', 'category': 'water'},
-            {'name': 'Orange Juice', 'description': 'Fresh squeezed orange juice', 'unit': 'l', 'category_group': 'beverages', 'category': 'juice'},
-            {'name': 'Coffee', 'description': 'Ground coffee beans', 'unit': 'bag', 'category_group': 'beverages', 'category': 'coffee'},
-            {'name': 'Tea', 'description': 'Black tea bags', 'unit': 'box', 'category_group': 'beverages', 'category': 'tea'}
-        ]
-    }
+    return GROCERY_ITEMS
 
 def init_db():
     """Initialize the database with proper error handling"""
@@ -2796,19 +3388,77 @@ def init_db():
             existing_tables = inspector.get_table_names()
             
             if not existing_tables:
-                print("Creating database tables...")
+                logger.info("Creating database tables")
                 db.create_all()
-                print("Database tables created successfully")
+                logger.info("Database tables created")
             else:
-                print("Database tables already exist")
+                logger.debug("Database tables already exist")
                 
             # Verify database integrity
             check_db_integrity()
             
     except Exception as e:
-        print(f"Error initializing database: {str(e)}")
+        logger.error("Error initializing database: %s", e)
         raise
 
+def upgrade_database_schema():
+    """
+    Bring an existing database up to date with tables added after it was first created.
+    Safe to run on every start - only objects that are missing get created.
+    """
+    try:
+        with app.app_context():
+            inspector = db.inspect(db.engine)
+            existing_tables = inspector.get_table_names()
+            if not existing_tables:
+                # Brand new database, init_db() creates the full schema
+                return
+            
+            order_item_columns = [column['name'] for column in inspector.get_columns('order_item')]
+            if 'buying_price' not in order_item_columns:
+                with db.engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE order_item ADD COLUMN buying_price FLOAT"))
+                    conn.execute(text(ORDER_ITEM_COST_BACKFILL_SQL))
+                logger.info("Added order_item.buying_price and backfilled it from current product costs")
+            
+            if 'daily_sales_rollup' not in existing_tables:
+                DailySalesRollup.__table__.create(db.engine)
+                rollup_rows = rebuild_sales_rollup()
+                logger.info(f"Created daily_sales_rollup table and backfilled {rollup_rows} rows")
+            
+            product_columns = [column['name'] for column in inspector.get_columns('product')]
+            if 'change_seq' not in product_columns:
+                with db.engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE product ADD COLUMN change_seq INTEGER"))
+                    conn.execute(text("UPDATE product SET change_seq = id"))
+                    conn.execute(text("DROP INDEX IF EXISTS ix_product_updated_at"))
+                    for statement in PRODUCT_CHANGE_DDL.get(db.engine.dialect.name, ()):
+                        conn.execute(text(statement))
+                logger.info("Added product.change_seq and the catalogue change triggers")
+            
+            # Report indexes declared on the models
+            for model in (Order, Expense, StockMovement, Product):
+                for index in model.__table__.indexes:
+                    index.create(db.engine, checkfirst=True)
+            
+            if 'product_search' not in existing_tables and product_search_indexed():
+                with db.engine.begin() as conn:
+                    for statement in PRODUCT_SEARCH_DDL:
+                        conn.execute(text(statement))
+                    conn.execute(text("INSERT INTO product_search (product_search) VALUES ('rebuild')"))
+                logger.info("Created the product_search full-text index")
+    except Exception as e:
+        logger.error(f"Error upgrading database schema: {str(e)}")
+
+def warm_catalogue():
+    """Load the catalogue cache, and with it the barcode index, so the first scans don't wait on the database"""
+    try:
+        with app.app_context():
+            count = len(catalogue.all())
+        logger.info(f"Catalogue cache loaded with {count} products")
+    except Exception as e:
+        logger.error(f"Error loading catalogue cache: {str(e)}")
+
 def check_db_integrity():
     """Verify database integrity and fix common issues"""
     try:
@@ -2819,16 +3469,16 @@ def check_db_integrity():
                 required_columns = ['id', 'username', 'email', 'password_hash', 'is_admin', 'is_staff']
                 for column in required_columns:
                     if column not in db.metadata.tables['user'].columns:
-                        print(f"Warning: Missing column '{column}' in User table")
+                        logger.warning("Missing column %s in User table", column)
                 
                 # Check for duplicate usernames/emails
                 duplicate_users = db.session.query(User).group_by(User.username).having(db.func.count(User.id) > 1).all()
                 if duplicate_users:
-                    print("Warning: Found duplicate usernames in User table")
+                    logger.warning("Found duplicate usernames in User table")
                 
                 duplicate_emails = db.session.query(User).group_by(User.email).having(db.func.count(User.id) > 1).all()
                 if duplicate_emails:
-                    print("Warning: Found duplicate emails in User table")
+                    logger.warning("Found duplicate emails in User table")
             
             # Check Product table
             if 'product' in db.metadata.tables:
@@ -2836,12 +3486,12 @@ def check_db_integrity():
                 required_columns = ['id', 'name', 'price', 'stock']
                 for column in required_columns:
                     if column not in db.metadata.tables['product'].columns:
-                        print(f"Warning: Missing column '{column}' in Product table")
+                        logger.warning("Missing column %s in Product table", column)
                 
                 # Check for negative stock
                 negative_stock = Product.query.filter(Product.stock < 0).all()
                 if negative_stock:
-                    print("Warning: Found products with negative stock")
+                    logger.warning("Found products with negative stock")
             
             # Check Order table
             if 'order' in db.metadata.tables:
@@ -2849,12 +3499,12 @@ def check_db_integrity():
                 required_columns = ['id', 'reference_number', 'order_date', 'total_amount', 'status']
                 for column in required_columns:
                     if column not in db.metadata.tables['order'].columns:
-                        print(f"Warning: Missing column '{column}' in Order table")
+                        logger.warning("Missing column %s in Order table", column)
                 
                 # Check for orphaned orders
                 orphaned_orders = Order.query.filter(Order.customer_id.is_(None)).all()
                 if orphaned_orders:
-                    print("Warning: Found orders without customer reference")
+                    logger.warning("Found orders without customer reference")
             
             # Check for foreign key constraints
             try:
@@ -2863,12 +3513,12 @@ def check_db_integrity():
                 db.session.execute('SELECT 1 FROM order LIMIT 1')
                 db.session.execute('SELECT 1 FROM order_item LIMIT 1')
             except Exception as e:
-                print(f"Warning: Database constraint check failed: {str(e)}")
+                logger.warning("Database constraint check failed: %s", e)
             
-            print("Database integrity check completed")
+            logger.info("Database integrity check completed")
             
     except Exception as e:
-        print(f"Error checking database integrity: {str(e)}")
+        logger.error("Error checking database integrity: %s", e)
         raise
 
 @app.route('/api/test', methods=['GET'])
@@ -2894,78 +3544,84 @@ def my_sales_order_detail(order_id):
     """Redirect to staff_order_detail since my_sales was removed"""
     return redirect(url_for('staff_order_detail', order_id=order_id))
 
+@cached_report('stats')
+def get_admin_stats(today):
+    """Aggregated statistics for the admin dashboard (sales overview, product counts, etc.)."""
+    conn = get_raw_connection()
+    cursor = conn.cursor()
+
+    # Day boundaries as plain range bounds so the order_date index can be used
+    today_start = today.strftime('%Y-%m-%d 00:00:00')
+    tomorrow_start = (today + timedelta(days=1)).strftime('%Y-%m-%d 00:00:00')
+    week_start = (today - timedelta(days=6)).strftime('%Y-%m-%d 00:00:00')
+
+    # -----------------------------------------
+    # 1. Today\'s total sales (completed orders)
+    # -----------------------------------------
+    cursor.execute("""
+        SELECT IFNULL(SUM(total_amount), 0) AS today_sales
+        FROM "order"
+        WHERE order_date >= ? AND order_date < ?
+          AND status != 'cancelled'
+    """, (today_start, tomorrow_start))
+    today_sales = cursor.fetchone()['today_sales'] or 0
+
+    # -------------------------------------------------
+    # 2. Total products / low-stock / out-of-stock count
+    # -------------------------------------------------
+    cursor.execute("SELECT COUNT(*) AS total_products FROM product")
+    total_products = cursor.fetchone()['total_products']
+
+    cursor.execute("""
+        SELECT COUNT(*) AS low_stock
+        FROM product
+        WHERE stock <= reorder_point AND stock > 0
+    """)
+    low_stock_products = cursor.fetchone()['low_stock']
+
+    cursor.execute("SELECT COUNT(*) AS out_of_stock FROM product WHERE stock <= 0")
+    out_of_stock_products = cursor.fetchone()['out_of_stock']
+
+    # -------------------------------------------------
+    # 3. Daily sales (last 7 days) for chart
+    # -------------------------------------------------
+    cursor.execute("""
+        SELECT DATE(order_date) AS order_day, IFNULL(SUM(total_amount), 0) AS total
+        FROM "order"
+        WHERE order_date >= ? AND order_date < ?
+          AND status != 'cancelled'
+        GROUP BY order_day
+        ORDER BY order_day
+    """, (week_start, tomorrow_start))
+    rows = cursor.fetchall()
+    # Build lists for the chart; ensure all days present
+    dates = []
+    sales_data = []
+    for i in range(7):
+        day = today - timedelta(days=6 - i)
+        dates.append(day.strftime('%Y-%m-%d'))
+        # find matching row
+        match = next((r['total'] for r in rows if r['order_day'] == day.strftime('%Y-%m-%d')), 0)
+        sales_data.append(match or 0)
+
+    conn.close()
+
+    return {
+        'today_sales': today_sales,
+        'total_products': total_products,
+        'low_stock_products': low_stock_products,
+        'out_of_stock_products': out_of_stock_products,
+        'dates': dates,
+        'sales_data': sales_data
+    }
+
 @app.route('/api/admin_stats')
 @login_required
 @admin_required
 def api_admin_stats():
     """Return aggregated statistics for the admin dashboard (sales overview, product counts, etc.)."""
     try:
-        db_path = 'instance/pos.db'
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        # -----------------------------------------
-        # 1. Today\'s total sales (completed orders)
-        # -----------------------------------------
-        cursor.execute("""
-            SELECT IFNULL(SUM(total_amount), 0) AS today_sales
-            FROM "order"
-            WHERE DATE(order_date) = DATE('now', 'localtime')
-              AND status != 'cancelled'
-        """)
-        today_sales = cursor.fetchone()['today_sales'] or 0
-
-        # -------------------------------------------------
-        # 2. Total products / low-stock / out-of-stock count
-        # -------------------------------------------------
-        cursor.execute("SELECT COUNT(*) AS total_products FROM product")
-        total_products = cursor.fetchone()['total_products']
-
-        cursor.execute("""
-            SELECT COUNT(*) AS low_stock
-            FROM product
-            WHERE stock <= reorder_point AND stock > 0
-        """)
-        low_stock_products = cursor.fetchone()['low_stock']
-
-        cursor.execute("SELECT COUNT(*) AS out_of_stock FROM product WHERE stock <= 0")
-        out_of_stock_products = cursor.fetchone()['out_of_stock']
-
-        # -------------------------------------------------
-        # 3. Daily sales (last 7 days) for chart
-        # -------------------------------------------------
-        cursor.execute("""
-            SELECT DATE(order_date) AS order_day, IFNULL(SUM(total_amount), 0) AS total
-            FROM "order"
-            WHERE DATE(order_date) >= DATE('now', '-6 days', 'localtime')
-              AND status != 'cancelled'
-            GROUP BY order_day
-            ORDER BY order_day
-        """)
-        rows = cursor.fetchall()
-        # Build lists for the chart; ensure all days present
-        from datetime import datetime, timedelta
-        dates = []
-        sales_data = []
-        for i in range(7):
-            day = (datetime.now() - timedelta(days=6 - i)).date()
-            dates.append(day.strftime('%Y-%m-%d'))
-            # find matching row
-            match = next((r['total'] for r in rows if r['order_day'] == day.strftime('%Y-%m-%d')), 0)
-            sales_data.append(match or 0)
-
-        conn.close()
-
-        return jsonify({
-            'success': True,
-            'today_sales': today_sales,
-            'total_products': total_products,
-            'low_stock_products': low_stock_products,
-            'out_of_stock_products': out_of_stock_products,
-            'dates': dates,
-            'sales_data': sales_data
-        })
+        return jsonify({'success': True, **get_admin_stats(datetime.now().date())})
     except Exception as e:
         logger.error(f"Error in api_admin_stats: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -2977,9 +3633,7 @@ def api_admin_stats():
 def api_stock_movements():
     """Return recent stock movements for the dashboard table."""
     try:
-        db_path = 'instance/pos.db'
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = get_raw_connection()
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -3015,18 +3669,38 @@ def api_stock_movements():
 @login_required
 @admin_required
 def api_products():
-    """Return product list with live stock info for dashboard management table."""
+    """
+    Return product list with live stock info for dashboard management table.
+    Supports since=<version> deltas and ETag/If-None-Match like /api/stock_status.
+    """
     try:
-        db_path = 'instance/pos.db'
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        version, count = get_catalogue_version()
+        etag = catalogue_etag(version, count)
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
 
-        cursor.execute("""
-            SELECT id, name, price, stock, reorder_point, max_stock, unit, category
-            FROM product
-        """)
-        rows = cursor.fetchall()
+        try:
+            since = parse_catalogue_since(request.args.get('since'))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid since version'}), 400
+
+        if since is None:
+            # Full listings come from the catalogue cache
+            listing, version, count = get_catalogue_listing(version, count)
+            etag = catalogue_etag(version, count)
+            rows = [vars(product) for product in listing]
+        else:
+            conn = get_raw_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, name, price, stock, reorder_point, max_stock, unit, category
+                FROM product
+                WHERE change_seq > ?
+            """, (since,))
+            rows = cursor.fetchall()
+            conn.close()
 
         products = {}
         for r in rows:
@@ -3048,8 +3722,12 @@ def api_products():
                 'category': r['category'],
                 'stock_status': status
             }
-        conn.close()
-        return jsonify({'success': True, 'products': products})
+        body = {'success': True, 'products': products, 'version': version, 'since': since is not None}
+        if since is not None:
+            body['deleted'] = get_deleted_products(since, {int(product_id) for product_id in products})
+        response = jsonify(body)
+        response.set_etag(etag)
+        return response
     except Exception as e:
         logger.error(f"Error in api_products: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -3154,6 +3832,9 @@ def localtime_filter(value, fmt='%Y-%m-%d %H:%M:%S'):
     return local_dt.strftime(fmt)
 
 class Expense(db.Model):
+    __table_args__ = (
+        db.Index('ix_expense_date', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -3223,8 +3904,8 @@ def manage_expenses():
         
         # Get expenses for the date range
         expenses = Expense.query.filter(
-            db.func.date(Expense.date) >= start_date,
-            db.func.date(Expense.date) <= end_date
+            Expense.date >= datetime.combine(start_date, datetime.min.time()),
+            Expense.date < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
         ).order_by(Expense.date.desc()).all()
         
         # Calculate total expenses
@@ -3311,11 +3992,12 @@ def monitor_staff():
     now = datetime.utcnow().replace(tzinfo=timezone.utc)
     for staff in active_staff:
         last_order = Order.query.filter_by(created_by_id=staff.id).order_by(Order.order_date.desc()).first()
-        is_active = staff.last_seen and (now - (staff.last_seen.replace(tzinfo=timezone.utc) if staff.last_seen.tzinfo is None else staff.last_seen)) < timedelta(minutes=5)
+        last_seen = presence.last_seen(staff.id, staff.last_seen)
+        is_active = last_seen and (now - (last_seen.replace(tzinfo=timezone.utc) if last_seen.tzinfo is None else last_seen)) < timedelta(minutes=5)
         initials = staff.initials or generate_initials(staff.full_name)
         last_seen_utc = None
-        if staff.last_seen:
-            dt = staff.last_seen
+        if last_seen:
+            dt = last_seen
             if dt.tzinfo is None:
                 dt = dt.replace(tzinfo=timezone.utc)
             last_seen_utc = dt.astimezone(timezone.utc).isoformat()
@@ -3415,13 +4097,42 @@ def stop_monitoring():
     session.pop('monitored_staff_id', None)
     return jsonify({'success': True, 'message': 'Stopped monitoring'})
 
+# Last-seen times are tracked in memory and written to the user table in batches
+app.config.setdefault('PRESENCE_FLUSH_SECONDS', int(os.getenv('PRESENCE_FLUSH_SECONDS', 60)))
+presence = PresenceTracker(flush_interval=app.config['PRESENCE_FLUSH_SECONDS'])
+
+PRESENCE_FLUSH_SQL = text("""
+    UPDATE "user" SET last_seen = :last_seen
+    WHERE id = :user_id AND (last_seen IS NULL OR last_seen < :last_seen)
+""").bindparams(bindparam('last_seen', type_=db.DateTime))
+
+def flush_presence():
+    """Write the last-seen times collected since the previous flush in one executemany UPDATE"""
+    pending = presence.take_pending()
+    if not pending:
+        return 0
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(PRESENCE_FLUSH_SQL, [
+                {'user_id': user_id, 'last_seen': last_seen} for user_id, last_seen in pending.items()
+            ])
+    except Exception as e:
+        presence.restore_pending(pending)
+        logger.error(f"Error flushing last_seen times: {str(e)}")
+        return 0
+    return len(pending)
+
+@atexit.register
+def flush_presence_on_exit():
+    with app.app_context():
+        flush_presence()
+
 @app.before_request
 def update_last_seen():
     if current_user.is_authenticated:
-        from datetime import datetime
-        current_user.last_seen = datetime.utcnow()
-        db.session.commit()
-        print(f"Updated last_seen for {current_user.username} at {current_user.last_seen}")
+        presence.touch(current_user.id)
+        if presence.flush_due():
+            flush_presence()
 
 @app.route('/admin/monitor')
 @login_required
@@ -3776,6 +4487,10 @@ def staff_order_detail(order_id):
 def get_cart_count():
     """Get the current cart item count for AJAX requests"""
     try:
+        # Kept up to date by every route that changes the cart
+        if 'cart_count' in session:
+            return jsonify({'success': True, 'count': session['cart_count']})
+        
         cart = None
         if current_user.is_authenticated:
             cart = Cart.query.filter_by(user_id=current_user.id, status='active').first()
@@ -3788,20 +4503,366 @@ def get_cart_count():
 
         count = 0
         if cart:
-            # Sum up all items in the cart
-            items = CartItem.query.filter_by(cart_id=cart.id).all()
-            count = sum(item.quantity for item in items)
+            count = get_cart_totals(cart.id)[0]
+        remember_cart_count(count)
 
         return jsonify({'success': True, 'count': count})
     except Exception as e:
         app.logger.error(f'Error getting cart count: {str(e)}')
         return jsonify({'success': False, 'error': str(e), 'count': 0})
 
+# Catalogue versions are change_seq values. Triggers number every product insert, update and
+# delete from a single counter while the write holds the database's write lock on the counter,
+# so the numbers follow commit order: a row committed after a client read version N always gets
+# a number above N, however long its transaction stayed open. Deleted products leave a row in
+# product_deletion. Raw SQL writes are numbered the same way as ORM ones.
+#
+# Deletions are kept for the last CATALOGUE_DELTA_WINDOW changes; a since= version older than
+# that gets a full listing instead of a delta.
+CATALOGUE_DELTA_WINDOW = 100000
+
+PRODUCT_CHANGE_DDL = {
+    'sqlite': (
+        """CREATE TABLE IF NOT EXISTS catalogue_sequence (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL
+        )""",
+        "INSERT OR IGNORE INTO catalogue_sequence (id, value) "
+        "VALUES (1, COALESCE((SELECT MAX(change_seq) FROM product), 0))",
+        """CREATE TABLE IF NOT EXISTS product_deletion (
+            change_seq INTEGER PRIMARY KEY,
+            product_id INTEGER NOT NULL
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS product_change_insert AFTER INSERT ON product BEGIN
+            UPDATE catalogue_sequence SET value = value + 1;
+            UPDATE product SET change_seq = (SELECT value FROM catalogue_sequence) WHERE id = new.id;
+        END""",
+        # The WHEN clause skips the trigger's own change_seq update
+        """CREATE TRIGGER IF NOT EXISTS product_change_update AFTER UPDATE ON product
+        WHEN new.change_seq IS old.change_seq BEGIN
+            UPDATE catalogue_sequence SET value = value + 1;
+            UPDATE product SET change_seq = (SELECT value FROM catalogue_sequence) WHERE id = new.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS product_change_delete AFTER DELETE ON product BEGIN
+            UPDATE catalogue_sequence SET value = value + 1;
+            INSERT INTO product_deletion (change_seq, product_id) SELECT value, old.id FROM catalogue_sequence;
+            DELETE FROM product_deletion
+            WHERE change_seq <= (SELECT value FROM catalogue_sequence) - {CATALOGUE_DELTA_WINDOW};
+        END""",
+    ),
+    'postgresql': (
+        """CREATE TABLE IF NOT EXISTS catalogue_sequence (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value BIGINT NOT NULL
+        )""",
+        "INSERT INTO catalogue_sequence (id, value) "
+        "VALUES (1, COALESCE((SELECT MAX(change_seq) FROM product), 0)) ON CONFLICT DO NOTHING",
+        """CREATE TABLE IF NOT EXISTS product_deletion (
+            change_seq BIGINT PRIMARY KEY,
+            product_id INTEGER NOT NULL
+        )""",
+        f"""CREATE OR REPLACE FUNCTION product_change() RETURNS trigger AS $$
+        DECLARE
+            seq BIGINT;
+        BEGIN
+            UPDATE catalogue_sequence SET value = value + 1 RETURNING value INTO seq;
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO product_deletion (change_seq, product_id) VALUES (seq, OLD.id);
+                DELETE FROM product_deletion WHERE change_seq <= seq - {CATALOGUE_DELTA_WINDOW};
+                RETURN OLD;
+            END IF;
+            NEW.change_seq := seq;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS product_change ON product",
+        """CREATE TRIGGER product_change BEFORE INSERT OR UPDATE OR DELETE ON product
+        FOR EACH ROW EXECUTE FUNCTION product_change()""",
+    ),
+}
+
+# New databases get the counter and triggers along with the product table
+for dialect, statements in PRODUCT_CHANGE_DDL.items():
+    for statement in statements:
+        event.listen(Product.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+
+def catalogue_changes_tracked():
+    """Whether the database numbers product changes; other databases only get full listings"""
+    return db.engine.dialect.name in PRODUCT_CHANGE_DDL
+
+def get_catalogue_version():
+    """(version, product count) for the product table; version is the newest change_seq"""
+    if not catalogue_changes_tracked():
+        newest, count = db.session.query(func.max(Product.updated_at), func.count(Product.id)).one()
+        return (newest.isoformat() if newest else ''), count
+    newest, count = db.session.query(func.max(Product.change_seq), func.count(Product.id)).one()
+    return newest or 0, count
+
+def parse_catalogue_since(value):
+    """
+    change_seq to return later changes for, from a since=<version> cursor. None asks for a full
+    listing: when no version is given, when its deletions have been pruned, or when the database
+    doesn't number changes.
+    """
+    if not value or not catalogue_changes_tracked():
+        return None
+    since = int(value)
+    if since < 0:
+        raise ValueError(f"Invalid catalogue version: {value}")
+    latest = db.session.execute(text("SELECT value FROM catalogue_sequence")).scalar() or 0
+    if since < latest - CATALOGUE_DELTA_WINDOW:
+        return None
+    return since
+
+def get_deleted_products(since, present=()):
+    """Ids of products deleted after the since version, leaving out ids that exist again"""
+    rows = db.session.execute(
+        text("SELECT DISTINCT product_id FROM product_deletion WHERE change_seq > :since"), {'since': since}
+    )
+    return [product_id for (product_id,) in rows if product_id not in present]
+
+def get_catalogue_listing(version, count):
+    """
+    Every product from the catalogue cache with the (version, count) of that copy, for the ETag.
+    Writes made outside the ORM session, e.g. by sql_operations or maintenance scripts, don't
+    reach the cache until it expires, so it is reloaded when the database is at another version.
+    """
+    if not catalogue_changes_tracked():
+        # Without change numbers the cache can't tell whether it is current, so read the table
+        return sorted(load_catalogue(), key=lambda product: product.name.lower()), version, count
+    products, cached = catalogue.snapshot()
+    if cached != (version, count):
+        catalogue.invalidate()
+        products, cached = catalogue.snapshot()
+    return (products, *cached)
+
+def catalogue_etag(version, count):
+    """ETag for a catalogue response; covers the data version and the query that shaped the body"""
+    return hashlib.md5(f"{version}|{count}|{request.full_path}".encode()).hexdigest()
+
+CATALOGUE_PAGE_SIZE = 48
+MAX_CATALOGUE_PAGE = 200
+
+# sort name -> (key column, descending); pages are ordered by the key and then id
+CATALOGUE_SORTS = {
+    'name': (Product.name, False),
+    'price-asc': (Product.price, False),
+    'price-desc': (Product.price, True),
+}
+
+# Columns shown to shoppers and tills; costs stay out of the public catalogue
+CATALOGUE_COLUMNS = (Product.id, Product.name, Product.description, Product.price, Product.currency,
+                     Product.stock, Product.unit, Product.category, Product.image_url)
+
+def encode_catalogue_cursor(sort, row):
+    """Opaque cursor pointing just after row in the given sort order"""
+    key = CATALOGUE_SORTS[sort][0].key
+    return base64.urlsafe_b64encode(json.dumps([sort, row[key], row['id']]).encode()).decode()
+
+def decode_catalogue_cursor(sort, cursor):
+    """(key value, id) from a cursor; ValueError if it is malformed or from another sort order"""
+    try:
+        cursor_sort, value, product_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if cursor_sort != sort or not isinstance(product_id, int):
+        raise ValueError('Invalid cursor')
+    return value, product_id
+
+MAX_SEARCH_RESULTS = 50
+
+# Full-text index over the product columns cashiers search by. It is an external-content FTS5
+# table: it stores only the index and reads text from product, kept in step by triggers, so raw
+# SQL writes and bulk deletes are covered as well as ORM ones. Stock updates don't touch it.
+PRODUCT_SEARCH_COLUMNS = 'name, description, category, barcode'
+PRODUCT_SEARCH_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+        {PRODUCT_SEARCH_COLUMNS},
+        content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_search (rowid, {PRODUCT_SEARCH_COLUMNS})
+        VALUES (new.id, new.name, new.description, new.category, new.barcode);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_delete AFTER DELETE ON product BEGIN
+        INSERT INTO product_search (product_search, rowid, {PRODUCT_SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.name, old.description, old.category, old.barcode);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_search_update
+    AFTER UPDATE OF {PRODUCT_SEARCH_COLUMNS} ON product BEGIN
+        INSERT INTO product_search (product_search, rowid, {PRODUCT_SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.name, old.description, old.category, old.barcode);
+        INSERT INTO product_search (rowid, {PRODUCT_SEARCH_COLUMNS})
+        VALUES (new.id, new.name, new.description, new.category, new.barcode);
+    END""",
+)
+
+# New databases get the index along with the product table
+for statement in PRODUCT_SEARCH_DDL:
+    event.listen(Product.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+def product_search_indexed():
+    """Whether the database has the FTS5 index; other databases are searched with LIKE"""
+    return db.engine.dialect.name == 'sqlite'
+
+def product_search_match(query):
+    """FTS5 query matching products that have every typed word as a prefix, '' when there are none"""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query.lower()))
+
+def product_search_like(query, columns=(Product.name, Product.description, Product.category, Product.barcode)):
+    """
+    LIKE condition for databases without the index: every typed word appears somewhere in the
+    columns. None when there are no words. It scans the table, so it is only a fallback.
+    """
+    words = re.findall(r'\w+', query.lower())
+    if not words:
+        return None
+    return and_(*(or_(*(column.icontains(word, autoescape=True) for column in columns)) for word in words))
+
+# bm25 weights for name, description, category and barcode; name hits count most
+PRODUCT_SEARCH_RANK = 'bm25(10.0, 1.0, 2.0, 5.0)'
+
+def search_products(query, limit=20):
+    """
+    Products matching a search-as-you-type query, best match first.
+
+    Matches are ranked by bm25 with name hits weighted highest, ties in name order. The index
+    picks the best `limit` matches itself (ORDER BY rank LIMIT), so only those rows are read
+    from product. Every match is still scored: with 50,000 products in
+    benchmark_product_search.py a one-letter prefix takes 20-130 ms, longer words a few ms.
+    Databases without the index get substring matches, name and barcode hits first.
+    """
+    if not product_search_indexed():
+        condition = product_search_like(query)
+        if condition is None:
+            return []
+        name_match = product_search_like(query, (Product.name, Product.barcode))
+        rows = db.session.execute(
+            db.select(*CATALOGUE_COLUMNS, Product.barcode).where(condition)
+            .order_by(case((name_match, 0), else_=1), Product.name).limit(limit)
+        ).mappings()
+        return [dict(row) for row in rows]
+
+    match = product_search_match(query)
+    if not match:
+        return []
+    columns = ', '.join(f'product.{column.key}' for column in CATALOGUE_COLUMNS)
+    rows = db.session.execute(text(f"""
+        SELECT {columns}, product.barcode
+        FROM (
+            SELECT rowid, rank FROM product_search
+            WHERE product_search MATCH :match AND rank MATCH :rank
+            ORDER BY rank
+            LIMIT :limit
+        ) AS best
+        JOIN product ON product.id = best.rowid
+        ORDER BY best.rank, product.name
+    """), {'match': match, 'rank': PRODUCT_SEARCH_RANK, 'limit': limit}).mappings()
+    return [dict(row) for row in rows]
+
+# Products below this stock show the "Low Stock" badge (LOW_STOCK_BADGE_LEVEL in app.js)
+LOW_STOCK_BADGE_LEVEL = 10
+
+# Product fragments are cached without stock, which changes with every sale. The templates
+# print these markers instead and product_fragments() puts the current values in their place.
+STOCK_SLOTS = {
+    'stock': '\x00stock\x00',
+    'stock_2f': '\x00stock_2f\x00',
+    'low_stock_hidden': '\x00low_stock_hidden\x00',
+}
+
+product_fragment_cache = FragmentCache()
+
+def product_fragments(template_name, products):
+    """
+    HTML for a product grid joined from cached per-product fragments.
+
+    Fragments are keyed by the template and every displayed column except stock, so an edited
+    product is simply rendered again under its new key; stock is filled into each one here.
+    """
+    template = app.jinja_env.get_template(template_name)
+    parts = []
+    for product in products:
+        key = (template_name,) + tuple(product[column.key] for column in CATALOGUE_COLUMNS if column.key != 'stock')
+        html = product_fragment_cache.get(key, lambda: template.render(product=product, **STOCK_SLOTS))
+        stock = product['stock']
+        parts.append(
+            html.replace(STOCK_SLOTS['stock'], str(stock))
+                .replace(STOCK_SLOTS['stock_2f'], f'{stock:.2f}')
+                .replace(STOCK_SLOTS['low_stock_hidden'], '' if stock < LOW_STOCK_BADGE_LEVEL else ' d-none')
+        )
+    return Markup(''.join(parts))
+
+def get_catalogue_page(limit=CATALOGUE_PAGE_SIZE, cursor=None, sort='name', category=None,
+                       in_stock=False, min_price=None, max_price=None, search=None):
+    """
+    One page of products as (rows, next_cursor); next_cursor is None on the last page.
+
+    Pages are read with a keyset condition on (sort key, id) instead of OFFSET, so every page
+    is an index range scan no matter how deep the shopper has scrolled.
+    """
+    column, descending = CATALOGUE_SORTS[sort]
+    query = db.select(*CATALOGUE_COLUMNS)
+    if category:
+        query = query.where(Product.category == category)
+    if in_stock:
+        query = query.where(Product.stock > 0)
+    if min_price is not None:
+        query = query.where(Product.price >= min_price)
+    if max_price is not None:
+        query = query.where(Product.price <= max_price)
+    if search and not product_search_indexed():
+        condition = product_search_like(search)
+        if condition is not None:
+            query = query.where(condition)
+    elif search:
+        match = product_search_match(search)
+        if match:
+            matching_ids = text("SELECT rowid FROM product_search WHERE product_search MATCH :match")
+            query = query.where(Product.id.in_(matching_ids.bindparams(match=match)))
+    if cursor:
+        after = decode_catalogue_cursor(sort, cursor)
+        keyset = tuple_(column, Product.id)
+        query = query.where(keyset < after if descending else keyset > after)
+    if descending:
+        query = query.order_by(column.desc(), Product.id.desc())
+    else:
+        query = query.order_by(column, Product.id)
+    rows = [dict(row) for row in db.session.execute(query.limit(limit + 1)).mappings()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_catalogue_cursor(sort, rows[-1])
+    return rows, next_cursor
+
 @app.route('/api/stock_status')
 def api_stock_status():
-    """API endpoint to get current stock status for products."""
+    """
+    API endpoint to get current stock status for products.
+    
+    Pass since=<version> from a previous response to get only products changed after it.
+    Responses carry an ETag, a matching If-None-Match gets 304 without reading any products.
+    """
     try:
-        products = Product.query.all()
+        version, count = get_catalogue_version()
+        etag = catalogue_etag(version, count)
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+        
+        try:
+            since = parse_catalogue_since(request.args.get('since'))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid since version'}), 400
+        
+        # Full listings come from the catalogue cache; deltas use the change_seq index
+        if since is None:
+            products, version, count = get_catalogue_listing(version, count)
+            etag = catalogue_etag(version, count)
+        else:
+            products = Product.query.filter(Product.change_seq > since).all()
         result = {}
         for product in products:
             result[product.id] = {
@@ -3817,11 +4878,74 @@ def api_stock_status():
                 'needs_restock': product.stock <= product.reorder_point,
                 'is_overstocked': product.stock >= product.max_stock * 0.9
             }
-        return jsonify({'success': True, 'products': result})
+        body = {'success': True, 'products': result, 'version': version, 'since': since is not None}
+        if since is not None:
+            body['deleted'] = get_deleted_products(since, set(result))
+        response = jsonify(body)
+        response.set_etag(etag)
+        return response
     except Exception as e:
         app.logger.error(f"Error in /api/stock_status: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/catalogue')
+def api_catalogue():
+    """
+    Cursor-paginated product catalogue for the shop and till pages.
+
+    Query parameters: limit, cursor (next_cursor of the previous page), sort (name, price-asc,
+    price-desc), category, in_stock=1, min_price, max_price and q (words matched as prefixes).
+    """
+    try:
+        version, count = get_catalogue_version()
+        etag = catalogue_etag(version, count)
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        args = request.args
+        sort = args.get('sort', 'name')
+        if sort not in CATALOGUE_SORTS:
+            return jsonify({'success': False, 'error': f'Unknown sort: {sort}'}), 400
+        try:
+            limit = min(max(int(args.get('limit', CATALOGUE_PAGE_SIZE)), 1), MAX_CATALOGUE_PAGE)
+            min_price = float(args['min_price']) if args.get('min_price') else None
+            max_price = float(args['max_price']) if args.get('max_price') else None
+            products, next_cursor = get_catalogue_page(
+                limit=limit,
+                cursor=args.get('cursor'),
+                sort=sort,
+                category=args.get('category') or None,
+                in_stock=args.get('in_stock') in ('1', 'true', 'yes'),
+                min_price=min_price,
+                max_price=max_price,
+                search=args.get('q', '').strip() or None
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        response = jsonify({'success': True, 'products': products, 'next_cursor': next_cursor, 'version': version})
+        response.set_etag(etag)
+        return response
+    except Exception as e:
+        app.logger.error(f"Error in /api/catalogue: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/products/search')
+def api_product_search():
+    """Ranked product search for search-as-you-type boxes: q=<typed text>, optional limit"""
+    try:
+        try:
+            limit = min(max(int(request.args.get('limit', 20)), 1), MAX_SEARCH_RESULTS)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+        products = search_products(request.args.get('q', ''), limit)
+        return jsonify({'success': True, 'products': products})
+    except Exception as e:
+        app.logger.error(f"Error in /api/products/search: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/staff/update_order_status/<int:order_id>', methods=['POST'])
 @login_required
 @staff_required
@@ -3840,6 +4964,11 @@ def staff_update_order_status(order_id):
         order.updated_at = now
         if new_status == 'completed' and old_status != 'completed':
             order.completed_at = now
+        # Cancelled orders are not counted in the daily sales rollup
+        was_excluded = old_status in REPORT_EXCLUDED_STATUSES
+        is_excluded = new_status in REPORT_EXCLUDED_STATUSES
+        if was_excluded != is_excluded:
+            adjust_sales_rollup_for_order(order.id, -1 if is_excluded else 1)
         db.session.commit()
         flash(f'Order status updated to {new_status}', 'success')
         return redirect(url_for('staff_order_detail', order_id=order_id))
@@ -3849,6 +4978,10 @@ def staff_update_order_status(order_id):
         flash(f"Error updating order: {str(e)}", "error")
         return redirect(url_for('staff_order_detail', order_id=order_id))
 
+# Apply schema additions to existing databases before serving requests
+upgrade_database_schema()
+warm_catalogue()
+
 def choose_async_mode():
     import sys
     if getattr(sys, 'frozen', False):
@@ -3867,24 +5000,35 @@ def choose_async_mode():
     return 'threading'
 
 async_mode = choose_async_mode()
-print(f"Using async_mode: {async_mode}")
+logger.info("Using async_mode %s", async_mode)
+
+# With several worker processes, events emitted by one worker reach clients of the others through this queue
+app.config.setdefault('SOCKETIO_MESSAGE_QUEUE', os.getenv('SOCKETIO_MESSAGE_QUEUE'))
 
 try:
-    socketio = SocketIO(app, async_mode=async_mode, cors_allowed_origins="*")
+    socketio = SocketIO(app, async_mode=async_mode, cors_allowed_origins="*",
+                        message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
 except ValueError as e:
-    print(f"SocketIO init failed with async_mode={async_mode}: {e}")
-    print("Falling back to 'threading' mode.")
-    socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*")
+    logger.warning("SocketIO init failed with async_mode=%s (%s), falling back to threading", async_mode, e)
+    socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*",
+                        message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
+
+@socketio.on('connect')
+def handle_connect():
+    # Staff and admins receive new_online_order events as soon as orders are placed
+    if current_user.is_authenticated and (current_user.is_staff or current_user.is_admin):
+        join_room(STAFF_ROOM)
 
 @socketio.on('ping_last_seen')
 def handle_ping_last_seen():
     if current_user.is_authenticated:
-        current_user.last_seen = datetime.utcnow()
-        db.session.commit()
+        last_seen = presence.touch(current_user.id)
+        if presence.flush_due():
+            flush_presence()
         # Optionally, broadcast update to admin dashboard
         emit('last_seen_update', {
             'user_id': current_user.id,
-            'last_seen': current_user.last_seen.strftime('%Y-%m-%d %H:%M:%S')
+            'last_seen': last_seen.strftime('%Y-%m-%d %H:%M:%S')
         }, broadcast=True)
 
 if __name__ == '__main__':
@@ -3896,4 +5040,4 @@ if __name__ == '__main__':
     
     # Run app with permissive host to allow access from all IPs in local network
     # This can help with network-related 403 errors
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True, allow_unsafe_werkzeug=True) 
\ No newline at end of file
+    socketio.run(app, host='0.0.0.0', port=5000, debug=app.config['DEBUG'], allow_unsafe_werkzeug=True) 
\ No newline at end of file
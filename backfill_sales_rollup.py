@@ -0,0 +1,13 @@
+from app import app, db, DailySalesRollup, rebuild_sales_rollup
+
+def backfill_sales_rollup():
+    """Rebuild the daily_sales_rollup table from all existing orders."""
+    with app.app_context():
+        # Make sure the table exists on databases created before the rollup was added
+        DailySalesRollup.__table__.create(db.engine, checkfirst=True)
+        
+        rows = rebuild_sales_rollup()
+        print(f"Daily sales rollup rebuilt: {rows} day/order type rows written.")
+
+if __name__ == '__main__':
+    backfill_sales_rollup()
@@ -1,5 +1,6 @@
 import os
 import shutil
+import sqlite3
 from datetime import datetime
 
 def ensure_backup_dir():
@@ -14,7 +15,13 @@ def backup_database():
         return False
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     backup_path = os.path.join('backups', f'pos_{timestamp}.db')
-    shutil.copy2(db_path, backup_path)
+    # Online backup API: includes changes still in the WAL file and is safe while the app is running
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(backup_path)
+    with target:
+        source.backup(target)
+    target.close()
+    source.close()
     print(f"Database backed up to {backup_path}")
     return True
 
@@ -0,0 +1,70 @@
+"""
+Benchmark per-order latency of create_order() for different basket sizes.
+
+Creates its own products, writes the orders against the configured database and removes
+everything it added afterwards (the daily sales rollup is rebuilt at the end).
+
+Usage: python benchmark_order_creation.py [orders_per_size]
+"""
+import sys
+import time
+import statistics
+
+from app import app, db, Product, Order, OrderItem, StockMovement, create_order, rebuild_sales_rollup
+
+BASKET_SIZES = (1, 10, 60)
+
+
+def create_benchmark_products(count, stock):
+    """Add products only the benchmark sells from and return their ids"""
+    products = [
+        Product(name=f'Benchmark Product {i}', price=1000.0, buying_price=600.0, stock=stock, max_stock=stock)
+        for i in range(count)
+    ]
+    db.session.add_all(products)
+    db.session.commit()
+    return [product.id for product in products]
+
+
+def remove_benchmark_data(order_ids, product_ids):
+    """Delete the orders and products a benchmark wrote and rebuild the daily sales rollup"""
+    db.session.rollback()
+    OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+    Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+    StockMovement.query.filter(StockMovement.product_id.in_(product_ids)).delete(synchronize_session=False)
+    Product.query.filter(Product.id.in_(product_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    rebuild_sales_rollup()
+
+
+def run_benchmark(orders_per_size=50):
+    with app.app_context():
+        product_ids = create_benchmark_products(max(BASKET_SIZES), orders_per_size * len(BASKET_SIZES))
+        order_ids = []
+
+        try:
+            for size in BASKET_SIZES:
+                items_data = [
+                    {'product_id': product_id, 'quantity': 1, 'price': 1000.0}
+                    for product_id in product_ids[:size]
+                ]
+                timings = []
+                for _ in range(orders_per_size):
+                    started = time.perf_counter()
+                    result = create_order({'customer_name': 'Benchmark'}, items_data, 'in-store')
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if not result.success:
+                        raise RuntimeError(f"Order creation failed: {result.error} {result.issues}")
+                    order_ids.append(result.order.id)
+
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                print(f"{size:>3} items: mean {statistics.mean(timings):7.2f} ms, "
+                      f"median {statistics.median(timings):7.2f} ms, p95 {p95:7.2f} ms "
+                      f"({orders_per_size} orders)")
+        finally:
+            remove_benchmark_data(order_ids, product_ids)
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
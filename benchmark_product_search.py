@@ -0,0 +1,92 @@
+"""
+Measure search-as-you-type latency of the product_search full-text index against the
+LIKE scan it replaces, on a catalogue of generated products (50,000 by default).
+
+Each query is timed as a cashier types it, one prefix at a time ('r', 'ri', 'ric', ...),
+with the database pages it reads already cached as they are on a till in use.
+Everything the benchmark writes is removed afterwards.
+
+Usage: python benchmark_product_search.py [products] [repeats]
+"""
+import gc
+import sys
+import time
+import random
+import statistics
+
+from app import app, db, Product, search_products
+
+BRANDS = ('Mukwano', 'Kakira', 'Fresh Dairy', 'Nile', 'Riham', 'Blue Band', 'Kimbo', 'Omo', 'Sunlight',
+          'Jesa', 'Highland', 'Rwenzori', 'Pearl', 'Tilda', 'Daawat', 'Kabalega', 'Nomi', 'Samona')
+ITEMS = ('Rice', 'Sugar', 'Milk', 'Cooking Oil', 'Margarine', 'Washing Powder', 'Bar Soap', 'Mineral Water',
+         'Juice', 'Maize Flour', 'Wheat Flour', 'Tea Leaves', 'Coffee', 'Biscuits', 'Salt', 'Beans',
+         'Groundnuts', 'Yoghurt', 'Bread', 'Spaghetti', 'Tomato Paste', 'Toothpaste', 'Tissue', 'Matches')
+SIZES = ('250g', '500g', '1kg', '2kg', '5kg', '10kg', '300ml', '500ml', '1L', '2L', '5L', '20L')
+SEARCHES = ('rice 5kg', 'mukwano oil', 'fresh milk', 'tilda', 'washing powder 1kg')
+BARCODE_PREFIX = 'BENCH-SEARCH-'
+
+
+def create_search_products(count):
+    """Insert generated products in one statement per batch and return their ids"""
+    rng = random.Random(42)
+    for start in range(0, count, 5000):
+        rows = [{
+            'name': f'{rng.choice(BRANDS)} {rng.choice(ITEMS)} {rng.choice(SIZES)}',
+            'description': f'{rng.choice(ITEMS)} from {rng.choice(BRANDS)}',
+            'category': rng.choice(('dry_goods', 'dairy', 'beverages', 'household', 'bakery')),
+            'barcode': f'{BARCODE_PREFIX}{i}',
+            'price': rng.randrange(500, 100000, 500),
+            'buying_price': 400.0,
+            'stock': rng.randrange(0, 200),
+            'max_stock': 200,
+        } for i in range(start, min(start + 5000, count))]
+        db.session.execute(db.insert(Product), rows)
+        db.session.commit()
+    return [row[0] for row in db.session.query(Product.id).filter(Product.barcode.like(f'{BARCODE_PREFIX}%'))]
+
+
+def like_search(query, limit=20):
+    """What a search box had without the index: a substring scan over product names"""
+    return Product.query.filter(Product.name.contains(query, autoescape=True)) \
+        .order_by(Product.name).limit(limit).all()
+
+
+def time_prefixes(search, repeats):
+    """Milliseconds per query for every prefix of every search; the first pass warms the page cache"""
+    timings = []
+    # Collector pauses in this process would otherwise land on random queries
+    gc.disable()
+    try:
+        for text in SEARCHES:
+            for length in range(1, len(text) + 1):
+                search(text[:length])
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    search(text[:length])
+                    timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        gc.enable()
+    return sorted(timings)
+
+
+def run_benchmark(count=50000, repeats=5):
+    with app.app_context():
+        product_ids = create_search_products(count)
+        try:
+            print(f"{len(product_ids)} generated products")
+            for label, search in (('fts5', search_products), ('like', like_search)):
+                timings = time_prefixes(search, repeats)
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                print(f"{label:<5} mean {statistics.mean(timings):7.2f} ms, median {statistics.median(timings):7.2f} ms, "
+                      f"p95 {p95:7.2f} ms, max {timings[-1]:7.2f} ms ({len(timings)} queries)")
+            db.session.rollback()
+        finally:
+            Product.query.filter(Product.barcode.like(f'{BARCODE_PREFIX}%')).delete(synchronize_session=False)
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    )
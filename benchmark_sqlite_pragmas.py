@@ -0,0 +1,98 @@
+"""
+Compare concurrent order throughput with SQLite's default settings and with the app's
+SQLITE_PRAGMAS profile (WAL, busy_timeout, cache/mmap sizes, synchronous=NORMAL).
+
+Several till threads create orders while a reporting thread keeps running the daily
+sales aggregation, as happens when an admin opens the reports during trading.
+Everything the benchmark writes is removed afterwards.
+
+Usage: python benchmark_sqlite_pragmas.py [tills] [orders_per_till]
+"""
+import sys
+import time
+import threading
+from datetime import date, timedelta
+
+from app import app, db, create_order, get_daily_financials
+from benchmark_order_creation import create_benchmark_products, remove_benchmark_data
+
+# What SQLite does when nothing is configured (busy_timeout matches the Python driver's 5 s default)
+SQLITE_DEFAULTS = {
+    'journal_mode': 'DELETE',
+    'busy_timeout': 5000,
+    'foreign_keys': 'ON',
+    'synchronous': 'FULL',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'temp_store': 'DEFAULT',
+}
+
+
+def run_profile(label, pragmas, tills, orders_per_till, product_ids):
+    """Run the till and report threads against fresh connections using the given pragmas"""
+    app.config['SQLITE_PRAGMAS'] = pragmas
+    with app.app_context():
+        # New connections pick up the profile; journal_mode is switched on the file itself
+        db.engine.dispose()
+
+    order_ids = []
+    failures = []
+    lock = threading.Lock()
+    tills_done = threading.Event()
+
+    def till(worker):
+        with app.app_context():
+            items_data = [{'product_id': product_ids[worker % len(product_ids)], 'quantity': 1, 'price': 1000.0}]
+            for _ in range(orders_per_till):
+                result = create_order({'customer_name': f'Benchmark till {worker}'}, items_data, 'in-store')
+                with lock:
+                    if result.success:
+                        order_ids.append(result.order.id)
+                    else:
+                        failures.append(result.error)
+
+    def reports():
+        with app.app_context():
+            while not tills_done.is_set():
+                get_daily_financials(date.today() - timedelta(days=365), date.today())
+                db.session.rollback()
+
+    reporter = threading.Thread(target=reports)
+    workers = [threading.Thread(target=till, args=(worker,)) for worker in range(tills)]
+    started = time.perf_counter()
+    reporter.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    tills_done.set()
+    reporter.join()
+
+    print(f"{label:<10} {len(order_ids) / elapsed:8.1f} orders/s  "
+          f"{len(order_ids)} ok, {len(failures)} failed in {elapsed:.2f} s")
+    if failures:
+        print(f"           first failure: {failures[0]}")
+    return order_ids
+
+
+def run_benchmark(tills=4, orders_per_till=50):
+    configured = dict(app.config['SQLITE_PRAGMAS'])
+    with app.app_context():
+        product_ids = create_benchmark_products(tills, orders_per_till * 2)
+    order_ids = []
+    try:
+        order_ids += run_profile('defaults', SQLITE_DEFAULTS, tills, orders_per_till, product_ids)
+        order_ids += run_profile('tuned', configured, tills, orders_per_till, product_ids)
+    finally:
+        app.config['SQLITE_PRAGMAS'] = configured
+        with app.app_context():
+            db.engine.dispose()
+            remove_benchmark_data(order_ids, product_ids)
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    )
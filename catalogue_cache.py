@@ -0,0 +1,148 @@
+import threading
+import time
+
+
+class CatalogueCache:
+    """
+    Process-local copy of the product catalogue, indexed by id, barcode and category.
+
+    The whole table is loaded by load(None) on first use and again after max_age seconds;
+    load(ids) re-reads just the given rows. Writers call invalidate() with the ids they
+    committed, and those rows are re-read on the next lookup, so reads between writes are
+    dictionary lookups. update() applies known column values without a re-read.
+    Loads run under the lock, so an invalidation that arrives during a load is applied after it.
+
+    With several worker processes, sync() is called before each lookup and returns the ids
+    other workers changed since the last call (None when the whole table must be re-read).
+
+    snapshot() returns the products together with the version of that copy, (newest change_seq,
+    count), for comparing with the database and for building ETags.
+    """
+
+    def __init__(self, load, max_age=300, sync=None):
+        self._load = load
+        self._sync = sync
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._by_id = None
+        self._by_barcode = {}
+        self._by_category = {}
+        self._by_name = None
+        self._version = None
+        self._stale = set()
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _index(self, entry):
+        self._by_id[entry.id] = entry
+        if entry.barcode:
+            self._by_barcode[entry.barcode] = entry
+        self._by_category.setdefault(entry.category, {})[entry.id] = entry
+
+    def _unindex(self, product_id):
+        entry = self._by_id.pop(product_id, None)
+        if entry is None:
+            return
+        if entry.barcode and self._by_barcode.get(entry.barcode) is entry:
+            del self._by_barcode[entry.barcode]
+        self._by_category.get(entry.category, {}).pop(product_id, None)
+
+    def _current(self):
+        """Bring the indexes up to date; caller holds the lock"""
+        if self._sync is not None:
+            changed = self._sync()
+            if changed is None:
+                self._by_id = None
+            elif changed and self._by_id is not None:
+                self._stale.update(changed)
+        if self._by_id is None or time.monotonic() - self._loaded_at >= self.max_age:
+            self.misses += 1
+            self._by_id, self._by_barcode, self._by_category = {}, {}, {}
+            self._stale.clear()
+            self._loaded_at = time.monotonic()
+            for entry in self._load(None):
+                self._index(entry)
+            self._by_name = self._version = None
+        elif self._stale:
+            self.misses += 1
+            ids, self._stale = self._stale, set()
+            for product_id in ids:
+                self._unindex(product_id)
+            for entry in self._load(ids):
+                self._index(entry)
+            self._by_name = self._version = None
+        else:
+            self.hits += 1
+
+    def all(self):
+        """Every product, ordered by name"""
+        with self._lock:
+            self._current()
+            if self._by_name is None:
+                self._by_name = sorted(self._by_id.values(), key=lambda entry: entry.name.lower())
+            return self._by_name
+
+    def snapshot(self):
+        """(every product ordered by name, (newest change_seq, count)) from one consistent copy"""
+        with self._lock:
+            products = self.all()
+            if self._version is None:
+                newest = max((entry.change_seq or 0 for entry in self._by_id.values()), default=0)
+                self._version = (newest, len(self._by_id))
+            return products, self._version
+
+    def get(self, product_id):
+        with self._lock:
+            self._current()
+            return self._by_id.get(product_id)
+
+    def by_barcode(self, barcode):
+        with self._lock:
+            self._current()
+            return self._by_barcode.get(barcode)
+
+    def by_barcodes(self, barcodes):
+        """{barcode: product or None} for several codes with a single freshness check"""
+        with self._lock:
+            self._current()
+            return {barcode: self._by_barcode.get(barcode) for barcode in barcodes}
+
+    def in_category(self, category):
+        with self._lock:
+            self._current()
+            return list(self._by_category.get(category, {}).values())
+
+    def category_counts(self):
+        """{category: number of products} for the categories that have any"""
+        with self._lock:
+            self._current()
+            return {category: len(entries) for category, entries in self._by_category.items() if entries}
+
+    def update(self, product_id, **values):
+        """Replace some column values of a cached product, e.g. stock after a sale"""
+        with self._lock:
+            entry = self._by_id.get(product_id) if self._by_id is not None else None
+            if entry is not None and product_id not in self._stale:
+                self._unindex(product_id)
+                self._index(entry.replace(**values))
+                self._by_name = self._version = None
+
+    def invalidate(self, product_ids=None):
+        """Re-read the given products on next use, or the whole catalogue when no ids are given"""
+        with self._lock:
+            if product_ids is None:
+                self._by_id = None
+            elif self._by_id is not None:
+                self._stale.update(product_ids)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self._by_id is not None,
+                'products': len(self._by_id) if self._by_id is not None else 0,
+                'stale': len(self._stale),
+                'hits': self.hits,
+                'misses': self.misses,
+                'max_age': self.max_age
+            }
@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """
+    Rendered HTML fragments keyed by the values they were rendered from.
+
+    A key carries everything that appears in its fragment, so an entry never goes stale: when
+    a product is edited it gets a new key, and the old entry is dropped once it is the least
+    recently used of max_entries. Values that change too often to cache, like stock levels,
+    are left in the fragment as slots for the caller to fill.
+    """
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        """Fragment for key, calling render() to produce it when it isn't cached"""
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+        html = render()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'fragments': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'max_entries': self.max_entries
+            }
@@ -0,0 +1,50 @@
+"""add daily_sales_rollup table
+
+Revision ID: 3f6a2b9c1d47
+Revises: 839a9c861740
+Create Date: 2025-06-02 10:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a2b9c1d47'
+down_revision = '839a9c861740'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales_rollup',
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('order_type', sa.String(length=20), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('cogs', sa.Float(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('items_sold', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('date', 'order_type')
+    )
+
+    # Backfill from the existing order history (cancelled orders are not counted)
+    op.execute("""
+        INSERT INTO daily_sales_rollup (date, order_type, revenue, cogs, order_count, items_sold)
+        SELECT DATE(o.order_date), COALESCE(o.order_type, 'online'),
+               SUM(o.total_amount), SUM(COALESCE(i.cogs, 0)), COUNT(o.id), SUM(COALESCE(i.items_sold, 0))
+        FROM "order" o
+        LEFT JOIN (
+            SELECT oi.order_id,
+                   SUM(oi.quantity * COALESCE(p.buying_price, 0)) AS cogs,
+                   SUM(oi.quantity) AS items_sold
+            FROM order_item oi
+            LEFT JOIN product p ON p.id = oi.product_id
+            GROUP BY oi.order_id
+        ) i ON i.order_id = o.id
+        WHERE o.order_date IS NOT NULL AND o.status != 'cancelled'
+        GROUP BY DATE(o.order_date), COALESCE(o.order_type, 'online')
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_sales_rollup')
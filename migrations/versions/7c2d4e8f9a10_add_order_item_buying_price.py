@@ -0,0 +1,33 @@
+"""add buying_price snapshot to order_item
+
+Revision ID: 7c2d4e8f9a10
+Revises: 3f6a2b9c1d47
+Create Date: 2025-06-04 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2d4e8f9a10'
+down_revision = '3f6a2b9c1d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('buying_price', sa.Float(), nullable=True))
+
+    # Existing items take the product's current cost as the best available estimate
+    op.execute("""
+        UPDATE order_item
+        SET buying_price = (SELECT product.buying_price FROM product WHERE product.id = order_item.product_id)
+        WHERE buying_price IS NULL
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('order_item', schema=None) as batch_op:
+        batch_op.drop_column('buying_price')
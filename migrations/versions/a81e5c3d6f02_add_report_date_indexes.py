@@ -0,0 +1,32 @@
+"""add date indexes used by reports
+
+Revision ID: a81e5c3d6f02
+Revises: 7c2d4e8f9a10
+Create Date: 2025-06-05 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a81e5c3d6f02'
+down_revision = '7c2d4e8f9a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_order_order_date', 'order', ['order_date'], unique=False)
+    op.create_index('ix_order_status_type_date', 'order', ['status', 'order_type', 'order_date'], unique=False)
+    op.create_index('ix_order_created_by_date', 'order', ['created_by_id', 'order_date'], unique=False)
+    op.create_index('ix_expense_date', 'expense', ['date'], unique=False)
+    op.create_index('ix_stock_movement_timestamp', 'stock_movement', ['timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_stock_movement_timestamp', table_name='stock_movement')
+    op.drop_index('ix_expense_date', table_name='expense')
+    op.drop_index('ix_order_created_by_date', table_name='order')
+    op.drop_index('ix_order_status_type_date', table_name='order')
+    op.drop_index('ix_order_order_date', table_name='order')
@@ -0,0 +1,105 @@
+"""number product changes in commit order for catalogue deltas
+
+Revision ID: a9c4e7b2d5f3
+Revises: f2a7d3c8e5b1
+Create Date: 2025-06-20 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c4e7b2d5f3'
+down_revision = 'f2a7d3c8e5b1'
+branch_labels = None
+depends_on = None
+
+
+# Deletions older than this many changes are pruned; the app answers older since= with a full listing
+DELTA_WINDOW = 100000
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.Integer(), nullable=True))
+    op.execute("UPDATE product SET change_seq = id")
+    op.drop_index('ix_product_updated_at', table_name='product')
+    op.create_index('ix_product_change_seq', 'product', ['change_seq'], unique=False)
+    if dialect not in ('sqlite', 'postgresql'):
+        # Other databases leave change_seq unset and get full catalogue listings
+        return
+    op.execute("""
+        CREATE TABLE catalogue_sequence (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value BIGINT NOT NULL
+        )
+    """)
+    op.execute("INSERT INTO catalogue_sequence (id, value) VALUES (1, COALESCE((SELECT MAX(change_seq) FROM product), 0))")
+    op.execute("""
+        CREATE TABLE product_deletion (
+            change_seq BIGINT PRIMARY KEY,
+            product_id INTEGER NOT NULL
+        )
+    """)
+    if dialect == 'postgresql':
+        op.execute(f"""
+            CREATE OR REPLACE FUNCTION product_change() RETURNS trigger AS $$
+            DECLARE
+                seq BIGINT;
+            BEGIN
+                UPDATE catalogue_sequence SET value = value + 1 RETURNING value INTO seq;
+                IF TG_OP = 'DELETE' THEN
+                    INSERT INTO product_deletion (change_seq, product_id) VALUES (seq, OLD.id);
+                    DELETE FROM product_deletion WHERE change_seq <= seq - {DELTA_WINDOW};
+                    RETURN OLD;
+                END IF;
+                NEW.change_seq := seq;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute("""
+            CREATE TRIGGER product_change BEFORE INSERT OR UPDATE OR DELETE ON product
+            FOR EACH ROW EXECUTE FUNCTION product_change()
+        """)
+        return
+    op.execute("""
+        CREATE TRIGGER product_change_insert AFTER INSERT ON product BEGIN
+            UPDATE catalogue_sequence SET value = value + 1;
+            UPDATE product SET change_seq = (SELECT value FROM catalogue_sequence) WHERE id = new.id;
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER product_change_update AFTER UPDATE ON product
+        WHEN new.change_seq IS old.change_seq BEGIN
+            UPDATE catalogue_sequence SET value = value + 1;
+            UPDATE product SET change_seq = (SELECT value FROM catalogue_sequence) WHERE id = new.id;
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER product_change_delete AFTER DELETE ON product BEGIN
+            UPDATE catalogue_sequence SET value = value + 1;
+            INSERT INTO product_deletion (change_seq, product_id) SELECT value, old.id FROM catalogue_sequence;
+            DELETE FROM product_deletion
+            WHERE change_seq <= (SELECT value FROM catalogue_sequence) - {DELTA_WINDOW};
+        END
+    """)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS product_change ON product")
+        op.execute("DROP FUNCTION IF EXISTS product_change()")
+    else:
+        op.execute("DROP TRIGGER IF EXISTS product_change_delete")
+        op.execute("DROP TRIGGER IF EXISTS product_change_update")
+        op.execute("DROP TRIGGER IF EXISTS product_change_insert")
+    op.execute("DROP TABLE IF EXISTS product_deletion")
+    op.execute("DROP TABLE IF EXISTS catalogue_sequence")
+    op.drop_index('ix_product_change_seq', table_name='product')
+    op.create_index('ix_product_updated_at', 'product', ['updated_at'], unique=False)
+    # A plain DROP COLUMN keeps product's other triggers, which a batch table rebuild would lose
+    op.execute("ALTER TABLE product DROP COLUMN change_seq")
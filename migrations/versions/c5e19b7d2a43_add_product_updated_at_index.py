@@ -0,0 +1,24 @@
+"""add product updated_at index for catalogue deltas
+
+Revision ID: c5e19b7d2a43
+Revises: a81e5c3d6f02
+Create Date: 2025-06-09 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e19b7d2a43'
+down_revision = 'a81e5c3d6f02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_product_updated_at', 'product', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_product_updated_at', table_name='product')
@@ -0,0 +1,28 @@
+"""add product indexes for catalogue pagination
+
+Revision ID: e8b4f1a9c3d6
+Revises: c5e19b7d2a43
+Create Date: 2025-06-12 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b4f1a9c3d6'
+down_revision = 'c5e19b7d2a43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_product_name_id', 'product', ['name', 'id'], unique=False)
+    op.create_index('ix_product_category_name_id', 'product', ['category', 'name', 'id'], unique=False)
+    op.create_index('ix_product_price_id', 'product', ['price', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_product_price_id', table_name='product')
+    op.drop_index('ix_product_category_name_id', table_name='product')
+    op.drop_index('ix_product_name_id', table_name='product')
@@ -0,0 +1,56 @@
+"""add product_search full-text index
+
+Revision ID: f2a7d3c8e5b1
+Revises: e8b4f1a9c3d6
+Create Date: 2025-06-14 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7d3c8e5b1'
+down_revision = 'e8b4f1a9c3d6'
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'name, description, category, barcode'
+
+
+def upgrade():
+    op.execute(f"""
+        CREATE VIRTUAL TABLE product_search USING fts5(
+            {COLUMNS},
+            content='product', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+        )
+    """)
+    op.execute(f"""
+        CREATE TRIGGER product_search_insert AFTER INSERT ON product BEGIN
+            INSERT INTO product_search (rowid, {COLUMNS})
+            VALUES (new.id, new.name, new.description, new.category, new.barcode);
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER product_search_delete AFTER DELETE ON product BEGIN
+            INSERT INTO product_search (product_search, rowid, {COLUMNS})
+            VALUES ('delete', old.id, old.name, old.description, old.category, old.barcode);
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER product_search_update AFTER UPDATE OF {COLUMNS} ON product BEGIN
+            INSERT INTO product_search (product_search, rowid, {COLUMNS})
+            VALUES ('delete', old.id, old.name, old.description, old.category, old.barcode);
+            INSERT INTO product_search (rowid, {COLUMNS})
+            VALUES (new.id, new.name, new.description, new.category, new.barcode);
+        END
+    """)
+    op.execute("INSERT INTO product_search (product_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS product_search_update")
+    op.execute("DROP TRIGGER IF EXISTS product_search_delete")
+    op.execute("DROP TRIGGER IF EXISTS product_search_insert")
+    op.execute("DROP TABLE IF EXISTS product_search")
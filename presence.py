@@ -0,0 +1,52 @@
+import threading
+import time
+from datetime import datetime
+
+
+class PresenceTracker:
+    """
+    Keeps users' last-seen times in memory so requests don't each need a write transaction.
+
+    touch() only updates a dict. Changed values are handed out by take_pending() at most once
+    every flush_interval seconds, for the caller to write to the database in one batch.
+    """
+
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self._last_seen = {}
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def touch(self, user_id, when=None):
+        """Record activity for a user (defaults to now, naive UTC like User.last_seen)"""
+        when = when or datetime.utcnow()
+        with self._lock:
+            self._last_seen[user_id] = when
+            self._pending[user_id] = when
+        return when
+
+    def last_seen(self, user_id, stored=None):
+        """Most recent activity for a user, falling back to (or newer than) the stored database value"""
+        with self._lock:
+            seen = self._last_seen.get(user_id)
+        if seen is None or (stored is not None and stored > seen):
+            return stored
+        return seen
+
+    def flush_due(self):
+        return bool(self._pending) and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def take_pending(self):
+        """Return {user_id: last_seen} changed since the last flush and start a new interval"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        return pending
+
+    def restore_pending(self, pending):
+        """Put back values whose flush failed so the next flush retries them"""
+        with self._lock:
+            for user_id, when in pending.items():
+                if user_id not in self._pending or self._pending[user_id] < when:
+                    self._pending[user_id] = when
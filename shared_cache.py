@@ -0,0 +1,340 @@
+"""
+Cache shared by every worker process serving the app.
+
+SharedCache stores values under namespaces. invalidate(namespace) moves the namespace to
+a new generation, so every worker stops seeing the old values at once.
+publish()/subscribe() pass invalidation messages between workers, e.g. which products
+a worker changed, so process-local copies can be refreshed.
+
+Values and messages are stored as JSON (dates and dicts with non-string keys are tagged so
+they come back as they went in), never unpickled, so data read from a shared backend can't
+run code in the workers. Anyone who can write to the backend can still change what the app
+shows, so it should be reachable only by the app.
+
+Backends, chosen with from_url():
+  memory://                 one process only, the default
+  sqlite:///path/cache.db   shared through a local file, no extra service needed
+  redis://host:6379/0       any server speaking the Redis protocol (needs the redis package)
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import deque
+from datetime import date, datetime
+
+# How long published events are kept for workers that have not polled yet
+EVENT_RETENTION_SECONDS = 3600
+
+# Events kept per channel by MemoryBackend; a subscriber further behind reloads everything
+MEMORY_EVENT_LIMIT = 1000
+
+
+def _tag(value):
+    """Copy of value that json can store, with dates and non-string dict keys tagged"""
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key: _tag(item) for key, item in value.items()}
+        return {'__items__': [[_tag(key), _tag(item)] for key, item in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [_tag(item) for item in value]
+    return value
+
+
+def _untag(obj):
+    if len(obj) == 1:
+        if '__datetime__' in obj:
+            return datetime.fromisoformat(obj['__datetime__'])
+        if '__date__' in obj:
+            return date.fromisoformat(obj['__date__'])
+        if '__items__' in obj:
+            return {(tuple(key) if isinstance(key, list) else key): item for key, item in obj['__items__']}
+    return obj
+
+
+def dumps(value):
+    return json.dumps(_tag(value), separators=(',', ':')).encode()
+
+
+def loads(data):
+    return json.loads(data, object_hook=_untag)
+
+
+class MemoryBackend:
+    """Dictionaries in this process; fine for a single worker and for tests"""
+
+    def __init__(self):
+        self._values = {}
+        self._events = {}
+        self._sets = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.time():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl if ttl else None)
+            # Values of invalidated generations are never read again, so sweep them now and then
+            self._sets += 1
+            if self._sets % 100 == 0:
+                now = time.time()
+                for stale in [k for k, (_, expires) in self._values.items() if expires is not None and expires < now]:
+                    del self._values[stale]
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._values.get(key, (0, None))[0]) + 1
+            self._values[key] = (value, None)
+            return value
+
+    def publish(self, channel, payload):
+        with self._lock:
+            latest, events = self._events.get(channel, (0, deque(maxlen=MEMORY_EVENT_LIMIT)))
+            events.append(payload)
+            self._events[channel] = (latest + 1, events)
+            return latest + 1
+
+    def latest_event(self, channel):
+        with self._lock:
+            return self._events.get(channel, (0, ()))[0]
+
+    def events_since(self, channel, seq):
+        with self._lock:
+            latest, events = self._events.get(channel, (0, ()))
+            missed = latest - seq
+            if missed <= 0:
+                return latest, []
+            if missed > len(events):
+                return latest, None
+            return latest, list(events)[-missed:]
+
+
+class SQLiteBackend:
+    """A small SQLite file next to the database, shared by all workers on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_value (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_event (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_event_channel_seq ON cache_event (channel, seq)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM cache_value WHERE key = ? AND (expires IS NULL OR expires >= ?)",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO cache_value (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+            (key, value, time.time() + ttl if ttl else None)
+        )
+        # Expired entries are removed now and then rather than on every read
+        if hash(key) % 100 == 0:
+            conn.execute("DELETE FROM cache_value WHERE expires < ?", (time.time(),))
+
+    def incr(self, key):
+        return self._connection().execute(
+            "INSERT INTO cache_value (key, value, expires) VALUES (?, 1, NULL) "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1 "
+            "RETURNING value",
+            (key,)
+        ).fetchone()[0]
+
+    def publish(self, channel, payload):
+        conn = self._connection()
+        seq = conn.execute(
+            "INSERT INTO cache_event (channel, payload, created) VALUES (?, ?, ?)",
+            (channel, payload, time.time())
+        ).lastrowid
+        if seq % 100 == 0:
+            conn.execute("DELETE FROM cache_event WHERE created < ?", (time.time() - EVENT_RETENTION_SECONDS,))
+        return seq
+
+    def latest_event(self, channel):
+        return self._connection().execute(
+            "SELECT IFNULL(MAX(seq), 0) FROM cache_event WHERE channel = ?", (channel,)
+        ).fetchone()[0]
+
+    def events_since(self, channel, seq):
+        rows = self._connection().execute(
+            "SELECT seq, payload FROM cache_event WHERE channel = ? AND seq > ? ORDER BY seq",
+            (channel, seq)
+        ).fetchall()
+        if not rows:
+            return seq, []
+        # Events older than the retention window may have been pruned in between
+        oldest = self._connection().execute("SELECT MIN(seq) FROM cache_event").fetchone()[0]
+        if oldest > seq + 1 and seq > 0:
+            return rows[-1][0], None
+        return rows[-1][0], [payload for _, payload in rows]
+
+
+class RedisBackend:
+    """Any server speaking the Redis protocol; only GET/SET/INCR/MGET are used"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis package is required for redis:// cache URLs (pip install redis)")
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._redis.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(key, value, ex=ttl or None)
+
+    def incr(self, key):
+        return self._redis.incr(key)
+
+    def publish(self, channel, payload):
+        seq = self._redis.incr(f'{channel}:seq')
+        self._redis.set(f'{channel}:event:{seq}', payload, ex=EVENT_RETENTION_SECONDS)
+        return seq
+
+    def latest_event(self, channel):
+        return int(self._redis.get(f'{channel}:seq') or 0)
+
+    def events_since(self, channel, seq):
+        latest = self.latest_event(channel)
+        if latest <= seq:
+            return seq, []
+        if latest - seq > 1000:
+            return latest, None
+        payloads = self._redis.mget([f'{channel}:event:{n}' for n in range(seq + 1, latest + 1)])
+        if any(payload is None for payload in payloads):
+            return latest, None
+        return latest, payloads
+
+
+def from_url(url):
+    """Backend for a cache URL (memory://, sqlite:///path or redis://...)"""
+    if not url or url.startswith('memory:'):
+        return MemoryBackend()
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+
+class Subscription:
+    """Reads a channel's events published by other processes since the last poll"""
+
+    def __init__(self, cache, channel):
+        self._cache = cache
+        self.channel = channel
+        self._seq = cache.backend.latest_event(channel)
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """Messages from other processes, or None when some were missed and everything must be reloaded"""
+        with self._lock:
+            self._seq, payloads = self._cache.backend.events_since(self.channel, self._seq)
+        if payloads is None:
+            return None
+        messages = []
+        for payload in payloads:
+            try:
+                origin, message = loads(payload)
+            except ValueError:
+                # Written in an older format; reloading everything is always safe
+                return None
+            if origin != self._cache.origin:
+                messages.append(message)
+        return messages
+
+
+class SharedCache:
+    """Namespaced values, stored as JSON, in a backend shared between worker processes"""
+
+    def __init__(self, backend, key_prefix='pos'):
+        self.backend = backend
+        self.key_prefix = key_prefix
+        self.origin = uuid.uuid4().hex
+        self.hits = 0
+        self.misses = 0
+
+    def _generation(self, namespace):
+        return int(self.backend.get(f'{self.key_prefix}:{namespace}:generation') or 0)
+
+    def get_or_set(self, namespace, key, compute, ttl=60):
+        """Cached value of compute() for key, computed and stored when missing"""
+        full_key = f'{self.key_prefix}:{namespace}:{self._generation(namespace)}:{key}'
+        stored = self.backend.get(full_key)
+        if stored is not None:
+            try:
+                value = loads(stored)
+            except ValueError:
+                pass  # written in an older format, computed again below
+            else:
+                self.hits += 1
+                return value
+        self.misses += 1
+        value = compute()
+        self.backend.set(full_key, dumps(value), ttl)
+        return value
+
+    def invalidate(self, namespace):
+        """Drop every value in a namespace, for all workers"""
+        self.backend.incr(f'{self.key_prefix}:{namespace}:generation')
+
+    def publish(self, channel, message):
+        self.backend.publish(f'{self.key_prefix}:{channel}', dumps([self.origin, message]))
+
+    def subscribe(self, channel):
+        return Subscription(self, f'{self.key_prefix}:{channel}')
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -1,107 +1,25 @@
-import sqlite3
 import logging
-from datetime import datetime
-import uuid
 import os
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s: %(message)s',
-    handlers=[logging.FileHandler("sql_operations.log"), logging.StreamHandler()]
-)
+# Log to sql_operations.log without configuring the root logger, so importing this module
+# doesn't copy every other module's messages to this file and the console
 logger = logging.getLogger(__name__)
+if not logger.handlers:
+    _handler = logging.FileHandler("sql_operations.log")
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
 
 def get_db_connection():
-    """Get a database connection with row factory enabled"""
+    """Get a pooled connection from the app's database engine, rows accessible by column name"""
     try:
-        conn = sqlite3.connect('instance/pos.db')
-        conn.row_factory = sqlite3.Row  # Make rows accessible by column name
-        return conn
+        # Imported here because app imports this module
+        from app import get_raw_connection
+        return get_raw_connection()
     except Exception as e:
         logger.error(f"Error connecting to database: {str(e)}")
         return None
 
-def direct_create_order(customer_data, items_data, order_type):
-    """
-    Create an order directly using SQL
-    """
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return None, "Database connection failed"
-            
-        cursor = conn.cursor()
-        
-        # Calculate total amount
-        total_amount = sum(item.get('price', 0) * item.get('quantity', 0) for item in items_data)
-        
-        # Generate a unique reference number
-        now = datetime.utcnow()
-        date_part = now.strftime('%Y%m%d')
-        random_part = str(uuid.uuid4())[:8]
-        reference_number = f"ORD-{date_part}-{random_part}"
-        
-        # Insert order using SQL
-        cursor.execute('''
-        INSERT INTO "order" (
-            reference_number, 
-            customer_name, 
-            customer_phone, 
-            customer_email, 
-            customer_address, 
-            order_date, 
-            total_amount, 
-            status, 
-            order_type, 
-            viewed
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            reference_number,
-            customer_data.get('customer_name', ''),
-            customer_data.get('customer_phone', ''),
-            customer_data.get('customer_email', ''),
-            customer_data.get('customer_address', ''),
-            now.strftime('%Y-%m-%d %H:%M:%S'),
-            total_amount,
-            'pending',
-            order_type,
-            0
-        ))
-        
-        # Get the ID of the new order
-        order_id = cursor.lastrowid
-        
-        # Insert order items
-        for item in items_data:
-            product_id = item.get('product_id')
-            quantity = item.get('quantity', 1)
-            price = item.get('price', 0)
-            
-            cursor.execute('''
-            INSERT INTO order_item (order_id, product_id, quantity, price)
-            VALUES (?, ?, ?, ?)
-            ''', (order_id, product_id, quantity, price))
-            
-            # Update product stock
-            cursor.execute('''
-            UPDATE product SET stock = stock - ? WHERE id = ?
-            ''', (quantity, product_id))
-        
-        # Commit the transaction
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Order created successfully with ID: {order_id} and reference: {reference_number}")
-        return order_id, reference_number
-        
-    except Exception as e:
-        logger.error(f"Error creating order: {str(e)}")
-        if 'conn' in locals() and conn:
-            conn.rollback()
-            conn.close()
-        return None, f"Error creating order: {str(e)}"
-
 def direct_get_order(order_id):
     """
     Get an order directly using SQL
@@ -488,27 +406,15 @@ def direct_cart_operations(operation, data=None):
 
 # Simple tests for the utility functions
 if __name__ == "__main__":
-    # Test order creation
-    print("Testing direct order creation...")
-    customer_data = {
-        'customer_name': 'Test Customer',
-        'customer_phone': '1234567890',
-        'customer_email': 'test@example.com',
-        'customer_address': 'Test Address'
-    }
-    
-    items_data = [
-        {'product_id': 1, 'quantity': 2, 'price': 10.0}
-    ]
-    
-    order_id, reference = direct_create_order(customer_data, items_data, 'test')
+    # Test getting the most recent order (orders are created through create_order() in app.py)
+    print("Testing direct order retrieval...")
+    conn = get_db_connection()
+    latest = conn.execute('SELECT id FROM "order" ORDER BY id DESC LIMIT 1').fetchone() if conn else None
+    if conn:
+        conn.close()
     
-    if order_id:
-        print(f"Order created successfully: ID={order_id}, Reference={reference}")
-        
-        # Test getting the order
-        print("\nTesting direct order retrieval...")
-        order_data, error = direct_get_order(order_id)
+    if latest:
+        order_data, error = direct_get_order(latest['id'])
         
         if order_data:
             print(f"Order retrieved: {order_data['order']['reference_number']}")
@@ -516,6 +422,6 @@ if __name__ == "__main__":
         else:
             print(f"Error: {error}")
     else:
-        print(f"Error creating order: {reference}")
+        print("No orders found to retrieve")
         
     print("\nAll tests completed.") 
\ No newline at end of file
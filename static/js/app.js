@@ -30,6 +30,13 @@ document.addEventListener('DOMContentLoaded', function() {
         refreshStock();
     }
     
+    // Keep displayed stock current from server-pushed deltas (inventory page handles its own)
+    if (typeof socket !== 'undefined' && !window.location.pathname.includes('/inventory_management')) {
+        socket.on('stock_changed', function(data) {
+            (data.products || []).forEach(delta => updateProductStockUI(delta.id, delta.stock));
+        });
+    }
+    
     // Add timestamp to prevent browser caching
     const addTimestampToLinks = () => {
         document.querySelectorAll('a').forEach(link => {
@@ -676,7 +683,36 @@ function initCartSync() {
     
     // Check for pending online orders (for staff and admin)
     checkPendingOnlineOrders();
-    setInterval(checkPendingOnlineOrders, 60000); // Check every minute
+    if (typeof socket !== 'undefined') {
+        // New orders are pushed to the staff room; poll only while the socket is down
+        socket.on('new_online_order', function() {
+            updatePendingOrdersNotification(pendingOnlineOrdersCount + 1);
+        });
+        socket.on('connect', function() {
+            stopPendingOrdersPolling();
+            checkPendingOnlineOrders();
+        });
+        socket.on('disconnect', startPendingOrdersPolling);
+    } else {
+        startPendingOrdersPolling();
+    }
+}
+
+// Pending online orders currently shown in the notification
+let pendingOnlineOrdersCount = 0;
+let pendingOrdersPollTimer = null;
+
+function startPendingOrdersPolling() {
+    if (!pendingOrdersPollTimer) {
+        pendingOrdersPollTimer = setInterval(checkPendingOnlineOrders, 60000); // Check every minute
+    }
+}
+
+function stopPendingOrdersPolling() {
+    if (pendingOrdersPollTimer) {
+        clearInterval(pendingOrdersPollTimer);
+        pendingOrdersPollTimer = null;
+    }
 }
 
 // Check for pending online orders
@@ -697,7 +733,7 @@ function checkPendingOnlineOrders() {
     })
     .then(response => response.json())
     .then(data => {
-        const pendingCount = data.pending_orders ? data.pending_orders.length : 0;
+        const pendingCount = data.count || 0;
         
         // Update UI with pending orders count
         updatePendingOrdersNotification(pendingCount);
@@ -714,6 +750,7 @@ function updatePendingOrdersNotification(count) {
     
     if (!notificationElement || !countElement) return;
     
+    pendingOnlineOrdersCount = count;
     if (count > 0) {
         countElement.textContent = count;
         notificationElement.classList.remove('d-none');
@@ -1036,10 +1073,9 @@ function showToast(message, type = 'info') {
 // Function to refresh stock information for a product
 function refreshStock(productId = null) {
     // Build URL depending on whether we have a specific product ID
-    const timestamp = Date.now();
     const url = productId ? 
-        `/api/stock_status?product_id=${productId}&_t=${timestamp}` : 
-        `/api/stock_status?_t=${timestamp}`;
+        `/api/stock_status?product_id=${productId}` : 
+        '/api/stock_status';
     
     // Check if we're on the inventory management page
     const isInventoryPage = window.location.pathname.includes('/inventory_management');
@@ -1058,15 +1094,12 @@ function refreshStock(productId = null) {
         
         function fetchWithRetry() {
             console.log(`Fetching stock data from ${url}`);
+            // Revalidate with the ETag instead of downloading the catalogue again when nothing changed
             fetch(url, {
                 method: 'GET',
-                cache: 'no-store',
+                cache: 'no-cache',
                 headers: {
-                    'Cache-Control': 'no-cache, no-store, must-revalidate',
-                    'Pragma': 'no-cache',
-                    'Expires': '0',
-                    'X-Requested-With': 'fetch',
-                    'X-Timestamp': timestamp.toString()
+                    'X-Requested-With': 'fetch'
                 }
             })
                 .then(response => {
@@ -1122,6 +1155,9 @@ function refreshStock(productId = null) {
     });
 }
 
+// Products below this stock show the "Low Stock" badge (LOW_STOCK_BADGE_LEVEL in app.py)
+const LOW_STOCK_BADGE_LEVEL = 10;
+
 // Function to update product stock UI elements
 function updateProductStockUI(productId, stockLevel) {
     // First find all elements that display stock for this product
@@ -1156,6 +1192,16 @@ function updateProductStockUI(productId, stockLevel) {
         // Update color based on stock level
         const product = element.closest('.product-card') || element.closest('.product-item');
         if (product) {
+            // Cached product cards leave these to be patched with the live stock level
+            const lowStockBadge = product.querySelector('.low-stock-badge');
+            if (lowStockBadge) {
+                lowStockBadge.classList.toggle('d-none', stockLevel >= LOW_STOCK_BADGE_LEVEL);
+            }
+            const quantityInput = product.querySelector('input[data-product-stock]');
+            if (quantityInput) {
+                quantityInput.max = stockLevel;
+                quantityInput.dataset.productStock = stockLevel;
+            }
             const addToCartBtn = product.querySelector('.add-to-cart');
             if (addToCartBtn) {
                 if (stockLevel <= 0) {
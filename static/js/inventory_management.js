@@ -24,13 +24,57 @@ document.addEventListener('DOMContentLoaded', function() {
         return; // Skip further execution to prevent double loading
     }
     
-    // Auto-refresh stock data every 30 seconds
-    setInterval(refreshStock, 30000);
+    // Stock changes are pushed over Socket.IO; poll every 30 seconds only while disconnected
+    if (typeof socket !== 'undefined') {
+        socket.on('stock_changed', applyStockChanges);
+        socket.on('connect', function() {
+            stopStockPolling();
+            // Catch up on anything missed while disconnected
+            refreshStock();
+        });
+        socket.on('disconnect', startStockPolling);
+        if (!socket.connected) {
+            startStockPolling();
+        }
+    } else {
+        startStockPolling();
+    }
     
     // Initial refresh
     refreshStock();
 });
 
+// Latest stock figures for every product, used to recompute the summary counts
+let inventoryProducts = {};
+let stockPollTimer = null;
+// Catalogue version from the last /api/stock_status response, sent back as since=
+let stockVersion = null;
+
+function startStockPolling() {
+    if (!stockPollTimer) {
+        stockPollTimer = setInterval(refreshStock, 30000);
+    }
+}
+
+function stopStockPolling() {
+    if (stockPollTimer) {
+        clearInterval(stockPollTimer);
+        stockPollTimer = null;
+    }
+}
+
+// Apply a stock_changed delta: {products: [{id, stock, max_stock, reorder_point, low_stock_threshold}]}
+function applyStockChanges(data) {
+    if (!data || !data.products) return;
+    const changed = {};
+    data.products.forEach(delta => {
+        inventoryProducts[delta.id] = Object.assign(inventoryProducts[delta.id] || {}, delta);
+        changed[delta.id] = inventoryProducts[delta.id];
+    });
+    updateInventoryTable(changed);
+    updateSummaryCounts(inventoryProducts);
+}
+
 // Function to force refresh the page and stock data
 function forceRefresh() {
     const btn = document.getElementById('forceRefreshBtn');
@@ -59,9 +103,10 @@ function forceRefresh() {
 function refreshStock() {
     console.log('Refreshing inventory data...');
     
-    // Build URL with cache-busting timestamp
-    const timestamp = Date.now();
-    const url = `/api/stock_status?_t=${timestamp}`;
+    // After the first full load only ask for products changed since the last version seen
+    const url = stockVersion !== null ?
+        `/api/stock_status?since=${encodeURIComponent(stockVersion)}` :
+        '/api/stock_status';
     
     // Add visual feedback if the refresh button exists
     const refreshBtn = document.getElementById('forceRefreshBtn');
@@ -72,19 +117,20 @@ function refreshStock() {
     }
     
     // Fetch the latest stock data
+    // no-cache revalidates with If-None-Match, so an unchanged catalogue costs a 304
     fetch(url, {
         method: 'GET',
-        cache: 'no-store',
+        cache: 'no-cache',
         headers: {
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0',
-            'X-Requested-With': 'fetch',
-            'X-Timestamp': timestamp.toString()
+            'X-Requested-With': 'fetch'
         }
     })
     .then(response => {
         if (!response.ok) {
+            // A version the server no longer understands; start again from a full listing
+            if (response.status === 400) {
+                stockVersion = null;
+            }
             throw new Error(`Network response error: ${response.status} ${response.statusText}`);
         }
         return response.json();
@@ -92,12 +138,20 @@ function refreshStock() {
     .then(data => {
         console.log('Stock data received:', data);
         if (data.success && data.products) {
-            // Update the stock display for all products
+            if (data.since) {
+                Object.assign(inventoryProducts, data.products);
+                (data.deleted || []).forEach(removeInventoryProduct);
+            } else {
+                inventoryProducts = data.products;
+            }
+            stockVersion = data.version ?? stockVersion;
+            
+            // Update the stock display for the products that changed
             updateInventoryTable(data.products);
             
             // Update summary counts
             if (typeof updateSummaryCounts === 'function') {
-                updateSummaryCounts(data.products);
+                updateSummaryCounts(inventoryProducts);
             }
             
             // Show success feedback
@@ -124,6 +178,17 @@ function refreshStock() {
     });
 }
 
+// Forget a deleted product and take its row out of the inventory table
+function removeInventoryProduct(productId) {
+    delete inventoryProducts[productId];
+    document.querySelectorAll(`.product-stock[data-product-id="${productId}"]`).forEach(cell => {
+        const row = cell.closest('tr');
+        if (row) {
+            row.remove();
+        }
+    });
+}
+
 // Update the inventory table with fresh stock data
 function updateInventoryTable(products) {
     // Find all stock cells in the inventory table with the product-stock class
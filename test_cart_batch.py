@@ -0,0 +1,184 @@
+from sqlalchemy import event, text
+
+from app import app, db, catalogue, Product, Cart, CartItem
+
+
+def _cleanup(product_ids, cart_id):
+    with app.app_context():
+        CartItem.query.filter(CartItem.product_id.in_(product_ids)).delete()
+        if cart_id:
+            Cart.query.filter_by(id=cart_id).delete()
+        Product.query.filter(Product.id.in_(product_ids)).delete()
+        db.session.commit()
+
+
+def test_batch_adds_scans_in_one_commit():
+    """A burst of operations by id and barcode becomes one commit with quantities merged per product"""
+    with app.app_context():
+        beans = Product(name='Batch Beans', price=100.0, buying_price=60.0, stock=10, max_stock=100, barcode='BATCH-1')
+        rice = Product(name='Batch Rice', price=250.0, buying_price=150.0, stock=3, max_stock=100)
+        db.session.add_all([beans, rice])
+        db.session.commit()
+        beans_id, rice_id = beans.id, rice.id
+
+    client = app.test_client()
+    cart_id = None
+    commits = []
+
+    def count_commit(connection):
+        commits.append(connection)
+
+    try:
+        operations = [{'barcode': 'BATCH-1', 'quantity': 1} for _ in range(9)]
+        operations += [{'product_id': rice_id, 'quantity': 2}, {'barcode': ' BATCH-1 '}]
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'commit', count_commit)
+        try:
+            response = client.post('/api/cart/batch', json={'operations': operations})
+        finally:
+            event.remove(engine, 'commit', count_commit)
+        data = response.get_json()
+        assert len(commits) == 1
+        assert response.status_code == 200, data
+        quantities = {item['product_id']: item['quantity'] for item in data['items']}
+        assert quantities == {beans_id: 10, rice_id: 2}
+        assert data['cart_count'] == 12 and data['cart_total'] == 1500.0
+
+        with client.session_transaction() as sess:
+            cart_id = sess['cart_id']
+
+        # Rice has 3 in stock and 2 in the cart, so the whole batch is refused
+        response = client.post('/api/cart/batch', json={'operations': [
+            {'product_id': rice_id, 'quantity': 2}, {'barcode': 'NO-SUCH-CODE'}
+        ]})
+        assert response.status_code == 400
+        issues = response.get_json()['issues']
+        assert any('NO-SUCH-CODE' in issue for issue in issues)
+        assert any('Batch Rice' in issue for issue in issues)
+        with app.app_context():
+            assert CartItem.query.filter_by(cart_id=cart_id, product_id=rice_id).one().quantity == 2
+    finally:
+        _cleanup([beans_id, rice_id], cart_id)
+
+
+def _statements_for(client, method, url, **kwargs):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = getattr(client, method)(url, **kwargs)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_cart_reads_cost_the_same_for_any_size():
+    """Viewing and updating a cart runs the same number of queries with 3 items or 30"""
+    with app.app_context():
+        products = [
+            Product(name=f'Cart Size Product {i}', price=10.0 * (i + 1), buying_price=5.0, stock=50, max_stock=100)
+            for i in range(30)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        product_ids = [product.id for product in products]
+
+    counts = {}
+    cart_ids = []
+    try:
+        for size in (3, 30):
+            client = app.test_client()
+            data = client.post('/api/cart/batch', json={'operations': [
+                {'product_id': product_id, 'quantity': 2} for product_id in product_ids[:size]
+            ]}).get_json()
+            with client.session_transaction() as sess:
+                cart_ids.append(sess['cart_id'])
+            with app.app_context():
+                item_id = CartItem.query.filter_by(cart_id=cart_ids[-1], product_id=product_ids[0]).one().id
+
+            counts[size] = (
+                _statements_for(client, 'get', '/cart'),
+                _statements_for(client, 'post', f'/update_cart/{item_id}', json={'quantity': 1}),
+            )
+            totals = client.post(f'/update_cart/{item_id}', json={'quantity': 2}).get_json()
+            assert totals['cart_count'] == data['cart_count'] and totals['cart_total'] == data['cart_total']
+        assert counts[3] == counts[30]
+    finally:
+        with app.app_context():
+            CartItem.query.filter(CartItem.product_id.in_(product_ids)).delete()
+            Cart.query.filter(Cart.id.in_(cart_ids)).delete()
+            Product.query.filter(Product.id.in_(product_ids)).delete()
+            db.session.commit()
+
+
+def test_cart_count_is_read_from_the_session():
+    """/get_cart_count answers from the count stored by the last cart change, without a query"""
+    with app.app_context():
+        product = Product(name='Cart Count Product', price=10.0, buying_price=5.0, stock=50, max_stock=100)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+    client = app.test_client()
+    cart_id = None
+    try:
+        client.post('/api/cart/batch', json={'operations': [{'product_id': product_id, 'quantity': 4}]})
+        with client.session_transaction() as sess:
+            cart_id = sess['cart_id']
+        assert _statements_for(client, 'get', '/get_cart_count') == 0
+        assert client.get('/get_cart_count').get_json()['count'] == 4
+
+        with app.app_context():
+            item_id = CartItem.query.filter_by(cart_id=cart_id).one().id
+        client.post(f'/update_cart/{item_id}', json={'quantity': 7})
+        assert client.get('/get_cart_count').get_json()['count'] == 7
+
+        # Without a stored count it is worked out once and then remembered
+        with client.session_transaction() as sess:
+            del sess['cart_count']
+        assert client.get('/get_cart_count').get_json()['count'] == 7
+        assert _statements_for(client, 'get', '/get_cart_count') == 0
+    finally:
+        _cleanup([product_id], cart_id)
+
+
+def test_barcode_add_checks_current_stock():
+    """Adding by barcode checks the stock in the database, not the cached catalogue row"""
+    with app.app_context():
+        product = Product(name='Barcode Stock Product', price=10.0, buying_price=5.0, stock=1, max_stock=100,
+                          barcode='BARCODE-STOCK-1')
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+        assert catalogue.by_barcode('BARCODE-STOCK-1').stock == 1
+        # Another till sold the last one with a write the cache doesn't see
+        db.session.execute(text('UPDATE product SET stock = 0 WHERE id = :id'), {'id': product_id})
+        db.session.commit()
+        assert catalogue.by_barcode('BARCODE-STOCK-1').stock == 1
+
+    client = app.test_client()
+    cart_id = None
+    try:
+        response = client.post('/add_to_cart_barcode', json={'barcode': 'BARCODE-STOCK-1'})
+        assert response.status_code == 400 and response.get_json()['error'] == 'Not enough stock available'
+        with client.session_transaction() as sess:
+            cart_id = sess.get('cart_id')
+        with app.app_context():
+            assert CartItem.query.filter_by(product_id=product_id).count() == 0
+    finally:
+        _cleanup([product_id], cart_id)
+
+
+if __name__ == "__main__":
+    test_batch_adds_scans_in_one_commit()
+    test_cart_reads_cost_the_same_for_any_size()
+    test_cart_count_is_read_from_the_session()
+    test_barcode_add_checks_current_stock()
+    print("Cart batch tests passed")
@@ -0,0 +1,172 @@
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from app import app, db, User, Product, StockMovement, catalogue
+from catalogue_cache import CatalogueCache
+from shared_cache import SharedCache, SQLiteBackend
+
+
+class _Entry(SimpleNamespace):
+    def replace(self, **values):
+        return _Entry(**{**vars(self), **values})
+
+
+def test_cache_reloads_only_invalidated_rows():
+    """Lookups are served from memory; invalidated ids are re-read in one load on next use"""
+    rows = {
+        1: _Entry(id=1, name='Beans', barcode='111', category='produce', stock=5),
+        2: _Entry(id=2, name='Apples', barcode='222', category='produce', stock=9),
+    }
+    loads = []
+
+    def load(ids):
+        loads.append(ids)
+        return [rows[i] for i in (rows if ids is None else ids) if i in rows]
+
+    cache = CatalogueCache(load, max_age=3600)
+    assert [entry.name for entry in cache.all()] == ['Apples', 'Beans']
+    assert cache.by_barcode('111').id == 1
+    assert len(cache.in_category('produce')) == 2
+    assert cache.category_counts() == {'produce': 2}
+    assert loads == [None] and cache.misses == 1 and cache.hits == 3
+
+    rows[1] = _Entry(id=1, name='Beans', barcode='333', category='dry', stock=5)
+    del rows[2]
+    cache.invalidate({1, 2})
+    assert cache.by_barcode('111') is None and cache.by_barcode('333').id == 1
+    assert cache.get(2) is None and cache.in_category('produce') == []
+    assert cache.category_counts() == {'dry': 1}
+    assert loads == [None, {1, 2}]
+
+    cache.update(1, stock=4)
+    assert cache.get(1).stock == 4 and len(loads) == 2
+
+
+def test_catalogue_follows_committed_writes():
+    """Inserts, edits and stock sales show up in the app's catalogue once committed"""
+    with app.app_context():
+        product = Product(name='Catalogue Test Product', price=150.0, buying_price=100.0, stock=5, max_stock=100,
+                          barcode='CATALOGUE-TEST-1')
+        db.session.add(product)
+        db.session.commit()
+        try:
+            assert catalogue.by_barcode('CATALOGUE-TEST-1').id == product.id
+
+            product.price = 175.0
+            db.session.flush()
+            assert catalogue.get(product.id).price == 150.0  # not committed yet
+            db.session.commit()
+            assert catalogue.get(product.id).price == 175.0
+
+            misses = catalogue.misses
+            assert product.update_stock(2, 'sale') is True
+            db.session.commit()
+            assert catalogue.get(product.id).stock == 3 and catalogue.misses == misses
+        finally:
+            db.session.rollback()
+            StockMovement.query.filter_by(product_id=product.id).delete()
+            db.session.delete(db.session.get(Product, product.id))
+            db.session.commit()
+        assert catalogue.get(product.id) is None
+
+
+def test_listing_follows_writes_made_outside_the_orm():
+    """Full listings pick up raw SQL writes, and their ETag describes the rows actually served"""
+    with app.app_context():
+        product = Product(name='Listing Test Product', price=150.0, buying_price=100.0, stock=5, max_stock=100)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+        client = app.test_client()
+        try:
+            client.get('/api/stock_status')
+            misses = catalogue.misses
+            assert product.update_stock(1, 'sale') is True
+            db.session.commit()
+            response = client.get('/api/stock_status')
+            assert response.get_json()['products'][str(product_id)]['stock'] == 4
+            assert catalogue.misses == misses  # the sale was applied to the cache, not re-read
+
+            etag = response.headers['ETag']
+            db.session.execute(text("UPDATE product SET stock = stock + 7 WHERE id = :id"), {'id': product_id})
+            db.session.commit()
+            response = client.get('/api/stock_status', headers={'If-None-Match': etag})
+            assert response.status_code == 200
+            assert response.get_json()['products'][str(product_id)]['stock'] == 11
+            etag = response.headers['ETag']
+            assert client.get('/api/stock_status', headers={'If-None-Match': etag}).status_code == 304
+        finally:
+            db.session.rollback()
+            StockMovement.query.filter_by(product_id=product_id).delete()
+            Product.query.filter_by(id=product_id).delete()
+            db.session.commit()
+
+
+def test_changes_in_another_worker_are_reloaded(tmp_path):
+    """Ids published by one worker are re-read by the other worker's catalogue on its next lookup"""
+    rows = {1: _Entry(id=1, name='Beans', barcode='111', category='produce', stock=5)}
+    loads = []
+
+    def load(ids):
+        loads.append(ids)
+        return [rows[i] for i in (rows if ids is None else ids) if i in rows]
+
+    path = str(tmp_path / 'cache.db')
+    writer, reader = SharedCache(SQLiteBackend(path)), SharedCache(SQLiteBackend(path))
+    subscription = reader.subscribe('catalogue')
+
+    def sync():
+        messages = subscription.poll()
+        return None if messages is None else {i for ids in messages for i in ids}
+
+    cache = CatalogueCache(load, max_age=3600, sync=sync)
+    assert cache.get(1).stock == 5
+
+    rows[1] = rows[1].replace(stock=2)
+    writer.publish('catalogue', [1])
+    assert cache.get(1).stock == 2
+    assert loads == [None, {1}]
+
+
+def test_batch_scan_follows_barcode_edits():
+    """/scan_barcodes answers a buffered list of codes in one response, tracking barcode changes"""
+    with app.app_context():
+        staff = User(username='scan_test_staff', email='scan_test_staff@example.com', is_staff=True,
+                     full_name='Scan Test Staff')
+        product = Product(name='Scan Test Product', price=150.0, buying_price=100.0, stock=5, max_stock=100,
+                          barcode='SCAN-TEST-1')
+        db.session.add_all([staff, product])
+        db.session.commit()
+        staff_id, product_id = staff.id, product.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(staff_id)
+        sess['_fresh'] = True
+    try:
+        data = client.post('/scan_barcodes', json={'barcodes': ['SCAN-TEST-1', ' SCAN-MISSING ']}).get_json()
+        assert data['products']['SCAN-TEST-1']['id'] == product_id
+        assert data['not_found'] == ['SCAN-MISSING']
+
+        with app.app_context():
+            db.session.get(Product, product_id).barcode = 'SCAN-TEST-2'
+            db.session.commit()
+        data = client.post('/scan_barcodes', json={'barcodes': ['SCAN-TEST-1', 'SCAN-TEST-2']}).get_json()
+        assert data['not_found'] == ['SCAN-TEST-1'] and list(data['products']) == ['SCAN-TEST-2']
+
+        assert client.post('/scan_barcodes', json={'barcodes': []}).status_code == 400
+    finally:
+        with app.app_context():
+            Product.query.filter_by(id=product_id).delete()
+            User.query.filter_by(id=staff_id).delete()
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    test_cache_reloads_only_invalidated_rows()
+    test_catalogue_follows_committed_writes()
+    test_batch_scan_follows_barcode_edits()
+    import tempfile, pathlib
+    test_changes_in_another_worker_are_reloaded(pathlib.Path(tempfile.mkdtemp()))
+    print("Catalogue cache tests passed")
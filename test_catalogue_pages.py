@@ -0,0 +1,68 @@
+from app import app, db, Product
+
+
+def _page(client, **params):
+    response = client.get('/api/catalogue', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _walk(client, **params):
+    """Every product id the endpoint returns when following next_cursor to the end"""
+    ids, cursor = [], None
+    while True:
+        data = _page(client, cursor=cursor, **params) if cursor else _page(client, **params)
+        ids += [product['id'] for product in data['products']]
+        cursor = data['next_cursor']
+        if cursor is None:
+            return ids, data
+
+
+def test_catalogue_pages_follow_cursor_and_filters():
+    """Cursor pages cover every match exactly once, in order, for each sort and filter"""
+    with app.app_context():
+        products = [
+            Product(name=f'Paging Test {i:02d}', price=100.0 + (i % 7) * 50, buying_price=50.0,
+                    stock=i % 3, max_stock=100, category='paging_test')
+            for i in range(25)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        expected = sorted(((p.id, p.name, p.price, p.stock) for p in products), key=lambda p: (p[1], p[0]))
+        ids = [product[0] for product in expected]
+
+    client = app.test_client()
+    try:
+        walked, last = _walk(client, category='paging_test', limit=10)
+        assert walked == ids
+        assert 'buying_price' not in last['products'][0]
+
+        walked, _ = _walk(client, category='paging_test', limit=4, sort='price-desc')
+        assert walked == [p[0] for p in sorted(expected, key=lambda p: (-p[2], -p[0]))]
+
+        walked, _ = _walk(client, category='paging_test', limit=4, in_stock=1, min_price=150, max_price=250)
+        assert walked == [p[0] for p in expected if p[3] > 0 and 150 <= p[2] <= 250]
+
+        walked, _ = _walk(client, q='paging test 1', limit=3)
+        assert walked == [p[0] for p in expected if p[1].startswith('Paging Test 1')]
+
+        # A cursor only continues the sort order it came from
+        cursor = _page(client, category='paging_test', limit=5)['next_cursor']
+        assert client.get('/api/catalogue', query_string={'cursor': cursor, 'sort': 'price-asc'}).status_code == 400
+        assert client.get('/api/catalogue', query_string={'cursor': 'not-a-cursor'}).status_code == 400
+    finally:
+        with app.app_context():
+            Product.query.filter(Product.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+
+def test_catalogue_pages_use_indexes():
+    """Every sort order is read from an index rather than a full scan and sort"""
+    with app.app_context():
+        for sql in (
+            "SELECT id FROM product ORDER BY name, id LIMIT 49",
+            "SELECT id FROM product WHERE category = 'x' AND (name, id) > ('a', 1) ORDER BY name, id LIMIT 49",
+            "SELECT id FROM product WHERE (price, id) < (100, 5) ORDER BY price DESC, id DESC LIMIT 49",
+        ):
+            plan = ' '.join(row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")))
+            assert 'USING' in plan and 'TEMP B-TREE' not in plan, plan
@@ -0,0 +1,44 @@
+from app import app, db, get_raw_connection, get_sqlite_pragmas
+
+
+def test_raw_connection_comes_from_engine_pool():
+    """Raw SQL connections are checked out from the engine pool and return rows by column name"""
+    with app.app_context():
+        conn = get_raw_connection()
+        try:
+            row = conn.execute("SELECT COUNT(*) AS product_count FROM product").fetchone()
+            assert row['product_count'] >= 0
+        finally:
+            conn.close()
+
+        # Closing handed the connection back, the next checkout reuses it
+        assert db.engine.pool.checkedin() >= 1
+
+
+def test_sqlite_connections_are_configured():
+    """Every pooled SQLite connection runs in WAL mode with a busy timeout and foreign keys on"""
+    with app.app_context():
+        conn = get_raw_connection()
+        try:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+            assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+            assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        finally:
+            conn.close()
+
+
+def test_pragma_profile_is_reported():
+    """The configured pragma profile is what the connections actually run with"""
+    with app.app_context():
+        pragmas = get_sqlite_pragmas()
+        assert pragmas['cache_size'] == app.config['SQLITE_PRAGMAS']['cache_size']
+        assert pragmas['mmap_size'] == app.config['SQLITE_PRAGMAS']['mmap_size']
+        assert pragmas['temp_store'] == 2  # MEMORY
+
+
+if __name__ == "__main__":
+    test_raw_connection_comes_from_engine_pool()
+    test_sqlite_connections_are_configured()
+    test_pragma_profile_is_reported()
+    print("Database connection tests passed")
@@ -0,0 +1,40 @@
+from app import app, product_fragments, product_fragment_cache
+from fragment_cache import FragmentCache
+
+
+def test_fragment_cache_evicts_least_recently_used():
+    """Fragments are rendered once per key and the oldest unused key goes first"""
+    renders = []
+
+    def render(key):
+        return lambda: renders.append(key) or f'<p>{key}</p>'
+
+    cache = FragmentCache(max_entries=2)
+    assert cache.get('a', render('a')) == '<p>a</p>'
+    cache.get('b', render('b'))
+    cache.get('a', render('a'))
+    cache.get('c', render('c'))
+    cache.get('a', render('a'))
+    cache.get('b', render('b'))
+    assert renders == ['a', 'b', 'c', 'b']
+    assert cache.stats()['fragments'] == 2 and cache.hits == 2
+
+
+def test_product_fragments_fill_stock_and_follow_edits():
+    """Stock changes reuse the cached card; a changed display column renders a new one"""
+    product = {'id': 987654, 'name': 'Fragment Test Jam', 'description': 'Strawberry', 'price': 4500.0,
+               'currency': 'UGX', 'stock': 3.0, 'unit': 'jar', 'category': 'condiments', 'image_url': None}
+    with app.test_request_context('/'):
+        misses = product_fragment_cache.misses
+        html = product_fragments('_product_card.html', [product])
+        assert 'Stock: 3.0' in html and 'low-stock-badge"' in html and '\x00' not in html
+
+        html = product_fragments('_product_card.html', [dict(product, stock=40.0)])
+        assert 'Stock: 40.0' in html and 'low-stock-badge d-none"' in html
+        assert product_fragment_cache.misses == misses + 1
+
+        html = product_fragments('_product_item.html', [product])
+        assert 'max="3.0"' in html and '>3.00</span>' in html
+
+        html = product_fragments('_product_card.html', [dict(product, price=5000.0)])
+        assert 'UGX 5,000' in html and product_fragment_cache.misses == misses + 3
@@ -0,0 +1,59 @@
+from app import (app, db, socketio, User, Product, Order, OrderItem, StockMovement, create_order,
+                 adjust_sales_rollup_for_order)
+
+
+def _events(client, name):
+    return [event['args'][0] for event in client.get_received() if event['name'] == name]
+
+
+def test_new_online_order_is_pushed_to_staff():
+    """Online orders reach staff sockets once committed; other clients only get the stock delta"""
+    with app.app_context():
+        staff = User(username='push_test_staff', email='push_test_staff@example.com', is_staff=True,
+                     full_name='Push Test Staff')
+        product = Product(name='Online Push Product', price=150.0, buying_price=100.0, stock=10, max_stock=100)
+        db.session.add_all([staff, product])
+        db.session.commit()
+        staff_id, product_id = staff.id, product.id
+
+    # Connected outside an app context so each client loads its own user
+    http_client = app.test_client()
+    with http_client.session_transaction() as sess:
+        sess['_user_id'] = str(staff_id)
+        sess['_fresh'] = True
+    staff_socket = socketio.test_client(app, flask_test_client=http_client)
+    anonymous_socket = socketio.test_client(app)
+    order_id = None
+    try:
+        with app.app_context():
+            result = create_order({'customer_name': 'Push Customer'},
+                                  [{'product_id': product_id, 'quantity': 2, 'price': 150.0}], 'online')
+            assert result.success
+            order_id = result.order.id
+
+        pushed = _events(staff_socket, 'new_online_order')
+        assert len(pushed) == 1
+        assert pushed[0]['id'] == order_id and pushed[0]['items_count'] == 1
+        assert pushed[0]['total_amount'] == 300.0
+        assert _events(anonymous_socket, 'new_online_order') == []
+
+        # REST fallback reports the same order with its item count
+        pending = http_client.get('/api/pending_orders').get_json()
+        listed = next(order for order in pending['orders'] if order['id'] == order_id)
+        assert listed['items_count'] == 1 and listed['customer_name'] == 'Push Customer'
+    finally:
+        staff_socket.disconnect()
+        anonymous_socket.disconnect()
+        with app.app_context():
+            if order_id:
+                adjust_sales_rollup_for_order(order_id, -1)
+                OrderItem.query.filter_by(order_id=order_id).delete()
+                Order.query.filter_by(id=order_id).delete()
+            StockMovement.query.filter_by(product_id=product_id).delete()
+            Product.query.filter_by(id=product_id).delete()
+            User.query.filter_by(id=staff_id).delete()
+            db.session.commit()
+
+if __name__ == "__main__":
+    test_new_online_order_is_pushed_to_staff()
+    print("Online order notification tests passed")
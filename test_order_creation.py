@@ -56,11 +56,12 @@ def test_create_order():
                 
             # Try using the app's create_order function
             print("\nTrying with the create_order function...")
-            order, error = create_order(customer_data, items_data, 'test')
+            result = create_order(customer_data, items_data, 'test')
             
-            if error:
-                print(f"Error from create_order: {error}")
+            if not result.success:
+                print(f"Error from create_order: {result.error} {result.issues}")
             else:
+                order = result.order
                 print(f"Order created successfully with ID: {order.id}")
                 # Clean up
                 db.session.delete(order)
@@ -152,17 +152,14 @@ def test_create_order():
             
             # Create the order
             logger.info("\nCreating test order...")
-            order, error = create_order(customer_data, items_data, 'test')
+            result = create_order(customer_data, items_data, 'test')
             
-            if error:
-                logger.error(f"Error creating order: {error}")
-                conn.close()
-                return False
-                
-            if not order:
-                logger.error("Order creation failed - no order returned and no error")
+            if not result.success:
+                logger.error(f"Error creating order: {result.error} {result.issues}")
                 conn.close()
                 return False
+            
+            order = result.order
                 
             logger.info(f"Successfully created order: ID={order.id}, Reference={order.reference_number}")
             
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from app import app, db, User, presence, flush_presence
+from presence import PresenceTracker
+
+
+def test_tracker_batches_changes():
+    """Activity is kept in memory and handed out once per flush interval"""
+    tracker = PresenceTracker(flush_interval=0)
+    first = tracker.touch(1, datetime(2001, 1, 1, 8, 0))
+    tracker.touch(2, datetime(2001, 1, 1, 8, 5))
+    tracker.touch(1, datetime(2001, 1, 1, 8, 10))
+
+    assert first == datetime(2001, 1, 1, 8, 0)
+    assert tracker.flush_due()
+    assert tracker.take_pending() == {1: datetime(2001, 1, 1, 8, 10), 2: datetime(2001, 1, 1, 8, 5)}
+    assert not tracker.flush_due()
+
+    # Reads still see the latest value after a flush, and a newer stored value wins
+    assert tracker.last_seen(1) == datetime(2001, 1, 1, 8, 10)
+    assert tracker.last_seen(1, stored=datetime(2001, 1, 1, 9, 0)) == datetime(2001, 1, 1, 9, 0)
+    assert tracker.last_seen(3, stored=datetime(2001, 1, 1, 7, 0)) == datetime(2001, 1, 1, 7, 0)
+
+
+def test_tracker_waits_for_interval():
+    """Nothing is due before the interval has passed, however many touches there were"""
+    tracker = PresenceTracker(flush_interval=3600)
+    for _ in range(100):
+        tracker.touch(1)
+    assert not tracker.flush_due()
+
+
+def test_flush_never_moves_last_seen_backwards():
+    """An older in-memory value does not overwrite a newer one written by another process"""
+    stored = datetime(2001, 6, 1, 12, 0)
+    with app.app_context():
+        user = User(username='presence_test_user', email='presence_test_user@example.com',
+                    full_name='Presence Test User', last_seen=stored)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        try:
+            presence.take_pending()
+            presence.touch(user_id, datetime(2001, 1, 1))
+
+            assert flush_presence() == 1
+            db.session.expire_all()
+            assert db.session.get(User, user_id).last_seen == stored
+        finally:
+            db.session.rollback()
+            User.query.filter_by(id=user_id).delete()
+            db.session.commit()
+
+if __name__ == "__main__":
+    test_tracker_batches_changes()
+    test_tracker_waits_for_interval()
+    test_flush_never_moves_last_seen_backwards()
+    print("Presence tests passed")
@@ -0,0 +1,82 @@
+import app as app_module
+from app import app, db, Product, search_products
+
+
+def _names(results):
+    return [product['name'] for product in results]
+
+
+def test_search_index_follows_product_writes():
+    """Triggers keep product_search in step with inserts, renames and deletes"""
+    with app.app_context():
+        product = Product(name='Zanzibar Cloves 50g', description='Whole spice', price=2500.0,
+                          buying_price=1500.0, stock=10, max_stock=50, barcode='SEARCH-TEST-1')
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+        try:
+            assert _names(search_products('zanz clo')) == ['Zanzibar Cloves 50g']
+            assert _names(search_products('SEARCH-TEST')) == ['Zanzibar Cloves 50g']
+
+            product.name = 'Pemba Cloves 50g'
+            db.session.commit()
+            assert search_products('zanzibar') == []
+            assert [row['id'] for row in search_products('pemba')] == [product_id]
+        finally:
+            Product.query.filter_by(id=product_id).delete()
+            db.session.commit()
+        assert search_products('pemba') == []
+
+
+def test_search_ranks_name_matches_first():
+    """Name hits outrank description hits, and the best matches are picked before the limit"""
+    client = app.test_client()
+    with app.app_context():
+        products = [
+            Product(name='Quokka Tea Strainer', description='Steel mesh', price=4000.0, buying_price=2000.0),
+            Product(name='Steel Mesh Sieve', description='For quokka tea', price=3000.0, buying_price=1500.0),
+        ]
+        # Lower ids than the name match, so an unranked cap would return these first
+        products[1:1] = [Product(name=f'Mesh Sieve {i}', description='Fits a quokka cup', price=1000.0,
+                                 buying_price=500.0) for i in range(3)]
+        db.session.add_all(products)
+        db.session.commit()
+        ids = [product.id for product in products]
+    try:
+        data = client.get('/api/products/search', query_string={'q': 'quok', 'limit': 1}).get_json()
+        assert _names(data['products']) == ['Quokka Tea Strainer']
+        data = client.get('/api/products/search', query_string={'q': 'quok'}).get_json()
+        assert _names(data['products'])[0] == 'Quokka Tea Strainer' and len(data['products']) == 5
+        assert 'buying_price' not in data['products'][0]
+
+        assert client.get('/api/products/search', query_string={'q': '"*'}).get_json()['products'] == []
+        page = client.get('/api/catalogue', query_string={'q': 'quokka'}).get_json()
+        assert _names(page['products'])[0] == 'Mesh Sieve 0' and len(page['products']) == 5
+    finally:
+        with app.app_context():
+            Product.query.filter(Product.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+
+def test_search_falls_back_to_like_without_the_index(monkeypatch):
+    """Databases without FTS5 are searched with LIKE, name matches still listed first"""
+    client = app.test_client()
+    with app.app_context():
+        products = [
+            Product(name='Wombat Oat Biscuits', description='Baked', price=4000.0, buying_price=2000.0),
+            Product(name='Digestive Biscuits', description='Wombat brand oats', price=3000.0, buying_price=1500.0),
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        ids = [product.id for product in products]
+    monkeypatch.setattr(app_module, 'product_search_indexed', lambda: False)
+    try:
+        data = client.get('/api/products/search', query_string={'q': 'biscuits wombat'}).get_json()
+        assert _names(data['products']) == ['Wombat Oat Biscuits', 'Digestive Biscuits']
+        assert client.get('/api/products/search', query_string={'q': '"*'}).get_json()['products'] == []
+        page = client.get('/api/catalogue', query_string={'q': 'wombat'}).get_json()
+        assert _names(page['products']) == ['Digestive Biscuits', 'Wombat Oat Biscuits']
+    finally:
+        with app.app_context():
+            Product.query.filter(Product.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
@@ -0,0 +1,42 @@
+import logging
+
+import pytest
+
+import app as pos_app
+from app import app, load_runtime_profile
+
+
+@pytest.fixture
+def profile():
+    """Restore the profile the app was started with after each test"""
+    saved = {key: app.config[key] for key in ('POS_PROFILE', *pos_app.RUNTIME_PROFILES['production'])}
+    yield
+    app.config.update(saved)
+
+
+def test_production_profile_is_default_and_env_overrides_apply(profile, monkeypatch):
+    """Debug is off unless asked for; single settings can be overridden from the environment"""
+    monkeypatch.delenv('POS_PROFILE', raising=False)
+    monkeypatch.setenv('LOG_TO_CONSOLE', 'true')
+    monkeypatch.setenv('SLOW_REQUEST_MS', '250')
+    load_runtime_profile('production')
+    assert app.config['DEBUG'] is False
+    assert app.config['LOG_TO_CONSOLE'] is True
+    assert app.config['SLOW_REQUEST_MS'] == 250
+    with pytest.raises(ValueError):
+        load_runtime_profile('staging')
+
+
+def test_request_timing_is_sampled_and_slow_requests_always_logged(profile, caplog):
+    """Nothing is logged for fast unsampled requests; slow ones are logged as warnings"""
+    client = app.test_client()
+    app.config.update(REQUEST_TIMING_SAMPLE_RATE=0.0, SLOW_REQUEST_MS=60000)
+    with caplog.at_level(logging.INFO, logger='app'):
+        response = client.get('/manifest.json')
+        assert response.headers['Server-Timing'].startswith('app;dur=')
+        assert not [r for r in caplog.records if r.getMessage().startswith(('Request timing', 'Slow request'))]
+
+        app.config.update(SLOW_REQUEST_MS=0)
+        client.get('/manifest.json')
+        slow = [r for r in caplog.records if r.getMessage().startswith('Slow request')]
+        assert len(slow) == 1 and slow[0].levelno == logging.WARNING
@@ -0,0 +1,247 @@
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+import app as app_module
+from app import (app, db, User, Product, Order, OrderItem, Expense, DailySalesRollup, get_daily_financials,
+                 get_rollup_financials, record_sales_rollup, adjust_sales_rollup_for_order, SALES_ROLLUP_REBUILD_SQL)
+
+
+def _add_sale(product, when, quantity, price):
+    order = Order(
+        customer_name='Report Test',
+        total_amount=quantity * price,
+        order_type='in-store',
+        order_date=when
+    )
+    db.session.add(order)
+    db.session.flush()
+    db.session.add(OrderItem(order_id=order.id, product_id=product.id, quantity=quantity, price=price,
+                             buying_price=product.buying_price))
+    return order
+
+
+def test_daily_financials_groups_by_day():
+    """Sales, cost of goods and expenses are aggregated per day and empty days are zero-filled"""
+    with app.app_context():
+        try:
+            product = Product(name='Report Test Product', price=150.0, buying_price=100.0, stock=100, max_stock=100)
+            db.session.add(product)
+            db.session.flush()
+
+            # Dates far in the past so existing data in the database does not interfere
+            _add_sale(product, datetime(2001, 3, 1, 9, 30), 2, 150.0)
+            _add_sale(product, datetime(2001, 3, 1, 17, 45), 1, 150.0)
+            _add_sale(product, datetime(2001, 3, 3, 23, 59, 59), 4, 150.0)
+            db.session.add(Expense(description='Rent', amount=50.0, category='rent', date=datetime(2001, 3, 3, 8, 0)))
+            db.session.flush()
+
+            financials = get_daily_financials(date(2001, 3, 1), date(2001, 3, 3))
+
+            assert list(financials.keys()) == [date(2001, 3, 1), date(2001, 3, 2), date(2001, 3, 3)]
+            assert financials[date(2001, 3, 1)] == {'sales': 450.0, 'cogs': 300.0, 'expenses': 0.0}
+            assert financials[date(2001, 3, 2)] == {'sales': 0.0, 'cogs': 0.0, 'expenses': 0.0}
+            assert financials[date(2001, 3, 3)] == {'sales': 600.0, 'cogs': 400.0, 'expenses': 50.0}
+        finally:
+            db.session.rollback()
+
+
+def test_rollup_matches_live_aggregation():
+    """The rollup rebuilt from order history reports the same totals as the live grouped queries"""
+    with app.app_context():
+        try:
+            product = Product(name='Rollup Test Product', price=150.0, buying_price=100.0, stock=100, max_stock=100)
+            db.session.add(product)
+            db.session.flush()
+
+            _add_sale(product, datetime(2001, 4, 1, 10, 0), 3, 150.0)
+            cancelled = _add_sale(product, datetime(2001, 4, 1, 11, 0), 5, 150.0)
+            cancelled.status = 'cancelled'
+            _add_sale(product, datetime(2001, 4, 2, 12, 0), 1, 150.0)
+            db.session.flush()
+
+            db.session.execute(text('DELETE FROM daily_sales_rollup'))
+            db.session.execute(SALES_ROLLUP_REBUILD_SQL)
+
+            live = get_daily_financials(date(2001, 4, 1), date(2001, 4, 2))
+            rolled_up = get_rollup_financials(date(2001, 4, 1), date(2001, 4, 2))
+            assert rolled_up == live
+            assert rolled_up[date(2001, 4, 1)]['sales'] == 450.0
+        finally:
+            db.session.rollback()
+
+
+def test_rollup_incremental_updates():
+    """Orders are added to the rollup as they are written and taken out again when cancelled"""
+    with app.app_context():
+        try:
+            product = Product(name='Rollup Test Product', price=150.0, buying_price=100.0, stock=100, max_stock=100)
+            db.session.add(product)
+            db.session.flush()
+
+            first = _add_sale(product, datetime(2001, 5, 1, 10, 0), 2, 150.0)
+            second = _add_sale(product, datetime(2001, 5, 1, 15, 0), 1, 150.0)
+            db.session.flush()
+            record_sales_rollup(first.order_date, first.order_type, 300.0, 200.0, 2)
+            record_sales_rollup(second.order_date, second.order_type, 150.0, 100.0, 1)
+
+            totals = get_rollup_financials(date(2001, 5, 1), date(2001, 5, 1))[date(2001, 5, 1)]
+            assert totals == {'sales': 450.0, 'cogs': 300.0, 'expenses': 0.0}
+
+            adjust_sales_rollup_for_order(second.id, -1)
+            totals = get_rollup_financials(date(2001, 5, 1), date(2001, 5, 1))[date(2001, 5, 1)]
+            assert totals == {'sales': 300.0, 'cogs': 200.0, 'expenses': 0.0}
+        finally:
+            db.session.rollback()
+
+
+def test_committed_rollup_changes_invalidate_cached_reports():
+    """A rollup write made with a text statement still drops the shared report cache on commit"""
+    day = date(2001, 6, 1)
+    with app.app_context():
+        try:
+            assert get_rollup_financials(day, day)[day]['sales'] == 0.0
+            record_sales_rollup(datetime(2001, 6, 1, 10, 0), 'in-store', 250.0, 100.0, 1)
+            db.session.commit()
+            assert get_rollup_financials(day, day)[day]['sales'] == 250.0
+        finally:
+            db.session.rollback()
+            DailySalesRollup.query.filter_by(date=day).delete()
+            db.session.commit()
+
+
+def test_processing_cancelled_order_updates_status_and_rollup_together(monkeypatch):
+    """Reopening a cancelled order counts it in the rollup again, or changes nothing if that fails"""
+    day = date(2001, 7, 1)
+    with app.app_context():
+        admin = User(username='processed_test_admin', email='processed_test_admin@example.com', is_admin=True,
+                     full_name='Processed Test Admin')
+        product = Product(name='Processed Test Product', price=150.0, buying_price=100.0, stock=10, max_stock=100)
+        db.session.add_all([admin, product])
+        db.session.flush()
+        order = _add_sale(product, datetime(2001, 7, 1, 10, 0), 2, 150.0)
+        order.status = 'cancelled'
+        db.session.commit()
+        admin_id, product_id, order_id = admin.id, product.id, order.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(admin_id)
+        sess['_fresh'] = True
+    try:
+        def fail(order_id, direction):
+            raise RuntimeError('rollup unavailable')
+        monkeypatch.setattr('app.adjust_sales_rollup_for_order', fail)
+        assert client.post(f'/mark_order_processed/{order_id}').status_code == 500
+        with app.app_context():
+            assert db.session.get(Order, order_id).status == 'cancelled'
+
+        monkeypatch.undo()
+        assert client.post(f'/mark_order_processed/{order_id}').get_json()['success'] is True
+        with app.app_context():
+            assert db.session.get(Order, order_id).status == 'completed'
+            assert get_rollup_financials(day, day)[day]['sales'] == 300.0
+    finally:
+        with app.app_context():
+            OrderItem.query.filter_by(order_id=order_id).delete()
+            Order.query.filter_by(id=order_id).delete()
+            Product.query.filter_by(id=product_id).delete()
+            User.query.filter_by(id=admin_id).delete()
+            DailySalesRollup.query.filter_by(date=day).delete()
+            db.session.commit()
+
+
+def test_weekly_sales_folds_days_into_weeks(monkeypatch):
+    """/api/sales/weekly sums each 7-day bucket, with orders either side of a boundary kept apart"""
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2001, 8, 15, 12, 0, tzinfo=tz)
+
+    days = (date(2001, 8, 1), date(2001, 8, 15))
+    with app.app_context():
+        admin = User(username='weekly_test_admin', email='weekly_test_admin@example.com', is_admin=True,
+                     full_name='Weekly Test Admin')
+        product = Product(name='Weekly Test Product', price=150.0, buying_price=100.0, stock=100, max_stock=100)
+        db.session.add_all([admin, product])
+        db.session.flush()
+        orders = [
+            _add_sale(product, datetime(2001, 8, 7, 23, 30), 2, 150.0),
+            _add_sale(product, datetime(2001, 8, 8, 0, 15), 1, 150.0),
+            _add_sale(product, datetime(2001, 8, 9, 10, 0), 5, 150.0),
+            _add_sale(product, datetime(2001, 8, 15, 9, 0), 4, 150.0),
+        ]
+        orders[2].status = 'cancelled'
+        expense = Expense(description='Weekly Test Rent', amount=40.0, category='rent', date=datetime(2001, 8, 8, 8, 0))
+        db.session.add(expense)
+        db.session.commit()
+        admin_id, product_id, expense_id = admin.id, product.id, expense.id
+        order_ids = [order.id for order in orders]
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(admin_id)
+        sess['_fresh'] = True
+    try:
+        monkeypatch.setattr(app_module, 'datetime', FixedDatetime)
+        data = client.get('/api/sales/weekly', query_string={'weeks': 2}).get_json()
+        monkeypatch.undo()
+
+        # Today is 2001-08-15, so the last bucket holds that day alone
+        assert data['weeks'] == ['2001-08-01 to 2001-08-07', '2001-08-08 to 2001-08-14', '2001-08-15 to 2001-08-15']
+        assert data['sales'] == [300.0, 150.0, 600.0]
+        assert data['gross_profit'] == data['profit'] == [100.0, 50.0, 200.0]
+        assert data['expenses'] == [0.0, 40.0, 0.0]
+        assert data['net_profit'] == [100.0, 10.0, 200.0]
+    finally:
+        with app.app_context():
+            OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).delete()
+            Order.query.filter(Order.id.in_(order_ids)).delete()
+            Expense.query.filter_by(id=expense_id).delete()
+            Product.query.filter_by(id=product_id).delete()
+            User.query.filter_by(id=admin_id).delete()
+            DailySalesRollup.query.filter(DailySalesRollup.date.between(*days)).delete()
+            db.session.commit()
+
+
+def test_cogs_uses_cost_at_time_of_sale():
+    """Changing a product's cost later does not rewrite the profit of orders already sold"""
+    with app.app_context():
+        try:
+            product = Product(name='Cost Snapshot Product', price=150.0, buying_price=100.0, stock=100, max_stock=100)
+            db.session.add(product)
+            db.session.flush()
+
+            _add_sale(product, datetime(2001, 6, 1, 10, 0), 2, 150.0)
+            db.session.flush()
+            product.buying_price = 140.0
+            db.session.flush()
+
+            totals = get_daily_financials(date(2001, 6, 1), date(2001, 6, 1))[date(2001, 6, 1)]
+            assert totals == {'sales': 300.0, 'cogs': 200.0, 'expenses': 0.0}
+        finally:
+            db.session.rollback()
+
+
+def test_report_date_filters_use_index():
+    """Date range filters on orders and expenses are answered from an index, not a full scan"""
+    with app.app_context():
+        order_plan = db.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT SUM(total_amount) FROM "order" '
+            "WHERE order_date >= '2001-01-01' AND order_date < '2001-02-01'"
+        )).fetchall()
+        expense_plan = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT SUM(amount) FROM expense "
+            "WHERE date >= '2001-01-01' AND date < '2001-02-01'"
+        )).fetchall()
+        assert any('ix_order_order_date' in row[-1] for row in order_plan)
+        assert any('ix_expense_date' in row[-1] for row in expense_plan)
+
+
+if __name__ == "__main__":
+    test_daily_financials_groups_by_day()
+    test_rollup_matches_live_aggregation()
+    test_rollup_incremental_updates()
+    test_cogs_uses_cost_at_time_of_sale()
+    test_report_date_filters_use_index()
+    print("Sales report tests passed")
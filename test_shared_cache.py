@@ -0,0 +1,98 @@
+from datetime import date, datetime
+
+from app import app, db, Expense, shared_cache, get_rollup_financials
+from shared_cache import SharedCache, MemoryBackend, SQLiteBackend, MEMORY_EVENT_LIMIT, dumps, loads
+
+
+def test_values_are_shared_and_invalidated_across_workers(tmp_path):
+    """Two caches on one SQLite file behave like two workers sharing results and invalidations"""
+    path = str(tmp_path / 'cache.db')
+    first, second = SharedCache(SQLiteBackend(path)), SharedCache(SQLiteBackend(path))
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return {date(2001, 1, 1): {'sales': 10.0}}
+
+    assert first.get_or_set('reports', 'daily', compute) == {date(2001, 1, 1): {'sales': 10.0}}
+    assert second.get_or_set('reports', 'daily', compute) == {date(2001, 1, 1): {'sales': 10.0}}
+    assert len(computed) == 1 and second.hits == 1
+
+    second.invalidate('reports')
+    first.get_or_set('reports', 'daily', compute)
+    assert len(computed) == 2
+
+
+def test_events_reach_other_workers_only(tmp_path):
+    """Published messages are delivered to subscribers in other processes, not back to the sender"""
+    path = str(tmp_path / 'cache.db')
+    first, second = SharedCache(SQLiteBackend(path)), SharedCache(SQLiteBackend(path))
+    first_sub, second_sub = first.subscribe('catalogue'), second.subscribe('catalogue')
+
+    first.publish('catalogue', [1, 2])
+    second.publish('catalogue', [3])
+    assert first_sub.poll() == [[3]]
+    assert second_sub.poll() == [[1, 2]]
+    assert second_sub.poll() == []
+
+
+def test_memory_backend_expires_values():
+    cache = SharedCache(MemoryBackend())
+    cache.backend.set('key', b'value', ttl=-1)
+    assert cache.backend.get('key') is None
+    assert cache.backend.incr('counter') == 1 and cache.backend.incr('counter') == 2
+
+
+def test_memory_backend_stays_bounded():
+    """Old events are dropped, with a full reload for subscribers that missed them, and expired values are swept"""
+    cache = SharedCache(MemoryBackend())
+    behind, current = cache.subscribe('catalogue'), cache.subscribe('catalogue')
+    other = SharedCache(cache.backend)
+    other.publish('catalogue', [1])
+    assert current.poll() == [[1]]
+    for product_id in range(MEMORY_EVENT_LIMIT + 1):
+        other.publish('catalogue', [product_id])
+    assert behind.poll() is None
+    assert len(cache.backend._events['pos:catalogue'][1]) == MEMORY_EVENT_LIMIT
+
+    for n in range(100):
+        cache.backend.set(f'old:{n}', b'value', ttl=-1)
+    assert not [key for key in cache.backend._values if key.startswith('old:')]
+
+
+def test_values_round_trip_as_json():
+    """Report values keep their date keys and datetimes; nothing is unpickled"""
+    value = {date(2001, 1, 1): {'sales': 10.0, 'at': datetime(2001, 1, 1, 9, 30)}, 'dates': ['2001-01-01'], 'n': 3}
+    assert loads(dumps(value)) == value
+    assert dumps([1, None]) == b'[1,null]'
+
+
+def test_report_cache_invalidated_by_commit():
+    """Cached report results are dropped when a write that affects them commits"""
+    with app.app_context():
+        day = date(2001, 8, 1)
+        before = get_rollup_financials(day, day)[day]['expenses']
+        misses = shared_cache.misses
+        assert get_rollup_financials(day, day)[day]['expenses'] == before
+        assert shared_cache.misses == misses
+
+        expense = Expense(description='Cache Test', amount=25.0, category='other', date=day)
+        db.session.add(expense)
+        db.session.commit()
+        try:
+            assert get_rollup_financials(day, day)[day]['expenses'] == before + 25.0
+        finally:
+            db.session.delete(expense)
+            db.session.commit()
+        assert get_rollup_financials(day, day)[day]['expenses'] == before
+
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_values_are_shared_and_invalidated_across_workers(pathlib.Path(tempfile.mkdtemp()))
+    test_events_reach_other_workers_only(pathlib.Path(tempfile.mkdtemp()))
+    test_memory_backend_expires_values()
+    test_memory_backend_stays_bounded()
+    test_values_round_trip_as_json()
+    test_report_cache_invalidated_by_commit()
+    print("Shared cache tests passed")
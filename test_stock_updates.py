@@ -0,0 +1,235 @@
+from sqlalchemy import event, text
+
+from app import app, db, socketio, Product, Order, StockMovement, create_order, CATALOGUE_DELTA_WINDOW
+
+
+def test_sale_checks_current_stock_not_stale_instance():
+    """A sale is checked against the stock in the database, not the value loaded earlier"""
+    with app.app_context():
+        try:
+            product = Product(name='Stock Test Product', price=150.0, buying_price=100.0, stock=5, max_stock=100)
+            db.session.add(product)
+            db.session.flush()
+
+            # Another till sells 4 units after this instance was loaded
+            db.session.execute(text('UPDATE product SET stock = stock - 4 WHERE id = :id'), {'id': product.id})
+            assert product.stock == 5
+
+            assert product.update_stock(2, 'sale') is False
+            assert db.session.execute(text('SELECT stock FROM product WHERE id = :id'), {'id': product.id}).scalar() == 1
+
+            assert product.update_stock(1, 'sale') is True
+            assert product.stock == 0
+            movement = StockMovement.query.filter_by(product_id=product.id).order_by(StockMovement.id.desc()).first()
+            assert movement.movement_type == 'sale' and movement.remaining_stock == 0
+        finally:
+            db.session.rollback()
+
+
+def test_restock_adds_to_current_stock():
+    """Restocking adds to the stored value so concurrent changes are kept"""
+    with app.app_context():
+        try:
+            product = Product(name='Stock Test Product', price=150.0, buying_price=100.0, stock=5, max_stock=100)
+            db.session.add(product)
+            db.session.flush()
+
+            db.session.execute(text('UPDATE product SET stock = stock - 2 WHERE id = :id'), {'id': product.id})
+
+            assert product.update_stock(10, 'restock') is True
+            assert product.stock == 13
+        finally:
+            db.session.rollback()
+
+
+def test_batch_sale_uses_constant_statements():
+    """Selling a large basket takes the same number of statements as a small one"""
+    with app.app_context():
+        try:
+            products = [
+                Product(name=f'Batch Test Product {i}', price=10.0, buying_price=6.0, stock=5, max_stock=100)
+                for i in range(60)
+            ]
+            db.session.add_all(products)
+            db.session.flush()
+
+            statements = []
+            def count_statement(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+            event.listen(db.engine, 'before_cursor_execute', count_statement)
+            try:
+                assert Product.sell_stock_batch({product.id: 2 for product in products}, notes='batch') is True
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+            assert len(statements) == 3
+            assert all(product.stock == 3 for product in products)
+            assert StockMovement.query.filter(StockMovement.notes == 'batch').count() == 60
+        finally:
+            db.session.rollback()
+
+
+def test_batch_sale_reports_short_stock():
+    """A basket is refused when any product cannot cover its quantity"""
+    with app.app_context():
+        try:
+            plenty = Product(name='Batch Test Plenty', price=10.0, buying_price=6.0, stock=10, max_stock=100)
+            scarce = Product(name='Batch Test Scarce', price=10.0, buying_price=6.0, stock=1, max_stock=100)
+            db.session.add_all([plenty, scarce])
+            db.session.flush()
+
+            assert Product.sell_stock_batch({plenty.id: 2, scarce.id: 2}) is False
+        finally:
+            db.session.rollback()
+
+
+def test_create_order_reports_stock_issues_without_writing():
+    """Unknown products and short stock come back as issues on the result and nothing is written"""
+    with app.app_context():
+        try:
+            product = Product(name='Order Test Product', price=150.0, buying_price=100.0, stock=1, max_stock=100)
+            db.session.add(product)
+            db.session.flush()
+            orders_before = Order.query.count()
+
+            result = create_order({'customer_name': 'Order Test'}, [
+                {'product_id': product.id, 'quantity': 2, 'price': 150.0},
+                {'product_id': -1, 'quantity': 1, 'price': 150.0}
+            ], 'in-store')
+
+            assert not result.success and result.order is None
+            assert result.error == 'Stock verification failed'
+            assert result.issues == [
+                'Product ID -1 not found',
+                'Insufficient stock for Order Test Product: requested 2, available 1'
+            ]
+            assert Order.query.count() == orders_before
+        finally:
+            db.session.rollback()
+
+
+def test_stock_changes_are_pushed_after_commit():
+    """Committed stock changes reach Socket.IO clients as compact deltas, rolled back ones don't"""
+    client = socketio.test_client(app)
+    with app.app_context():
+        product = Product(name='Push Test Product', price=150.0, buying_price=100.0, stock=5, max_stock=100)
+        db.session.add(product)
+        db.session.commit()
+        client.get_received()
+        try:
+            product.update_stock(2, 'sale')
+            db.session.rollback()
+            assert client.get_received() == []
+
+            product = db.session.get(Product, product.id)
+            product.update_stock(2, 'sale')
+            db.session.commit()
+            received = client.get_received()
+            assert [event['name'] for event in received] == ['stock_changed']
+            delta = received[0]['args'][0]['products'][0]
+            assert delta['id'] == product.id and delta['stock'] == 3
+
+            # Stock edited directly on the model, as edit_product() does
+            product.stock = 10
+            db.session.commit()
+            assert client.get_received()[0]['args'][0]['products'][0]['stock'] == 10
+        finally:
+            db.session.rollback()
+            StockMovement.query.filter_by(product_id=product.id).delete()
+            db.session.delete(db.session.get(Product, product.id))
+            db.session.commit()
+            client.disconnect()
+
+
+def test_stock_status_since_and_etag():
+    """/api/stock_status returns only rows changed after since= and answers 304 while nothing changed"""
+    with app.app_context():
+        old = Product(name='Since Test Old', price=150.0, buying_price=100.0, stock=5, max_stock=100)
+        recent = Product(name='Since Test Recent', price=150.0, buying_price=100.0, stock=5, max_stock=100)
+        db.session.add(old)
+        db.session.commit()
+        since = old.change_seq
+        db.session.add(recent)
+        db.session.commit()
+        ids = [old.id, recent.id]
+        client = app.test_client()
+        try:
+            response = client.get(f'/api/stock_status?since={since}')
+            data = response.get_json()
+            assert data['since'] is True and data['version'] >= recent.change_seq > since
+            assert str(recent.id) in data['products'] and str(old.id) not in data['products']
+            assert response.headers['Cache-Control'] == 'private, no-cache'
+
+            response = client.get('/api/stock_status')
+            etag = response.headers['ETag']
+            assert str(old.id) in response.get_json()['products']
+            assert client.get('/api/stock_status', headers={'If-None-Match': etag}).status_code == 304
+
+            assert recent.update_stock(1, 'sale') is True
+            db.session.commit()
+            response = client.get('/api/stock_status', headers={'If-None-Match': etag})
+            assert response.status_code == 200 and response.headers['ETag'] != etag
+
+            # Versions come from commit order, not from timestamps: a raw write stamped in
+            # the past is still reported, and so is a deletion
+            version = response.get_json()['version']
+            db.session.execute(text("UPDATE product SET stock = 9, updated_at = '2001-01-01 00:00:00' WHERE id = :id"),
+                               {'id': old.id})
+            StockMovement.query.filter_by(product_id=ids[1]).delete()
+            db.session.execute(text("DELETE FROM product WHERE id = :id"), {'id': ids[1]})
+            db.session.commit()
+            data = client.get(f'/api/stock_status?since={version}').get_json()
+            assert list(data['products']) == [str(old.id)] and data['products'][str(old.id)]['stock'] == 9
+            assert data['deleted'] == [ids[1]]
+
+            assert client.get('/api/stock_status?since=yesterday').status_code == 400
+        finally:
+            db.session.rollback()
+            StockMovement.query.filter(StockMovement.product_id.in_(ids)).delete()
+            Product.query.filter(Product.id.in_(ids)).delete()
+            db.session.commit()
+
+
+def test_old_since_gets_full_listing_once_deletions_are_pruned():
+    """Deletions past the delta window are dropped, and a since= that old gets every product"""
+    with app.app_context():
+        gone = Product(name='Pruned Test Gone', price=150.0, buying_price=100.0, stock=5, max_stock=100)
+        kept = Product(name='Pruned Test Kept', price=150.0, buying_price=100.0, stock=5, max_stock=100)
+        db.session.add_all([gone, kept])
+        db.session.commit()
+        ids = [gone.id, kept.id]
+        client = app.test_client()
+        try:
+            db.session.execute(text("DELETE FROM product WHERE id = :id"), {'id': ids[0]})
+            db.session.commit()
+            since = db.session.execute(text("SELECT value FROM catalogue_sequence")).scalar() - 1
+            assert client.get(f'/api/stock_status?since={since}').get_json()['deleted'] == [ids[0]]
+
+            # A window's worth of changes later the tombstone is pruned by the next deletion
+            db.session.execute(text("UPDATE catalogue_sequence SET value = value + :window"),
+                               {'window': CATALOGUE_DELTA_WINDOW})
+            db.session.execute(text("DELETE FROM product WHERE id = :id"), {'id': ids[1]})
+            db.session.commit()
+            pruned = db.session.execute(text("SELECT COUNT(*) FROM product_deletion WHERE product_id = :id"),
+                                        {'id': ids[0]}).scalar()
+            assert pruned == 0
+
+            data = client.get(f'/api/stock_status?since={since}').get_json()
+            assert data['since'] is False and 'deleted' not in data
+            assert str(ids[0]) not in data['products'] and str(ids[1]) not in data['products']
+        finally:
+            db.session.rollback()
+            Product.query.filter(Product.id.in_(ids)).delete()
+            db.session.commit()
+
+
+if __name__ == "__main__":
+    test_sale_checks_current_stock_not_stale_instance()
+    test_restock_adds_to_current_stock()
+    test_batch_sale_uses_constant_statements()
+    test_batch_sale_reports_short_stock()
+    test_create_order_reports_stock_issues_without_writing()
+    test_stock_changes_are_pushed_after_commit()
+    test_stock_status_since_and_etag()
+    test_old_since_gets_full_listing_once_deletions_are_pruned()
+    print("Stock update tests passed")
@@ -0,0 +1,36 @@
+import pytest
+
+from app import (app, db, Product, GROCERY_CATEGORIES, GROCERY_ITEMS, PRODUCT_UNITS, CATEGORY_NAMES,
+                 CATEGORY_GROUPS, FLAT_CATEGORIES, UNIT_NAMES, get_grocery_categories)
+
+
+def test_taxonomy_is_frozen_with_lookups():
+    """Reference lists are shared, read-only objects with lookup tables built from them"""
+    assert get_grocery_categories() is GROCERY_CATEGORIES
+    with pytest.raises(TypeError):
+        GROCERY_ITEMS['fresh_fruits'][0]['name'] = 'Pears'
+    with pytest.raises(AttributeError):
+        GROCERY_CATEGORIES[0][2].append(('kiwis', 'Kiwis'))
+
+    assert CATEGORY_NAMES['fresh_fruits'] == 'Fresh Fruits'
+    assert CATEGORY_GROUPS['cheese'] == ('dairy_eggs', 'Dairy & Eggs')
+    assert ('milk', 'Milk', 'Dairy & Eggs') in FLAT_CATEGORIES
+    assert len(FLAT_CATEGORIES) == len(CATEGORY_NAMES)
+    assert UNIT_NAMES['kg'] == 'Kilogram (kg)' and len(UNIT_NAMES) == len(PRODUCT_UNITS)
+
+
+def test_home_page_lists_stocked_categories():
+    """The category filter offers only categories that have products, with their counts"""
+    with app.app_context():
+        product = Product(name='Taxonomy Test Cheese', price=900.0, buying_price=500.0, category='cheese')
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+    try:
+        html = app.test_client().get('/').get_data(as_text=True)
+        assert '<option value="cheese">Cheese (1)</option>' in html
+        assert 'value="ice_cream"' not in html
+    finally:
+        with app.app_context():
+            Product.query.filter_by(id=product_id).delete()
+            db.session.commit()